@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Admission Control - Bounded priority queue in front of workflow execution
+At most ADMISSION_MAX_RUNNING workflows run at once; further submissions wait
+in a priority queue (interactive before batch, test_mode before real) of at
+most ADMISSION_MAX_QUEUED entries, beyond which callers get 429 + Retry-After.
+"""
+
+import os
+import math
+import heapq
+import asyncio
+import itertools
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MAX_RUNNING = int(os.getenv("ADMISSION_MAX_RUNNING", "2"))
+ADMISSION_MAX_QUEUED = int(os.getenv("ADMISSION_MAX_QUEUED", "20"))
+# 尚无历史数据时用于估算ETA的工作流时长（秒）
+ADMISSION_DEFAULT_SECONDS_REAL = float(os.getenv("ADMISSION_DEFAULT_SECONDS_REAL", "900"))
+ADMISSION_DEFAULT_SECONDS_TEST = float(os.getenv("ADMISSION_DEFAULT_SECONDS_TEST", "15"))
+
+PRIORITY_CLASSES = ("interactive", "batch")
+
+
+class AdmissionRejected(Exception):
+    """Raised when the admission queue is full"""
+
+    def __init__(self, retry_after: int, queued: int):
+        super().__init__(f"Admission queue is full ({queued} workflows waiting), retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.queued = queued
+
+
+def priority_rank(priority: str = "interactive", test_mode: bool = False) -> int:
+    """Lower rank runs first: interactive/test < interactive/real < batch/test < batch/real"""
+    klass = PRIORITY_CLASSES.index(priority) if priority in PRIORITY_CLASSES else 0
+    return klass * 2 + (0 if test_mode else 1)
+
+
+class AdmissionController:
+    """Admit workflows by priority under a running-workflow cap"""
+
+    def __init__(self, max_running: int = ADMISSION_MAX_RUNNING, max_queued: int = ADMISSION_MAX_QUEUED):
+        self.max_running = max(1, max_running)
+        self.max_queued = max(0, max_queued)
+        self._heap: List[Tuple[int, int, str]] = []
+        self._waiting: Dict[str, Tuple[Callable[[], Awaitable[Any]], bool]] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._running_modes: Dict[str, bool] = {}
+        self._seq = itertools.count()
+        # 按模式统计的平均时长（EWMA），用于ETA与Retry-After
+        self._avg_seconds = {True: ADMISSION_DEFAULT_SECONDS_TEST, False: ADMISSION_DEFAULT_SECONDS_REAL}
+        self.admitted = 0
+        self.rejected = 0
+        self._closed = False
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiting)
+
+    def ensure_capacity(self, count: int = 1) -> None:
+        """Raise AdmissionRejected if ``count`` new workflows could not all be queued"""
+        free_slots = max(0, self.max_running - len(self._running))
+        if self.queued + count - free_slots > self.max_queued:
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after(), self.queued)
+
+    def submit(self, workflow_id: str, run: Callable[[], Awaitable[Any]], priority: str = "interactive",
+               test_mode: bool = False, force: bool = False) -> Dict[str, Any]:
+        """Start ``run()`` now or queue it; returns queue position and ETA.
+
+        ``force`` bypasses the queue bound (used when resuming after a restart).
+        """
+        if workflow_id in self._running or workflow_id in self._waiting:
+            return self.ticket(workflow_id)
+        if not force:
+            self.ensure_capacity()
+        self._waiting[workflow_id] = (run, test_mode)
+        heapq.heappush(self._heap, (priority_rank(priority, test_mode), next(self._seq), workflow_id))
+        self._dispatch()
+        return self.ticket(workflow_id)
+
+    def ticket(self, workflow_id: str) -> Dict[str, Any]:
+        ordered = self._ordered()
+        if workflow_id not in ordered:
+            return {"queue_position": 0, "eta_seconds": 0, "admission": "running"}
+        position = ordered.index(workflow_id) + 1
+        # 排在前面的工作流按各自模式的平均时长累计；运行中的按剩余一半估算
+        work = sum(self._avg_seconds[self._waiting[wid][1]] for wid in ordered[:position - 1])
+        work += sum(self._avg_seconds[mode] for mode in self._running_modes.values()) / 2
+        return {"queue_position": position, "eta_seconds": int(round(work / self.max_running)), "admission": "queued"}
+
+    def position(self, workflow_id: str) -> Optional[int]:
+        """1-based position among waiting workflows, None if not waiting"""
+        ordered = self._ordered()
+        return ordered.index(workflow_id) + 1 if workflow_id in ordered else None
+
+    def estimate_start(self, position: int, test_mode: bool = False, slots: Optional[int] = None) -> int:
+        """Seconds until the workflow at ``position`` starts when all workflows ahead are alike"""
+        slots = max(1, slots or self.max_running)
+        average = self._avg_seconds[test_mode]
+        return int(round(((position - 1) * average + slots * average / 2) / slots))
+
+    def _ordered(self) -> List[str]:
+        return [wid for _, _, wid in sorted(self._heap) if wid in self._waiting]
+
+    def retry_after(self) -> int:
+        """Expected seconds until a running workflow finishes and frees a queue slot"""
+        modes = self._running_modes.values() or [False]
+        return max(1, int(math.ceil(min(self._avg_seconds[mode] for mode in modes) / 2)))
+
+    def cancel(self, workflow_id: str) -> bool:
+        """Drop a waiting workflow, or cancel it if it is running"""
+        if self._waiting.pop(workflow_id, None) is not None:
+            return True
+        task = self._running.get(workflow_id)
+        if task is not None:
+            task.cancel()
+            return True
+        return False
+
+    def record_duration(self, test_mode: bool, seconds: float, alpha: float = 0.3) -> None:
+        self._avg_seconds[test_mode] = (1 - alpha) * self._avg_seconds[test_mode] + alpha * seconds
+
+    def shutdown(self) -> None:
+        """Stop admitting and cancel running workflows; they resume on the next start"""
+        self._closed = True
+        for task in list(self._running.values()):
+            task.cancel()
+
+    def _dispatch(self) -> None:
+        while not self._closed and len(self._running) < self.max_running and self._heap:
+            _, _, workflow_id = heapq.heappop(self._heap)
+            entry = self._waiting.pop(workflow_id, None)
+            if entry is None:
+                continue  # 已取消
+            run, test_mode = entry
+            self.admitted += 1
+            task = asyncio.ensure_future(self._run(workflow_id, run, test_mode))
+            self._running[workflow_id] = task
+            self._running_modes[workflow_id] = test_mode
+            logger.info(f"🚦 Workflow {workflow_id} admitted ({len(self._running)}/{self.max_running} running, "
+                        f"{self.queued} queued)")
+
+    async def _run(self, workflow_id: str, run: Callable[[], Awaitable[Any]], test_mode: bool) -> None:
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        try:
+            await run()
+            self.record_duration(test_mode, loop.time() - start)
+        except asyncio.CancelledError:
+            logger.warning(f"⚠️ Workflow {workflow_id} cancelled")
+        except Exception as e:
+            logger.error(f"❌ Admitted workflow {workflow_id} raised: {e}")
+        finally:
+            self._running.pop(workflow_id, None)
+            self._running_modes.pop(workflow_id, None)
+            self._dispatch()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "max_running": self.max_running,
+            "max_queued": self.max_queued,
+            "running": sorted(self._running),
+            "queued": self._ordered(),
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_seconds": {"test": round(self._avg_seconds[True], 1), "real": round(self._avg_seconds[False], 1)},
+        }
+
+
+# 进程内共享的准入控制器
+admission_controller = AdmissionController()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Agent Pool - Warm, bounded pools of agent instances per agent type
+Agents and LLM clients are created (and started) once, up to AGENT_POOL_SIZE per
+type, then checked out for a task and reset before the next checkout, instead of
+constructing a new agent with its own clients for every stage.
+"""
+
+import os
+import asyncio
+import inspect
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 每种智能体最多同时存在的实例数；全部被借出时后来的任务等待归还
+AGENT_POOL_SIZE = int(os.getenv("AGENT_POOL_SIZE", "4"))
+# 应用启动时为每种智能体预先创建的实例数
+AGENT_POOL_WARM = int(os.getenv("AGENT_POOL_WARM", str(AGENT_POOL_SIZE)))
+
+
+class AgentPool:
+    """Bounded pool of reusable instances of one agent type.
+
+    ``factory`` builds a ready instance (may be a coroutine function, e.g. create and
+    ``start()``); ``reset(agent, **options)`` clears per-task state and applies the
+    options of the next checkout.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any],
+                 reset: Optional[Callable[..., None]] = None, size: int = AGENT_POOL_SIZE):
+        self.name = name
+        self.size = max(1, size)
+        self._factory = factory
+        self._reset = reset
+        self._idle: List[Any] = []
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._created = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.discarded = 0
+
+    @property
+    def in_use(self) -> int:
+        return self._created - len(self._idle)
+
+    async def _create(self) -> Any:
+        self._created += 1
+        try:
+            agent = self._factory()
+            if inspect.isawaitable(agent):
+                agent = await agent
+        except BaseException:
+            self._created -= 1
+            self._wake_next()
+            raise
+        logger.info(f"🧩 智能体池 {self.name} 创建实例 {self._created}/{self.size}")
+        return agent
+
+    async def warm(self, count: Optional[int] = None) -> None:
+        """Create idle instances up to ``count`` (default AGENT_POOL_WARM, capped at size)"""
+        target = min(self.size, AGENT_POOL_WARM if count is None else count)
+        while self._created < target:
+            self._idle.append(await self._create())
+
+    async def _acquire(self) -> Any:
+        while True:
+            if self._idle:
+                return self._idle.pop()
+            if self._created < self.size:
+                return await self._create()
+            self.waits += 1
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self._wake_next()  # 已被唤醒却取消，把机会让给下一个等待者
+                raise
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
+    def _wake_next(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+
+    def _release(self, agent: Any, reusable: bool = True) -> None:
+        if reusable:
+            self._idle.append(agent)
+        else:
+            self._created -= 1
+            self.discarded += 1
+        self._wake_next()
+
+    @asynccontextmanager
+    async def checkout(self, **options) -> AsyncIterator[Any]:
+        """Borrow an instance for one task, waiting while all ``size`` instances are in use"""
+        agent = await self._acquire()
+        try:
+            if self._reset:
+                self._reset(agent, **options)
+        except Exception:
+            self._release(agent, reusable=False)
+            raise
+        self.checkouts += 1
+        try:
+            yield agent
+        finally:
+            self._release(agent)
+
+    async def close(self) -> None:
+        """Drop idle instances, stopping those that have a ``stop()``"""
+        idle, self._idle = self._idle, []
+        self._created -= len(idle)
+        for agent in idle:
+            stop = getattr(agent, "stop", None)
+            if stop is None:
+                continue
+            try:
+                result = stop()
+                if inspect.isawaitable(result):
+                    await result
+            except Exception as e:
+                logger.warning(f"⚠️ 智能体池 {self.name} 停止实例失败: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "created": self._created,
+            "idle": len(self._idle),
+            "in_use": self.in_use,
+            "waiting": len(self._waiters),
+            "checkouts": self.checkouts,
+            "waits": self.waits,
+            "discarded": self.discarded,
+        }
+
+
+_agent_pools: Dict[str, AgentPool] = {}
+
+
+def register_agent_pool(name: str, factory: Callable[[], Any], reset: Optional[Callable[..., None]] = None,
+                        size: int = AGENT_POOL_SIZE) -> AgentPool:
+    """Create (or replace) the pool of agent type ``name``"""
+    pool = AgentPool(name, factory, reset, size)
+    _agent_pools[name] = pool
+    return pool
+
+
+def get_agent_pool(name: str) -> AgentPool:
+    pool = _agent_pools.get(name)
+    if pool is None:
+        raise KeyError(f"No agent pool registered for: {name}")
+    return pool
+
+
+def checkout_agent(name: str, **options):
+    """``async with checkout_agent("writer", test_mode=True) as agent: ...``"""
+    return get_agent_pool(name).checkout(**options)
+
+
+async def warm_agent_pools() -> None:
+    """Pre-create instances of every registered pool (call on application startup)"""
+    for pool in _agent_pools.values():
+        try:
+            await pool.warm()
+        except Exception as e:
+            logger.error(f"❌ 智能体池 {pool.name} 预热失败: {e}")
+    logger.info(f"🧩 智能体池已预热: { {name: pool.stats()['created'] for name, pool in _agent_pools.items()} }")
+
+
+async def close_agent_pools() -> None:
+    for pool in _agent_pools.values():
+        await pool.close()
+
+
+def agent_pool_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: pool.stats() for name, pool in _agent_pools.items()}
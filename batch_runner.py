@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Batch Runner - Shared stage work for batches of related workflows
+Every stage gets an input key chained from its upstream stage keys. Inside a
+batch, workflows whose stage keys match run that stage once and share the
+result (e.g. duplicate topics share planning/search and then everything
+downstream). Aggregate progress is derived from the item workflows.
+"""
+
+import os
+import copy
+import json
+import time
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from patent_agent_demo.singleflight import SingleFlight
+from stage_scheduler import STAGE_DEPENDENCIES
+
+logger = logging.getLogger(__name__)
+
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "100"))
+# 内存中保留共享阶段结果的批次数
+BATCH_SHARED_MAX = int(os.getenv("BATCH_SHARED_MAX", "20"))
+
+FINISHED_STATUSES = {"completed", "failed"}
+
+
+def _digest(value: Any) -> str:
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stage_input_key(stage: str, workflow: Dict[str, Any],
+                    dependencies: Optional[Dict[str, List[str]]] = None) -> str:
+    """Key of everything a stage reads: its own inputs plus the keys of its upstream stages"""
+    dependencies = STAGE_DEPENDENCIES if dependencies is None else dependencies
+    keys = workflow.setdefault("stage_keys", {})
+    upstream = [keys.get(dep) or _digest(workflow.get("results", {}).get(dep))
+                for dep in dependencies.get(stage, [])]
+    key = _digest([stage, workflow["topic"], workflow["description"], workflow["test_mode"], upstream])
+    keys[stage] = key
+    return key
+
+
+class SharedStageWork:
+    """Per-batch memo of stage results keyed by stage input key"""
+
+    def __init__(self, batch_id: str):
+        self.batch_id = batch_id
+        self._flight = SingleFlight(f"Batch[{batch_id[:8]}]")
+        self._results: Dict[str, Any] = {}
+        self.computed = 0
+        self.shared = 0
+
+    async def run(self, key: str, workflow_id: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run ``fn`` once per key; later/concurrent callers get a copy of that result"""
+        if key in self._results:
+            self.shared += 1
+            return self._adopt(self._results[key], workflow_id)
+
+        leader = False
+
+        async def compute():
+            nonlocal leader
+            leader = True
+            result = await fn()
+            # 失败结果不共享，其他条目各自重试
+            if not (isinstance(result, dict) and result.get("error")):
+                self._results[key] = result
+            return result
+
+        result = await self._flight.do(key, compute)
+        if leader:
+            self.computed += 1
+            return result
+        self.shared += 1
+        logger.info(f"♻️ 批次 {self.batch_id} 复用相同输入的阶段结果 key={key[:12]}")
+        return self._adopt(result, workflow_id)
+
+    @staticmethod
+    def _adopt(result: Any, workflow_id: str) -> Any:
+        if isinstance(result, dict):
+            result = copy.copy(result)
+            if "workflow_id" in result:
+                result["workflow_id"] = workflow_id
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {"stages_computed": self.computed, "stages_shared": self.shared}
+
+
+_shared_work: "OrderedDict[str, SharedStageWork]" = OrderedDict()
+
+
+def shared_work_for(batch_id: str) -> SharedStageWork:
+    """Shared stage memo of a batch (bounded LRU across batches)"""
+    work = _shared_work.get(batch_id)
+    if work is None:
+        work = _shared_work[batch_id] = SharedStageWork(batch_id)
+        while len(_shared_work) > BATCH_SHARED_MAX:
+            _shared_work.popitem(last=False)
+    _shared_work.move_to_end(batch_id)
+    return work
+
+
+def batch_shared_stats(batch_id: str) -> Dict[str, Any]:
+    work = _shared_work.get(batch_id)
+    return work.stats() if work else {"stages_computed": 0, "stages_shared": 0}
+
+
+def batch_progress(batch: Dict[str, Any], items: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Aggregate progress of a batch from its item workflow summaries"""
+    total_stages = sum(len(item.get("stages", {})) for item in items) or 1
+    done_stages = sum(1 for item in items for info in item.get("stages", {}).values()
+                      if info.get("status") == "completed")
+    counts: Dict[str, int] = {}
+    for item in items:
+        counts[item.get("status", "unknown")] = counts.get(item.get("status", "unknown"), 0) + 1
+    finished = sum(counts.get(status, 0) for status in FINISHED_STATUSES)
+    status = "completed" if finished == len(items) else "running"
+    if status == "completed" and counts.get("failed"):
+        status = "completed_with_errors" if counts.get("completed") else "failed"
+    return {
+        "batch_id": batch["workflow_id"],
+        "status": status,
+        "total": len(items),
+        "finished": finished,
+        "status_counts": counts,
+        "progress": round(100.0 * done_stages / total_stages, 1),
+        "created_at": batch.get("created_at"),
+        "elapsed_seconds": round(time.time() - batch.get("created_at", time.time()), 1),
+        "shared_work": batch_shared_stats(batch["workflow_id"]),
+        "items": [{
+            "workflow_id": item["workflow_id"],
+            "topic": item.get("topic"),
+            "status": item.get("status"),
+            "current_stage": item.get("current_stage"),
+            "completed_stages": sum(1 for info in item.get("stages", {}).values() if info.get("status") == "completed"),
+        } for item in items],
+    }
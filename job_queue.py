@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Job Queue - SQLite-backed leased job queue shared by worker processes
+A worker leases a job for JOB_LEASE_SECONDS and keeps the lease alive with
+heartbeats; when a worker crashes its lease expires and another worker
+reclaims the job. No external broker is required.
+"""
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUE_DB_PATH = os.getenv("JOB_QUEUE_DB_PATH", os.path.join("output", "jobs.sqlite3"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT,
+    status TEXT NOT NULL,
+    priority INTEGER DEFAULT 0,
+    attempts INTEGER DEFAULT 0,
+    max_attempts INTEGER,
+    worker_id TEXT,
+    lease_expires_at REAL,
+    created_at REAL,
+    updated_at REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, priority, created_at);
+"""
+
+
+class JobQueue:
+    """Durable FIFO (by priority) queue with leases, heartbeats and reclaim on expiry"""
+
+    def __init__(self, path: str = JOB_QUEUE_DB_PATH, lease_seconds: float = JOB_LEASE_SECONDS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max(1, max_attempts)
+        self._lock = threading.RLock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # timeout：多进程同时写入时等待数据库锁
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], job_id: Optional[str] = None,
+                priority: int = 0, max_attempts: Optional[int] = None) -> str:
+        """Add a job; re-enqueueing a finished job with the same id queues it again"""
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, kind, payload, status, priority, attempts, max_attempts, created_at, updated_at) "
+                "VALUES (?, ?, ?, 'queued', ?, 0, ?, ?, ?) "
+                "ON CONFLICT (job_id) DO UPDATE SET kind=excluded.kind, payload=excluded.payload, "
+                "status='queued', priority=excluded.priority, attempts=0, max_attempts=excluded.max_attempts, "
+                "worker_id=NULL, lease_expires_at=NULL, created_at=excluded.created_at, updated_at=excluded.updated_at, error=NULL "
+                "WHERE jobs.status IN ('done', 'failed')",
+                (job_id, kind, json.dumps(payload, ensure_ascii=False), priority,
+                 max_attempts or self.max_attempts, now, now),
+            )
+        logger.info(f"📥 Job {job_id} ({kind}) enqueued")
+        return job_id
+
+    def lease(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """Claim the next queued (or lease-expired) job for ``worker_id``"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._conn.execute(
+                        "SELECT job_id, kind, payload, attempts, max_attempts, worker_id FROM jobs "
+                        "WHERE status='queued' OR (status='leased' AND lease_expires_at < ?) "
+                        "ORDER BY priority DESC, created_at LIMIT 1", (now,)
+                    ).fetchone()
+                    if row is None:
+                        self._conn.execute("COMMIT")
+                        return None
+                    job_id, kind, payload, attempts, max_attempts, previous_worker = row
+                    if attempts >= max_attempts:
+                        self._conn.execute(
+                            "UPDATE jobs SET status='failed', error=?, updated_at=? WHERE job_id=?",
+                            (f"lease expired after {attempts} attempts (last worker: {previous_worker})", now, job_id),
+                        )
+                        logger.error(f"❌ Job {job_id} gave up after {attempts} attempts")
+                        continue
+                    self._conn.execute(
+                        "UPDATE jobs SET status='leased', worker_id=?, attempts=attempts+1, "
+                        "lease_expires_at=?, updated_at=? WHERE job_id=?",
+                        (worker_id, now + self.lease_seconds, now, job_id),
+                    )
+                    self._conn.execute("COMMIT")
+                    if previous_worker:
+                        logger.warning(f"♻️ Job {job_id} reclaimed from expired worker {previous_worker}")
+                    return {"job_id": job_id, "kind": kind, "payload": json.loads(payload or "{}"),
+                            "attempt": attempts + 1, "reclaimed": bool(previous_worker)}
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def heartbeat(self, job_id: str, worker_id: str) -> bool:
+        """Extend the lease; False means the lease was lost to another worker"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET lease_expires_at=?, updated_at=? "
+                "WHERE job_id=? AND worker_id=? AND status='leased'",
+                (time.time() + self.lease_seconds, time.time(), job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: str, worker_id: str) -> bool:
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status='done', lease_expires_at=NULL, updated_at=? "
+                "WHERE job_id=? AND worker_id=? AND status='leased'",
+                (time.time(), job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: str, worker_id: str, error: str, retry: bool = True) -> bool:
+        """Release a failed job: back to the queue while attempts remain, else failed"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status=CASE WHEN ? AND attempts < max_attempts THEN 'queued' ELSE 'failed' END, "
+                "worker_id=NULL, lease_expires_at=NULL, error=?, updated_at=? "
+                "WHERE job_id=? AND worker_id=? AND status='leased'",
+                (1 if retry else 0, error, time.time(), job_id, worker_id),
+            )
+            return cursor.rowcount == 1
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of a queued job in lease order, None if it is not queued"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT priority, created_at FROM jobs WHERE job_id=? AND status='queued'", (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            ahead = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status='queued' AND "
+                "(priority > ? OR (priority = ? AND created_at < ?))", (row[0], row[0], row[1])
+            ).fetchone()[0]
+        return ahead + 1
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT job_id, kind, status, attempts, worker_id, lease_expires_at, error FROM jobs WHERE job_id=?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        keys = ("job_id", "kind", "status", "attempts", "worker_id", "lease_expires_at", "error")
+        return dict(zip(keys, row))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            workers = [row[0] for row in self._conn.execute(
+                "SELECT DISTINCT worker_id FROM jobs WHERE status='leased' AND lease_expires_at >= ?", (time.time(),)
+            )]
+        return {
+            "path": self.path,
+            "lease_seconds": self.lease_seconds,
+            "queued": counts.get("queued", 0),
+            "leased": counts.get("leased", 0),
+            "done": counts.get("done", 0),
+            "failed": counts.get("failed", 0),
+            "active_workers": workers,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
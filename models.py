@@ -29,12 +29,21 @@ class WorkflowRequest(BaseModel):
     description: Optional[str] = Field(default=None, description="Patent description (optional, will auto-generate if not provided)")
     workflow_type: str = Field(default="enhanced", description="Workflow type")
     test_mode: bool = Field(default=False, description="Enable test mode for faster execution")
+    priority: str = Field(default="interactive", pattern="^(interactive|batch)$", description="Scheduling priority: interactive or batch")
+    force: bool = Field(default=False, description="Recompute every stage instead of reusing memoized stage results")
+
+class BatchWorkflowRequest(BaseModel):
+    """Request model for generating several patents as one batch"""
+    items: List[WorkflowRequest] = Field(..., min_length=1, description="Workflows to generate")
+    priority: str = Field(default="batch", pattern="^(interactive|batch)$", description="Scheduling priority for every item")
 
 class WorkflowResponse(BaseModel):
     """Response model for workflow operations"""
     workflow_id: str = Field(..., description="Unique workflow ID")
     status: str = Field(..., description="Operation status")
     message: str = Field(..., description="Response message")
+    queue_position: Optional[int] = Field(default=None, description="Position in the admission queue (0 = running)")
+    eta_seconds: Optional[int] = Field(default=None, description="Estimated seconds until the workflow starts")
 
 class StageInfo(BaseModel):
     """Stage information model"""
@@ -75,6 +84,7 @@ class WorkflowState(BaseModel):
     stage_statuses: Dict[str, StageStatusEnum] = Field(default_factory=dict, description="Stage statuses")
     stage_times: Dict[str, Dict[str, float]] = Field(default_factory=dict, description="Stage timing")
     errors: Dict[str, str] = Field(default_factory=dict, description="Stage errors")
+    force: bool = Field(default=False, description="Recompute stages instead of reusing memoized results")
     created_at: float = Field(default_factory=time.time, description="Creation timestamp")
     updated_at: float = Field(default_factory=time.time, description="Last update timestamp")
 
@@ -82,4 +92,24 @@ class TestModeConfig(BaseModel):
     """Test mode configuration"""
     enabled: bool = Field(default=True, description="Test mode enabled")
     mock_delay: float = Field(default=1.0, description="Mock execution delay in seconds")
-    mock_results: bool = Field(default=True, description="Use mock results")
\ No newline at end of file
+    mock_results: bool = Field(default=True, description="Use mock results")
+
+
+class TaskRequest(BaseModel):
+    """Task request model for agent execution"""
+    task_id: str = Field(..., description="Unique task ID")
+    workflow_id: str = Field(..., description="Owning workflow ID")
+    stage_name: str = Field(..., description="Stage name")
+    topic: str = Field(..., description="Patent topic")
+    description: str = Field(..., description="Patent description")
+    test_mode: bool = Field(default=False, description="Test mode enabled")
+    previous_results: Dict[str, Any] = Field(default_factory=dict, description="Results of earlier stages")
+    context: Dict[str, Any] = Field(default_factory=dict, description="Execution context")
+
+class TaskResponse(BaseModel):
+    """Task response model for agent execution"""
+    task_id: str = Field(..., description="Unique task ID")
+    status: str = Field(..., description="Task status")
+    result: Dict[str, Any] = Field(..., description="Agent result")
+    message: str = Field(..., description="Response message")
+    test_mode: bool = Field(..., description="Test mode enabled")
@@ -3,6 +3,7 @@ Base Agent Class
 Provides common functionality for all patent development agents
 """
 
+import os
 import asyncio
 import logging
 import time
@@ -20,6 +21,9 @@ from ..logging_utils import attach_agent_file_logger
 
 logger = logging.getLogger(__name__)
 
+# 空闲时消息循环的唤醒（心跳日志）间隔，秒
+AGENT_HEARTBEAT_SECONDS = float(os.getenv("AGENT_HEARTBEAT_SECONDS", "60"))
+
 @dataclass
 class TaskResult:
     """Result of a task execution"""
@@ -126,41 +130,30 @@ class BaseAgent:
             while self.status != AgentStatus.OFFLINE:
                 loop_count += 1
                 
-                # Get message from broker for this specific agent
+                # Block until a message arrives; wake up once per heartbeat interval when idle
                 try:
-                    message = await self.broker.get_message(self.name)
-                    if message:
-                        self.agent_logger.info(f"📨 {self.name} 收到消息: {message.type.value} 来自 {message.sender}")
-                        self.agent_logger.info(f"   消息ID: {message.id}")
-                        self.agent_logger.info(f"   内容: {message.content}")
-                        await self._process_message(message)
-                    else:
-                        # Log occasionally to show the loop is running
-                        if int(time.time()) % 30 == 0:  # Log every 30 seconds
-                            self.agent_logger.debug(f"⏳ {self.name} 等待消息中... (循环次数: {loop_count})")
+                    message = await self.broker.get_message(self.name, timeout=AGENT_HEARTBEAT_SECONDS)
                 except Exception as e:
                     self.agent_logger.error(f"❌ {self.name} 获取消息失败: {e}")
                     self.agent_logger.error(f"   错误详情: {traceback.format_exc()}")
-                    message = None
+                    await asyncio.sleep(1)  # 避免异常时空转
+                    continue
                 
-                # Add heartbeat to show the loop is running (every minute)
-                current_time = int(time.time())
-                if current_time % 60 == 0 and not hasattr(self, '_last_heartbeat_time') or current_time - getattr(self, '_last_heartbeat_time', 0) >= 60:
+                if message:
+                    self.agent_logger.info(f"📨 {self.name} 收到消息: {message.type.value} 来自 {message.sender}")
+                    self.agent_logger.info(f"   消息ID: {message.id}")
+                    self.agent_logger.info(f"   内容: {message.content}")
+                    await self._process_message(message)
+                elif self.name not in self.broker.agents:
+                    self.agent_logger.info(f"🔌 {self.name} 已从消息总线注销，消息处理循环结束")
+                    break
+                elif self.status != AgentStatus.OFFLINE:
                     self.agent_logger.info(f"💓 {self.name} 心跳 - 状态: {self.status.value} - 循环次数: {loop_count}")
-                    self._last_heartbeat_time = current_time
-                
-                # Log activity every 1000 loops (much less frequent)
-                if loop_count % 1000 == 0:
-                    self.agent_logger.info(f"🔄 {self.name} 消息循环活跃 - 循环次数: {loop_count}")
-                    
-                # Small delay to prevent busy waiting
-                await asyncio.sleep(0.1)
                 
         except Exception as e:
             self.agent_logger.error(f"❌ {self.name} 消息处理循环错误: {e}")
             self.agent_logger.error(f"   错误详情: {traceback.format_exc()}")
             logger.error(f"Error in message processing loop for {self.name}: {e}")
-            import traceback
             logger.error(f"Traceback: {traceback.format_exc()}")
             
     async def _process_message(self, message: Message):
@@ -3,9 +3,11 @@ Coordinator Agent for Patent Agent System
 Orchestrates the entire patent development workflow across all agents
 """
 
+import os
 import asyncio
 import logging
 import traceback
+from collections import OrderedDict
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
 import time
@@ -17,6 +19,11 @@ from ..context_manager import context_manager, ContextType, ContextItem
 
 logger = logging.getLogger(__name__)
 
+# 等待单个阶段任务完成的超时（秒）
+COORDINATOR_TASK_TIMEOUT = float(os.getenv("COORDINATOR_TASK_TIMEOUT", "180"))
+# completed_tasks/failed_tasks 保留的最近任务数
+COORDINATOR_TASK_HISTORY = int(os.getenv("COORDINATOR_TASK_HISTORY", "256"))
+
 @dataclass
 class WorkflowStage:
     """Workflow stage definition"""
@@ -51,8 +58,11 @@ class CoordinatorAgent(BaseAgent):
             test_mode=test_mode
         )
         self.active_workflows: Dict[str, PatentWorkflow] = {}
-        self.completed_tasks: Dict[str, Dict[str, Any]] = {}  # Track completed task IDs and results
-        self.failed_tasks: set = set()     # Track failed task IDs
+        # Recently finished tasks (bounded, oldest evicted first): task_id -> result / error
+        self.completed_tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.failed_tasks: "OrderedDict[str, str]" = OrderedDict()
+        # Futures of in-flight tasks, resolved directly by status/error messages
+        self._task_waiters: Dict[str, asyncio.Future] = {}
         self.workflow_templates = self._load_workflow_templates()
         self.agent_dependencies = self._load_agent_dependencies()
         self.completed_workflows: Dict[str, Dict[str, Any]] = {}
@@ -288,45 +298,26 @@ class CoordinatorAgent(BaseAgent):
                 priority=5
             )
             
+            # Register the waiter before sending so an immediate reply is not missed
+            waiter = self._register_task_waiter(task_id)
             logger.info(f"Sending task message to {stage.agent_name} with task_id: {task_id}")
-            await self.broker.send_message(message)
-            
-            # Wait for task completion with timeout
-            timeout = 180  # 3 minutes timeout
-            start_time = time.time()
-            
-            logger.info(f"Waiting for task {task_id} completion...")
-            
-            while time.time() - start_time < timeout:
-                # Check if we have received a completion message for this task
-                if task_id in self.completed_tasks:
-                    logger.info(f"Task {task_id} completed successfully")
-                    # Get the result from completed_tasks
-                    result = self.completed_tasks.get(task_id, {})
-                    # Process the completion
-                    await self._handle_stage_completion(workflow_id, stage_index, result)
-                    return
-                    
-                # Check if we have received an error message for this task
-                if task_id in self.failed_tasks:
-                    logger.error(f"Task {task_id} failed")
-                    await self._handle_stage_error(workflow_id, stage_index, f"Task {task_id} failed")
-                    return
-                    
-                # Log progress every 10 seconds (more frequent than before)
-                elapsed = time.time() - start_time
-                if int(elapsed) % 10 == 0 and elapsed > 0:
-                    logger.info(f"Still waiting for task {task_id} completion... ({elapsed:.1f}s elapsed)")
-                    # Also log the current state of completed_tasks and failed_tasks
-                    logger.info(f"Current completed_tasks: {list(self.completed_tasks.keys())}")
-                    logger.info(f"Current failed_tasks: {list(self.failed_tasks)}")
-                    
-                await asyncio.sleep(1)  # Check every 1 second (more frequent than before)
-                
-            logger.error(f"Task {task_id} timed out after {timeout} seconds")
-            logger.error(f"Final state - completed_tasks: {list(self.completed_tasks.keys())}")
-            logger.error(f"Final state - failed_tasks: {list(self.failed_tasks)}")
-            await self._handle_stage_error(workflow_id, stage_index, f"Task {task_id} timed out")
+            try:
+                await self.broker.send_message(message)
+                logger.info(f"Waiting for task {task_id} completion...")
+                success, payload = await asyncio.wait_for(waiter, timeout=COORDINATOR_TASK_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.error(f"Task {task_id} timed out after {COORDINATOR_TASK_TIMEOUT:.0f} seconds")
+                await self._handle_stage_error(workflow_id, stage_index, f"Task {task_id} timed out")
+                return
+            finally:
+                self._task_waiters.pop(task_id, None)
+            
+            if success:
+                logger.info(f"Task {task_id} completed successfully")
+                await self._handle_stage_completion(workflow_id, stage_index, payload)
+            else:
+                logger.error(f"Task {task_id} failed: {payload}")
+                await self._handle_stage_error(workflow_id, stage_index, f"Task {task_id} failed: {payload}")
             
         except Exception as e:
             logger.error(f"Error executing workflow stage: {e}")
@@ -455,32 +446,42 @@ class CoordinatorAgent(BaseAgent):
         }
         return context_mapping.get(stage_name, [ContextType.THEME_DEFINITION])
         
+    def _register_task_waiter(self, task_id: str) -> asyncio.Future:
+        """Future resolved with (success, result_or_error) when the task finishes"""
+        waiter = asyncio.get_running_loop().create_future()
+        if task_id in self.completed_tasks:
+            waiter.set_result((True, self.completed_tasks[task_id]))
+        elif task_id in self.failed_tasks:
+            waiter.set_result((False, self.failed_tasks[task_id]))
+        self._task_waiters[task_id] = waiter
+        return waiter
+        
+    def _resolve_task(self, task_id: str, success: bool, payload: Any):
+        """Record a finished task (bounded history) and wake up its waiter"""
+        history = self.completed_tasks if success else self.failed_tasks
+        history[task_id] = payload
+        history.move_to_end(task_id)
+        while len(history) > COORDINATOR_TASK_HISTORY:
+            history.popitem(last=False)
+        waiter = self._task_waiters.get(task_id)
+        if waiter is not None and not waiter.done():
+            waiter.set_result((success, payload))
+        
     async def _handle_status_message_override(self, message):
-        """Override status handler to catch completion events and advance workflow"""
-        print(f"🔍 ENTERING _handle_status_message_override for {self.name}")
-        logger.info(f"🔍 ENTERING _handle_status_message_override for {self.name}")
+        """Override status handler to resolve the waiter of a finished task"""
+        content = message.content or {}
+        task_id = content.get("task_id")
+        if not task_id or content.get("status") != "completed":
+            return
         
-        try:
-            logger.info(f"🔍 SIMPLIFIED: Method entered successfully")
-            logger.info(f"🔍 SIMPLIFIED: Message sender: {message.sender}")
-            logger.info(f"🔍 SIMPLIFIED: Message type: {message.type}")
-            
-            content = message.content or {}
-            task_id = content.get("task_id")
-            status = content.get("status")
-            success = content.get("success")
-            
-            logger.info(f"🔍 SIMPLIFIED: task_id={task_id}, status={status}, success={success}")
-            
-            # For now, just log and return
-            logger.info(f"🔍 SIMPLIFIED: Method completed successfully")
-            
-        except Exception as e:
-            logger.error(f"🔍 SIMPLIFIED: Error in method: {e}")
-            import traceback
-            logger.error(f"🔍 SIMPLIFIED: Traceback: {traceback.format_exc()}")
-        finally:
-            logger.info("✅ coordinator_agent 状态消息处理完成")
+        if content.get("success", True):
+            logger.info(f"✅ Task {task_id} completed by {message.sender}")
+            self._resolve_task(task_id, True, content.get("result") or {})
+        else:
+            result = content.get("result")
+            error = (result.get("error") if isinstance(result, dict) else None) or "agent reported failure"
+            logger.error(f"❌ Task {task_id} failed in {message.sender}: {error}")
+            self._resolve_task(task_id, False, error)
  
     async def _handle_error_message(self, message: Message):
         """Handle error messages and track failed tasks"""
@@ -489,7 +490,7 @@ class CoordinatorAgent(BaseAgent):
             task_id = content.get("task_id")
             
             if task_id:
-                self.failed_tasks.add(task_id)
+                self._resolve_task(task_id, False, content.get("error") or "error message received")
                 logger.error(f"Task {task_id} marked as failed due to error message")
             
             # Call parent error handler
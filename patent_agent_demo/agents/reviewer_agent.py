@@ -5,6 +5,7 @@ Reviews patent drafts for quality, accuracy, and compliance
 
 import asyncio
 import logging
+import os
 from datetime import datetime
 from typing import Dict, List, Any, Optional
 import aiohttp
@@ -20,6 +21,9 @@ from ..google_a2a_client import PatentDraft
 
 logger = logging.getLogger(__name__)
 
+# 综合审核中每个分析分支的超时（秒）；超时或失败的分支降级为对应的回退结果，不拖住整个审核
+REVIEW_ANALYSIS_TIMEOUT = float(os.getenv("REVIEW_ANALYSIS_TIMEOUT", "120"))
+
 class EnhancedDuckDuckGoSearcher:
     """增强版DuckDuckGo检索器"""
     
@@ -127,23 +131,34 @@ class EnhancedReviewerAgent:
             chapter_5_keywords = await self._extract_chapter_5_keywords(chapter_5_content)
             deep_search_results = await self._deep_search_chapter_5(chapter_5_keywords, topic)
             
-            # 2. 三性审核（结合前三章内容）
-            novelty_analysis = await self._analyze_novelty(chapter_3_content, chapter_5_content, deep_search_results)
-            inventiveness_analysis = await self._analyze_inventiveness(chapter_4_content, chapter_5_content, deep_search_results)
-            utility_analysis = await self._analyze_utility(chapter_5_content, deep_search_results)
-            
-            # 3. 批判性分析
-            critical_analysis = await self._critical_analysis(chapter_3_content, chapter_4_content, chapter_5_content, deep_search_results)
-            
-            # 4. 改进建议
-            improvement_suggestions = await self._generate_improvement_suggestions(
-                chapter_3_content, chapter_4_content, chapter_5_content, 
-                novelty_analysis, inventiveness_analysis, utility_analysis, critical_analysis
+            # 2. 三性审核与 3. 批判性分析：只依赖章节内容和深度检索结果，并行执行
+            novelty_analysis, inventiveness_analysis, utility_analysis, critical_analysis = await asyncio.gather(
+                self._run_analysis("新颖性分析",
+                                   self._analyze_novelty(chapter_3_content, chapter_5_content, deep_search_results),
+                                   self._generate_fallback_novelty_analysis),
+                self._run_analysis("创造性分析",
+                                   self._analyze_inventiveness(chapter_4_content, chapter_5_content, deep_search_results),
+                                   self._generate_fallback_inventiveness_analysis),
+                self._run_analysis("实用性分析",
+                                   self._analyze_utility(chapter_5_content, deep_search_results),
+                                   self._generate_fallback_utility_analysis),
+                self._run_analysis("批判性分析",
+                                   self._critical_analysis(chapter_3_content, chapter_4_content, chapter_5_content,
+                                                           deep_search_results),
+                                   self._generate_fallback_critical_analysis),
             )
             
-            # 5. 总体评估
-            overall_assessment = await self._generate_overall_assessment(
-                novelty_analysis, inventiveness_analysis, utility_analysis, critical_analysis
+            # 4. 改进建议与 5. 总体评估：依赖上述四项分析，彼此独立，同样并行
+            improvement_suggestions, overall_assessment = await asyncio.gather(
+                self._run_analysis("改进建议",
+                                   self._generate_improvement_suggestions(
+                                       chapter_3_content, chapter_4_content, chapter_5_content,
+                                       novelty_analysis, inventiveness_analysis, utility_analysis, critical_analysis),
+                                   self._generate_fallback_improvement_suggestions),
+                self._run_analysis("总体评估",
+                                   self._generate_overall_assessment(
+                                       novelty_analysis, inventiveness_analysis, utility_analysis, critical_analysis),
+                                   self._generate_fallback_overall_assessment),
             )
             
             return {
@@ -160,6 +175,16 @@ class EnhancedReviewerAgent:
             logger.error(f"综合审核失败: {e}")
             return self._generate_fallback_review_results()
     
+    async def _run_analysis(self, name: str, analysis, fallback) -> Dict[str, Any]:
+        """Await one review branch under REVIEW_ANALYSIS_TIMEOUT, degrading to its fallback result"""
+        try:
+            return await asyncio.wait_for(analysis, REVIEW_ANALYSIS_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning(f"⏱️ {name}超时（{REVIEW_ANALYSIS_TIMEOUT}s），使用回退结果")
+        except Exception as e:
+            logger.error(f"{name}失败: {e}，使用回退结果")
+        return fallback()
+    
     async def _extract_chapter_5_keywords(self, chapter_5_content: str) -> List[str]:
         """提取第五章关键技术词用于深度检索"""
         prompt = f"""<system>
@@ -13,6 +13,7 @@ from .base_agent import BaseAgent, TaskResult
 from ..openai_client import OpenAIClient
 from ..google_a2a_client import PatentDraft
 from ..telemetry import A2ALoggingProxy
+from .writer_agent_simple import CHAPTER5_PARTS, ENHANCED_PREFIX, WRITER_SECTION_CONCURRENCY, WriterAgentSimple
 
 logger = logging.getLogger(__name__)
 
@@ -383,41 +384,34 @@ class WriterAgent(BaseAgent):
             except Exception as e:
                 logger.error(f"Failed to save drawings: {e}")
 
-            # 第七步：使用LLM进行智能质量检查和内容增强
-            logger.info("Step 7: Performing content enhancement")
-            enhancement_prompt = f"""你是专利质量专家。检查以下专利内容，如果发现内容简单或缺少技术细节，请进行智能增强：
+            # 第七步：逐章节增强，只对本地检查判定为单薄的章节并行调用LLM，提示词只携带该章节
+            logger.info("Step 7: Enhancing thin sections")
+            texts = {"background": background, "summary": summary, "chapter5_0": chapter5_0,
+                     "chapter5_1": chapter5_1, "chapter5_2": chapter5_2, "chapter5_3": chapter5_3,
+                     "chapter5_4": chapter5_4, "claims": claims_text, "drawings": drawings_description}
+            specs = WriterAgentSimple._section_specs(writing_task)
+            semaphore = asyncio.Semaphore(max(1, WRITER_SECTION_CONCURRENCY))
 
-主题：{writing_task.topic}
-
-背景技术：{background}
-发明内容总述：{summary}
-第五章技术方案：{chapter5_content}
-权利要求书：{claims_text}
-附图说明：{drawings_description}
-
-请进行智能分析和增强：
-1. 如果内容过于简单，请补充技术细节
-2. 如果缺少伪代码，请添加具体的算法实现
-3. 如果缺少Mermaid图，请添加技术架构图
-4. 如果技术描述不够深入，请深化技术内容
-
-请直接提供增强后的完整内容。"""
-            
-            enhanced_content = await self.openai_client._generate_response(enhancement_prompt)
-            logger.info(f"Generated enhanced_content, length: {len(enhanced_content)}")
-            try:
-                self._write_progress(progress_dir, "07_enhanced_content.md", "智能增强内容", enhanced_content)
-                logger.info("Successfully saved enhanced content")
-            except Exception as e:
-                logger.error(f"Failed to save enhanced content: {e}")
+            async def enhance(spec):
+                prompt = spec.prompt(texts)
+                if prompt is None:
+                    return
+                async with semaphore:
+                    texts[spec.key] = await self.openai_client._generate_response(prompt)
+                logger.info(f"Generated {spec.key}, length: {len(texts[spec.key])}")
+                try:
+                    self._write_progress(progress_dir, spec.filename, spec.title, texts[spec.key])
+                except Exception as e:
+                    logger.error(f"Failed to save {spec.key}: {e}")
 
-            # 如果增强内容包含完整章节，则更新
-            if "## 第五章" in enhanced_content and "### 5.1" in enhanced_content:
-                detailed_sections["detailed_description"] = enhanced_content
+            await asyncio.gather(*(enhance(spec) for spec in specs if spec.key.startswith(ENHANCED_PREFIX)))
+            adopted = WriterAgentSimple._adopt_enhancements(specs, texts)
+            for key in ("background", "summary"):
+                detailed_sections[key] = adopted[key]
+            detailed_sections["drawings_description"] = adopted["drawings"]
+            if any(adopted[part] != texts[part] for part in CHAPTER5_PARTS):
+                detailed_sections["detailed_description"] = WriterAgentSimple._assemble_chapter5(adopted)
                 logger.info("Updated detailed_description with enhanced content")
-            elif "背景技术" in enhanced_content and len(enhanced_content) > len(background):
-                detailed_sections["background"] = enhanced_content
-                logger.info("Updated background with enhanced content")
 
             logger.info(f"Final detailed_sections keys: {list(detailed_sections.keys())}")
             return detailed_sections
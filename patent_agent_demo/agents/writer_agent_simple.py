@@ -4,16 +4,89 @@ Drafts patent applications and technical documentation without MessageBus depend
 """
 
 import asyncio
+import hashlib
+import json
 import logging
-from typing import Dict, Any, List
+import re
+import time
+from typing import Callable, Dict, Any, List, Optional, Tuple, Union
 import os
 from dataclasses import dataclass
 
 from ..openai_client import OpenAIClient
 from ..google_a2a_client import PatentDraft
+from ..stage_stream import StageDeltaBroadcaster
 
 logger = logging.getLogger(__name__)
 
+# 同时生成的章节数上限（提供方的并发限制仍在其下生效）
+WRITER_SECTION_CONCURRENCY = int(os.getenv("WRITER_SECTION_CONCURRENCY", "4"))
+
+# 章节提示词的版本号；修改提示词模板之外的生成逻辑时手动提升，使已有章节文件失效
+WRITER_PROMPT_VERSION = "1"
+# 记录每个章节文件内容哈希与提示词版本的旁路清单，用于断点续写
+SECTION_MANIFEST = "sections_manifest.json"
+
+# 增强提示词中携带的原章节字符上限；超出时只请求补充内容并追加到章节末尾
+WRITER_ENHANCE_MAX_CHARS = int(os.getenv("WRITER_ENHANCE_MAX_CHARS", "6000"))
+# 章节增强结果的键前缀，如 enhanced_chapter5_1
+ENHANCED_PREFIX = "enhanced_"
+# 标题与摘要文件，总是排在progress.md最前面
+TITLE_ABSTRACT_FILE = "00_title_abstract.md"
+
+# 第五章小节，按整合顺序排列
+CHAPTER5_PARTS = {
+    "chapter5_0": "5.0 技术方案总体介绍",
+    "chapter5_1": "5.1 系统架构设计",
+    "chapter5_2": "5.2 核心算法实现",
+    "chapter5_3": "5.3 数据流程设计",
+    "chapter5_4": "5.4 接口规范定义",
+}
+
+@dataclass
+class SectionSpec:
+    """One generated section; ``prompt`` may be built from the texts of ``depends_on``.
+
+    A callable prompt returning None skips the section. ``min_chars``, ``needs_mermaid``
+    and ``min_code_lines`` are the local thresholds below which a section counts as thin.
+    """
+    key: str
+    title: str
+    prompt: Union[str, Callable[[Dict[str, str]], Optional[str]]]
+    filename: Optional[str] = None
+    depends_on: Tuple[str, ...] = ()
+    min_chars: int = 0
+    needs_mermaid: bool = False
+    min_code_lines: int = 0
+
+def section_profile(text: str) -> Tuple[int, int, int]:
+    """(non-whitespace characters, Mermaid blocks, pseudo-code lines) of a Markdown section"""
+    mermaid_blocks, code_lines, fence = 0, 0, None
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if fence is None:
+                fence = stripped[3:].strip().lower()
+                if fence == "mermaid":
+                    mermaid_blocks += 1
+            else:
+                fence = None
+        elif fence is not None and fence != "mermaid" and stripped:
+            code_lines += 1
+    return len(re.sub(r"\s", "", text)), mermaid_blocks, code_lines
+
+def section_deficiencies(spec: SectionSpec, text: str) -> List[str]:
+    """Why a section is thin by its spec's thresholds; empty when it needs no enhancement"""
+    chars, mermaid_blocks, code_lines = section_profile(text)
+    issues = []
+    if chars < spec.min_chars:
+        issues.append(f"篇幅仅{chars}字（要求≥{spec.min_chars}字）")
+    if spec.needs_mermaid and mermaid_blocks == 0:
+        issues.append("缺少Mermaid图")
+    if code_lines < spec.min_code_lines:
+        issues.append(f"伪代码仅{code_lines}行（要求≥{spec.min_code_lines}行）")
+    return issues
+
 @dataclass
 class WritingTask:
     """Writing task definition"""
@@ -24,6 +97,7 @@ class WritingTask:
     previous_results: Dict[str, Any]
     target_audience: str
     writing_style: str
+    workflow_id: str = ""
 
 @dataclass
 class WritingOutput:
@@ -121,7 +195,8 @@ class WriterAgentSimple:
                 requirements=previous_results.get("requirements", {}),
                 previous_results=previous_results,
                 target_audience="patent_examiners",
-                writing_style="technical_legal"
+                writing_style="technical_legal",
+                workflow_id=task_data.get("workflow_id", "") or ""
             )
 
             # Prepare progress output directory for incremental saving
@@ -132,7 +207,7 @@ class WriterAgentSimple:
             output_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "output")
             progress_dir = os.path.join(output_dir, "progress", f"{topic_str}_{wid8}")
             
-            # 强制创建progress目录，添加详细日志
+            # 强制创建progress目录，添加详细日志；已存在时保留其中的章节文件，按清单续写
             self.logger.info(f"Creating progress directory: {progress_dir}")
             try:
                 os.makedirs(progress_dir, exist_ok=True)
@@ -158,7 +233,8 @@ class WriterAgentSimple:
 
             # Save initial skeleton
             try:
-                self._write_progress(progress_dir, "00_title_abstract.md", "标题与摘要", f"# {getattr(patent_draft, 'title', '')}\n\n{getattr(patent_draft, 'abstract', '')}\n")
+                self._write_progress(progress_dir, TITLE_ABSTRACT_FILE, "标题与摘要", f"# {getattr(patent_draft, 'title', '')}\n\n{getattr(patent_draft, 'abstract', '')}\n")
+                self._rebuild_progress(progress_dir)
                 self.logger.info("Successfully saved initial skeleton")
             except Exception as e:
                 self.logger.error(f"Failed to save initial skeleton: {e}")
@@ -225,198 +301,275 @@ class WriterAgentSimple:
                 error_message=str(e)
             )
             
-    async def _write_detailed_sections(self, writing_task: WritingTask, 
-                                     patent_draft: PatentDraft,
-                                     progress_dir: str) -> Dict[str, str]:
-        """Write detailed sections of the patent application using intelligent LLM prompts"""
-        try:
-            detailed_sections = {}
-            self.logger.info(f"Starting _write_detailed_sections for topic: {writing_task.topic}")
-            
+    @staticmethod
+    def _section_specs(writing_task: WritingTask) -> List[SectionSpec]:
+        """Sections of the detailed description and the sections each prompt reads"""
+        topic = writing_task.topic
+        specs = [
             # 第一步：生成专利大纲（简洁提示词）
-            self.logger.info("Step 1: Generating patent outline")
-            outline_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"设计专利大纲，包含术语定义、技术领域、背景技术、技术方案、权利要求等章节。特别要求第五章包含伪代码和Mermaid图。"""
-            outline_text = await self.openai_client._generate_response(outline_prompt)
-            self.logger.info(f"Generated outline, length: {len(outline_text)}")
-            try:
-                self._write_progress(progress_dir, "01_outline.md", "撰写大纲", outline_text)
-                self.logger.info("Successfully saved outline")
-            except Exception as e:
-                self.logger.error(f"Failed to save outline: {e}")
-
+            SectionSpec("outline", "撰写大纲", f"""你是专利撰写专家。为"{topic}"设计专利大纲，包含术语定义、技术领域、背景技术、技术方案、权利要求等章节。特别要求第五章包含伪代码和Mermaid图。""",
+                        "01_outline.md"),
             # 第二步：生成背景技术（简洁提示词）
-            self.logger.info("Step 2: Generating background")
-            background_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写技术背景，包含技术领域、现有技术方案、技术缺点、要解决的问题。要求具体专业，≥800字。"""
-            background = await self.openai_client._generate_response(background_prompt)
-            detailed_sections["background"] = background
-            self.logger.info(f"Generated background, length: {len(background)}")
-            try:
-                self._write_progress(progress_dir, "02_background.md", "背景技术", background)
-                self.logger.info("Successfully saved background")
-            except Exception as e:
-                self.logger.error(f"Failed to save background: {e}")
-
+            SectionSpec("background", "背景技术", f"""你是专利撰写专家。为"{topic}"撰写技术背景，包含技术领域、现有技术方案、技术缺点、要解决的问题。要求具体专业，≥800字。""",
+                        "02_background.md", min_chars=800),
             # 第三步：生成发明内容总述（简洁提示词）
-            self.logger.info("Step 3: Generating summary")
-            summary_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写发明内容总述，包含核心创新点、系统架构、技术优势。要求具体专业，≥800字。"""
-            summary = await self.openai_client._generate_response(summary_prompt)
-            detailed_sections["summary"] = summary
-            self.logger.info(f"Generated summary, length: {len(summary)}")
-            try:
-                self._write_progress(progress_dir, "03_summary.md", "发明内容总述", summary)
-                self.logger.info("Successfully saved summary")
-            except Exception as e:
-                self.logger.error(f"Failed to save summary: {e}")
-
-            # 第四步：生成第五章技术方案（重点，分步骤生成）
-            self.logger.info("Step 4: Generating Chapter 5 technical solution")
-            
-            # 4.1 生成5.0总体介绍
-            self.logger.info("Step 4.1: Generating 5.0 overview")
-            chapter5_0_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写5.0技术方案总体介绍，包含：
+            SectionSpec("summary", "发明内容总述", f"""你是专利撰写专家。为"{topic}"撰写发明内容总述，包含核心创新点、系统架构、技术优势。要求具体专业，≥800字。""",
+                        "03_summary.md", min_chars=800),
+            # 第四步：生成第五章技术方案（重点，分小节生成；各小节单独保存，全部完成后整合写入04_chapter5.md）
+            SectionSpec("chapter5_0", CHAPTER5_PARTS["chapter5_0"], f"""你是专利撰写专家。为"{topic}"撰写5.0技术方案总体介绍，包含：
 1. 技术方案核心思想概述
 2. 整体技术架构图（Mermaid格式）
 3. 技术方案创新点总结
 4. 技术方案优势分析
-要求≥1000字，必须包含Mermaid架构图。"""
-            chapter5_0 = await self.openai_client._generate_response(chapter5_0_prompt)
-            self.logger.info(f"Generated chapter5_0, length: {len(chapter5_0)}")
-
-            # 4.2 生成5.1系统架构设计
-            self.logger.info("Step 4.2: Generating 5.1 system architecture")
-            chapter5_1_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写5.1系统架构设计，包含：
+要求≥1000字，必须包含Mermaid架构图。""", "04_chapter5_0.md",
+                        min_chars=1000, needs_mermaid=True),
+            SectionSpec("chapter5_1", CHAPTER5_PARTS["chapter5_1"], f"""你是专利撰写专家。为"{topic}"撰写5.1系统架构设计，包含：
 1. 系统整体架构图（Mermaid格式）
 2. 各模块功能详细描述
 3. 子功能模块架构图（Mermaid格式）
 4. 核心算法伪代码（≥50行Python代码）
-要求≥1500字，必须包含Mermaid图和伪代码。"""
-            chapter5_1 = await self.openai_client._generate_response(chapter5_1_prompt)
-            self.logger.info(f"Generated chapter5_1, length: {len(chapter5_1)}")
-
-            # 4.3 生成5.2核心算法实现
-            self.logger.info("Step 4.3: Generating 5.2 core algorithm")
-            chapter5_2_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写5.2核心算法实现，包含：
+要求≥1500字，必须包含Mermaid图和伪代码。""", "04_chapter5_1.md",
+                        min_chars=1500, needs_mermaid=True, min_code_lines=50),
+            SectionSpec("chapter5_2", CHAPTER5_PARTS["chapter5_2"], f"""你是专利撰写专家。为"{topic}"撰写5.2核心算法实现，包含：
 1. 核心算法流程图（Mermaid格式）
 2. 算法伪代码实现（≥50行Python代码）
 3. 算法复杂度分析
 4. 子算法模块图（Mermaid格式）
-要求≥1500字，必须包含Mermaid图和伪代码。"""
-            chapter5_2 = await self.openai_client._generate_response(chapter5_2_prompt)
-            self.logger.info(f"Generated chapter5_2, length: {len(chapter5_2)}")
-
-            # 4.4 生成5.3数据流程设计
-            self.logger.info("Step 4.4: Generating 5.3 data flow")
-            chapter5_3_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写5.3数据流程设计，包含：
+要求≥1500字，必须包含Mermaid图和伪代码。""", "04_chapter5_2.md",
+                        min_chars=1500, needs_mermaid=True, min_code_lines=50),
+            SectionSpec("chapter5_3", CHAPTER5_PARTS["chapter5_3"], f"""你是专利撰写专家。为"{topic}"撰写5.3数据流程设计，包含：
 1. 数据流程图（Mermaid格式）
 2. 数据结构定义
 3. 数据处理伪代码（≥50行Python代码）
 4. 数据处理子模块图（Mermaid格式）
-要求≥1500字，必须包含Mermaid图和伪代码。"""
-            chapter5_3 = await self.openai_client._generate_response(chapter5_3_prompt)
-            self.logger.info(f"Generated chapter5_3, length: {len(chapter5_3)}")
-
-            # 4.5 生成5.4接口规范定义
-            self.logger.info("Step 4.5: Generating 5.4 interface specification")
-            chapter5_4_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写5.4接口规范定义，包含：
+要求≥1500字，必须包含Mermaid图和伪代码。""", "04_chapter5_3.md",
+                        min_chars=1500, needs_mermaid=True, min_code_lines=50),
+            SectionSpec("chapter5_4", CHAPTER5_PARTS["chapter5_4"], f"""你是专利撰写专家。为"{topic}"撰写5.4接口规范定义，包含：
 1. 接口架构图（Mermaid格式）
 2. API接口规范
 3. 接口实现伪代码（≥50行Python代码）
 4. 接口调用流程图（Mermaid格式）
-要求≥1500字，必须包含Mermaid图和伪代码。"""
-            chapter5_4 = await self.openai_client._generate_response(chapter5_4_prompt)
-            self.logger.info(f"Generated chapter5_4, length: {len(chapter5_4)}")
+要求≥1500字，必须包含Mermaid图和伪代码。""", "04_chapter5_4.md",
+                        min_chars=1500, needs_mermaid=True, min_code_lines=50),
+            # 第五步：生成权利要求书（简洁提示词）
+            SectionSpec("claims", "权利要求书", f"""你是专利撰写专家。为"{topic}"撰写权利要求书，包含1项独立权利要求和3-4项从属权利要求。要求具体清晰，符合专利法要求。""",
+                        "05_claims.md"),
+            # 第六步：生成附图说明（简洁提示词）
+            SectionSpec("drawings", "附图说明", f"""你是专利撰写专家。为"{topic}"撰写附图说明，包含系统架构图、数据流程图、核心算法图的Mermaid代码和详细说明。要求≥1000字。""",
+                        "06_drawings.md", min_chars=1000, needs_mermaid=True),
+        ]
+        # 第七步：逐章节增强，只对本地检查判定为单薄的章节调用LLM，各章节增强并行进行
+        return specs + [WriterAgentSimple._enhancement_spec(topic, spec) for spec in specs
+                        if spec.min_chars or spec.needs_mermaid or spec.min_code_lines]
 
-            # 4.6 整合第五章内容
-            self.logger.info("Step 4.6: Integrating Chapter 5 content")
-            chapter5_content = f"""## 第五章 技术方案详细阐述
+    @staticmethod
+    def _enhancement_spec(topic: str, spec: SectionSpec) -> SectionSpec:
+        """Enhancement pass of one section, skipped when the section is not thin.
 
-### 5.0 技术方案总体介绍
+        The prompt carries only this section, at most WRITER_ENHANCE_MAX_CHARS of it;
+        a longer section is asked for supplementary content to append instead of a rewrite.
+        """
+        def prompt(texts: Dict[str, str]) -> Optional[str]:
+            text = texts[spec.key]
+            issues = section_deficiencies(spec, text)
+            if not issues:
+                return None
+            issue_lines = "\n".join(f"- {issue}" for issue in issues)
+            if len(text) > WRITER_ENHANCE_MAX_CHARS:
+                text = text[:WRITER_ENHANCE_MAX_CHARS] + "\n……（后文略）"
+                instruction = "请针对上述不足撰写需要补充的内容（如Mermaid图、伪代码、技术细节），补充内容将追加到本节末尾，只输出补充部分。"
+            else:
+                instruction = "请在保留原有技术内容的基础上针对上述不足进行增强，只输出增强后的本节完整内容，不要输出其他章节。"
+            return f"""你是专利质量专家。以下是专利"{topic}"中"{spec.title}"一节，检查发现以下不足：
+{issue_lines}
 
-{chapter5_0}
+{instruction}
 
-### 5.1 系统架构设计
+{text}"""
 
-{chapter5_1}
+        return SectionSpec(ENHANCED_PREFIX + spec.key, f"{spec.title}（增强）", prompt,
+                           f"07_enhanced_{spec.key}.md", depends_on=(spec.key,))
 
-### 5.2 核心算法实现
+    @staticmethod
+    def _adopt_enhancements(specs: List[SectionSpec], texts: Dict[str, str]) -> Dict[str, str]:
+        """Section texts with each enhancement adopted only if it is no thinner and adds something"""
+        adopted = dict(texts)
+        for spec in specs:
+            enhanced = texts.get(ENHANCED_PREFIX + spec.key)
+            if not enhanced or spec.key not in texts:
+                continue
+            original = texts[spec.key]
+            candidate = f"{original}\n\n{enhanced}" if len(original) > WRITER_ENHANCE_MAX_CHARS else enhanced
+            before, after = section_profile(original), section_profile(candidate)
+            if all(a >= b for a, b in zip(after, before)) and after != before:
+                adopted[spec.key] = candidate
+        return adopted
 
-{chapter5_2}
+    @staticmethod
+    def _assemble_chapter5(texts: Dict[str, str]) -> str:
+        """Chapter 5 in section order from its generated subsections"""
+        parts = [f"### {title}\n\n{texts[key]}" for key, title in CHAPTER5_PARTS.items()]
+        return "## 第五章 技术方案详细阐述\n\n" + "\n\n".join(parts)
 
-### 5.3 数据流程设计
+    async def _generate_sections(self, writing_task: WritingTask, specs: List[SectionSpec], progress_dir: str,
+                                 on_section: Optional[Callable[[str, Dict[str, str]], None]] = None) -> Dict[str, str]:
+        """Generate sections as a dependency graph; independent sections run concurrently.
 
-{chapter5_3}
+        At most WRITER_SECTION_CONCURRENCY LLM calls are in flight (the provider's own
+        limiters still apply underneath). Section files left by an earlier run are reused
+        when the manifest confirms their content hash and prompt version. ``on_section``
+        runs as soon as each section lands.
+        """
+        texts: Dict[str, str] = {}
+        done: Dict[str, asyncio.Event] = {spec.key: asyncio.Event() for spec in specs}
+        semaphore = asyncio.Semaphore(max(1, WRITER_SECTION_CONCURRENCY))
+        manifest = self._load_section_manifest(progress_dir)
 
-### 5.4 接口规范定义
+        async def run(spec: SectionSpec) -> None:
+            for dep in spec.depends_on:
+                await done[dep].wait()
+            prompt = spec.prompt(texts) if callable(spec.prompt) else spec.prompt
+            text = None if prompt is None else self._load_section(progress_dir, spec, prompt, manifest)
+            if prompt is None:
+                text = ""
+                self.logger.info(f"⏭️ 章节 {spec.key} 无需生成，跳过LLM调用")
+                if spec.filename:
+                    try:
+                        self._forget_section(progress_dir, manifest, spec)
+                    except OSError as e:
+                        self.logger.error(f"Failed to drop stale {spec.key}: {e}")
+            elif text is not None:
+                self.logger.info(f"♻️ 复用已有章节 {spec.key} ({spec.filename})，跳过LLM调用")
+            else:
+                async with semaphore:
+                    self.logger.info(f"Generating section {spec.key}")
+                    text = await self._generate_section(writing_task, prompt, spec.key, progress_dir,
+                                                        spec.filename, spec.title)
+                self.logger.info(f"Generated {spec.key}, length: {len(text)}")
+                if spec.filename:
+                    try:
+                        self._write_progress(progress_dir, spec.filename, spec.title, text)
+                        self._record_section(progress_dir, manifest, spec, prompt, text)
+                    except Exception as e:
+                        self.logger.error(f"Failed to save {spec.key}: {e}")
+            texts[spec.key] = text
+            if spec.filename:
+                try:
+                    self._rebuild_progress(progress_dir, specs, manifest)
+                except OSError as e:
+                    self.logger.error(f"Failed to rebuild progress.md: {e}")
+            if on_section:
+                on_section(spec.key, texts)
+            done[spec.key].set()
 
-{chapter5_4}"""
+        tasks = [asyncio.ensure_future(run(spec)) for spec in specs]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            raise
+        return texts
 
-            detailed_sections["detailed_description"] = chapter5_content
-            self.logger.info(f"Set detailed_description, length: {len(chapter5_content)}")
-            try:
-                self._write_progress(progress_dir, "04_chapter5.md", "第五章技术方案详细阐述", chapter5_content)
-                self.logger.info("Successfully saved chapter5")
-            except Exception as e:
-                self.logger.error(f"Failed to save chapter5: {e}")
+    @staticmethod
+    def _section_hash(text: str) -> str:
+        return hashlib.sha256(text.strip().encode("utf-8")).hexdigest()
 
-            # 第五步：生成权利要求书（简洁提示词）
-            self.logger.info("Step 5: Generating claims")
-            claims_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写权利要求书，包含1项独立权利要求和3-4项从属权利要求。要求具体清晰，符合专利法要求。"""
-            claims_text = await self.openai_client._generate_response(claims_prompt)
-            detailed_sections["claims"] = claims_text.splitlines()
-            self.logger.info(f"Generated claims, lines: {len(claims_text.splitlines())}")
-            try:
-                self._write_progress(progress_dir, "05_claims.md", "权利要求书", claims_text)
-                self.logger.info("Successfully saved claims")
-            except Exception as e:
-                self.logger.error(f"Failed to save claims: {e}")
+    @staticmethod
+    def _prompt_version(prompt: str) -> str:
+        return hashlib.sha256(f"{WRITER_PROMPT_VERSION}\n{prompt}".encode("utf-8")).hexdigest()
 
-            # 第六步：生成附图说明（简洁提示词）
-            self.logger.info("Step 6: Generating drawings description")
-            drawings_prompt = f"""你是专利撰写专家。为"{writing_task.topic}"撰写附图说明，包含系统架构图、数据流程图、核心算法图的Mermaid代码和详细说明。要求≥1000字。"""
-            drawings_description = await self.openai_client._generate_response(drawings_prompt)
-            detailed_sections["drawings_description"] = drawings_description
-            self.logger.info(f"Generated drawings_description, length: {len(drawings_description)}")
-            try:
-                self._write_progress(progress_dir, "06_drawings.md", "附图说明", drawings_description)
-                self.logger.info("Successfully saved drawings")
-            except Exception as e:
-                self.logger.error(f"Failed to save drawings: {e}")
+    def _load_section_manifest(self, progress_dir: str) -> Dict[str, Any]:
+        path = os.path.join(progress_dir, SECTION_MANIFEST)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            return manifest if isinstance(manifest.get("sections"), dict) else {"sections": {}}
+        except (OSError, ValueError, AttributeError):
+            return {"sections": {}}
 
-            # 第七步：使用LLM进行智能质量检查和内容增强
-            self.logger.info("Step 7: Performing content enhancement")
-            enhancement_prompt = f"""你是专利质量专家。检查以下专利内容，如果发现内容简单或缺少技术细节，请进行智能增强：
+    def _load_section(self, progress_dir: str, spec: SectionSpec, prompt: str,
+                      manifest: Dict[str, Any]) -> Optional[str]:
+        """Text of a section file from an earlier run, None unless hash and prompt version match"""
+        entry = manifest["sections"].get(spec.key)
+        if not spec.filename or not entry or entry.get("filename") != spec.filename:
+            return None
+        if entry.get("prompt_version") != self._prompt_version(prompt):
+            return None
+        try:
+            with open(os.path.join(progress_dir, spec.filename), "r", encoding="utf-8") as f:
+                content = f.read()
+        except OSError:
+            return None
+        header = f"# {spec.title}\n\n"
+        text = content[len(header):].strip() if content.startswith(header) else ""
+        if not text or self._section_hash(text) != entry.get("sha256"):
+            return None
+        return text
 
-主题：{writing_task.topic}
+    def _record_section(self, progress_dir: str, manifest: Dict[str, Any], spec: SectionSpec,
+                        prompt: str, text: str) -> None:
+        """Record a finished section in the manifest"""
+        manifest["sections"][spec.key] = {
+            "filename": spec.filename,
+            "sha256": self._section_hash(text),
+            "prompt_version": self._prompt_version(prompt),
+            "length": len(text),
+            "written_at": time.time(),
+        }
+        self._save_section_manifest(progress_dir, manifest)
 
-背景技术：{background}
-发明内容总述：{summary}
-第五章技术方案：{chapter5_content}
-权利要求书：{claims_text}
-附图说明：{drawings_description}
+    def _forget_section(self, progress_dir: str, manifest: Dict[str, Any], spec: SectionSpec) -> None:
+        """Drop a skipped section left by an earlier run, so its stale text never reaches progress.md"""
+        if manifest["sections"].pop(spec.key, None) is not None:
+            self._save_section_manifest(progress_dir, manifest)
+        try:
+            os.remove(os.path.join(progress_dir, spec.filename))
+        except FileNotFoundError:
+            pass
 
-请进行智能分析和增强：
-1. 如果内容过于简单，请补充技术细节
-2. 如果缺少伪代码，请添加具体的算法实现
-3. 如果缺少Mermaid图，请添加技术架构图
-4. 如果技术描述不够深入，请深化技术内容
+    def _save_section_manifest(self, progress_dir: str, manifest: Dict[str, Any]) -> None:
+        """Atomically rewrite the section manifest"""
+        path = os.path.join(progress_dir, SECTION_MANIFEST)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
 
-请直接提供增强后的完整内容。"""
-            
-            enhanced_content = await self.openai_client._generate_response(enhancement_prompt)
-            self.logger.info(f"Generated enhanced_content, length: {len(enhanced_content)}")
-            try:
-                self._write_progress(progress_dir, "07_enhanced_content.md", "智能增强内容", enhanced_content)
-                self.logger.info("Successfully saved enhanced content")
-            except Exception as e:
-                self.logger.error(f"Failed to save enhanced content: {e}")
+    async def _write_detailed_sections(self, writing_task: WritingTask, 
+                                     patent_draft: PatentDraft,
+                                     progress_dir: str) -> Dict[str, str]:
+        """Write detailed sections of the patent application using intelligent LLM prompts"""
+        try:
+            self.logger.info(f"Starting _write_detailed_sections for topic: {writing_task.topic}")
 
-            # 如果增强内容包含完整章节，则更新
-            if "## 第五章" in enhanced_content and "### 5.1" in enhanced_content:
-                detailed_sections["detailed_description"] = enhanced_content
-                self.logger.info("Updated detailed_description with enhanced content")
-            elif "背景技术" in enhanced_content and len(enhanced_content) > len(background):
-                detailed_sections["background"] = enhanced_content
-                self.logger.info("Updated background with enhanced content")
+            specs = self._section_specs(writing_task)
+            chapter5_keys = [*CHAPTER5_PARTS, *(ENHANCED_PREFIX + part for part in CHAPTER5_PARTS)]
+
+            def on_section(key: str, texts: Dict[str, str]) -> None:
+                # 第五章各小节及其增强全部完成后立即整合并写入04_chapter5.md
+                if key in chapter5_keys and all(part in texts for part in chapter5_keys):
+                    try:
+                        # 各小节已在progress.md中，整合后的章节只写单独文件
+                        self._write_progress(progress_dir, "04_chapter5.md", "第五章技术方案详细阐述",
+                                             self._assemble_chapter5(self._adopt_enhancements(specs, texts)))
+                        self.logger.info("Successfully saved chapter5")
+                    except Exception as e:
+                        self.logger.error(f"Failed to save chapter5: {e}")
+
+            texts = await self._generate_sections(writing_task, specs, progress_dir, on_section)
+            adopted = self._adopt_enhancements(specs, texts)
+            enhanced = [spec.key for spec in specs if adopted.get(spec.key) != texts[spec.key]]
+            if enhanced:
+                self.logger.info(f"Adopted enhanced content for sections: {enhanced}")
+
+            detailed_sections = {
+                "background": adopted["background"],
+                "summary": adopted["summary"],
+                "detailed_description": self._assemble_chapter5(adopted),
+                "claims": adopted["claims"].splitlines(),
+                "drawings_description": adopted["drawings"],
+            }
 
             self.logger.info(f"Final detailed_sections keys: {list(detailed_sections.keys())}")
             return detailed_sections
@@ -477,22 +630,82 @@ class WriterAgentSimple:
                 return _coerce(cand)
         return _coerce({})
 
+    async def _generate_section(self, writing_task: WritingTask, prompt: str, section: str,
+                                progress_dir: str = None, filename: str = None,
+                                section_title: str = None) -> str:
+        """Stream one section: coalesced deltas go to WebSocket subscribers and, if a file is given, to the section file"""
+        started = False
+
+        def append_to_file(chunk: str) -> None:
+            nonlocal started
+            self._write_progress_delta(progress_dir, filename, section_title, chunk, start=not started)
+            started = True
+
+        broadcaster = StageDeltaBroadcaster(
+            writing_task.workflow_id, "drafting", section,
+            on_flush=append_to_file if progress_dir and filename else None
+        )
+        parts: List[str] = []
+        try:
+            async for delta in self.openai_client._generate_response_stream(prompt):
+                parts.append(delta)
+                await broadcaster.push(delta)
+        finally:
+            await broadcaster.close()
+        return "".join(parts).strip()
+
+    def _write_progress_delta(self, progress_dir: str, filename: str, section_title: str,
+                              delta: str, start: bool = False) -> None:
+        """Append a streamed chunk to a section file (``start`` truncates it and writes the header)"""
+        os.makedirs(progress_dir, exist_ok=True)
+        path = os.path.join(progress_dir, filename)
+        with open(path, "w" if start else "a", encoding="utf-8") as f:
+            if start:
+                f.write(f"# {section_title}\n\n")
+            f.write(delta)
+
     def _write_progress(self, progress_dir: str, filename: str, section_title: str, body: str) -> None:
-        """Append incremental content to a progress file and write a section file."""
+        """Write the final section file (progress.md is rebuilt from the section files)."""
         try:
             os.makedirs(progress_dir, exist_ok=True)
         except Exception:
             pass
-        # Write individual section file
         path = os.path.join(progress_dir, filename)
         with open(path, "w", encoding="utf-8") as f:
             f.write(f"# {section_title}\n\n{body.strip()}\n")
-        # Append to combined progress.md
-        progress_md = os.path.join(progress_dir, "progress.md")
-        with open(progress_md, "a", encoding="utf-8") as f:
-            f.write(f"\n\n## {section_title}\n\n{body.strip()}\n")
         self.logger.info(f"WROTE_PROGRESS dir={progress_dir} file={filename} len={len(body or '')}")
 
+    def _rebuild_progress(self, progress_dir: str, specs: Optional[List[SectionSpec]] = None,
+                          manifest: Optional[Dict[str, Any]] = None) -> None:
+        """Rewrite the combined progress.md in spec order from the finished section files.
+
+        Only sections whose file matches the manifest hash are included, so sections
+        still streaming (or left stale by an earlier run) never show up, and a resumed
+        run produces the same file instead of appending duplicates.
+        """
+        entries = [(TITLE_ABSTRACT_FILE, "标题与摘要", None)]
+        sections = (manifest or {}).get("sections", {})
+        for spec in specs or []:
+            entry = sections.get(spec.key)
+            if spec.filename and entry and entry.get("filename") == spec.filename:
+                entries.append((spec.filename, spec.title, entry.get("sha256")))
+        parts = []
+        for filename, title, sha256 in entries:
+            try:
+                with open(os.path.join(progress_dir, filename), "r", encoding="utf-8") as f:
+                    content = f.read()
+            except OSError:
+                continue
+            header = f"# {title}\n\n"
+            body = content[len(header):].strip() if content.startswith(header) else ""
+            if body and (sha256 is None or self._section_hash(body) == sha256):
+                parts.append(f"\n\n## {title}\n\n{body}\n")
+        path = os.path.join(progress_dir, "progress.md")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(parts))
+        os.replace(tmp_path, path)
+
     async def _check_patent_compliance(self, patent_draft: PatentDraft) -> Dict[str, Any]:
         """Check legal compliance of the patent draft"""
         try:
@@ -0,0 +1,161 @@
+"""
+Per-provider circuit breaker
+Opens after N consecutive failures or a high error rate over recent calls so
+traffic skips a dead provider immediately; after a cool-down it half-opens and
+a cheap probe (or a single trial request) decides whether to close again.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", "0.5"))
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))
+LLM_BREAKER_MIN_CALLS = int(os.getenv("LLM_BREAKER_MIN_CALLS", "10"))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Closed -> open on failures, open -> half-open after cool-down, half-open -> closed on a good probe"""
+
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+                 error_rate_threshold: float = LLM_BREAKER_ERROR_RATE, window: int = LLM_BREAKER_WINDOW,
+                 min_calls: int = LLM_BREAKER_MIN_CALLS, cooldown: float = LLM_BREAKER_COOLDOWN,
+                 probe: Optional[Callable[[], Awaitable[Any]]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.error_rate_threshold = error_rate_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self.probe = probe
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._probe_task: Optional[asyncio.Task] = None
+        self.total_successes = 0
+        self.total_failures = 0
+        self.short_circuited = 0
+        self.probes = 0
+
+    def error_rate(self) -> float:
+        if not self._outcomes:
+            return 0.0
+        return self._outcomes.count(False) / len(self._outcomes)
+
+    def allow_request(self) -> bool:
+        """Whether a real request may go to this provider now"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+            self._half_open()
+        if self.state == HALF_OPEN and self.probe is None and not self._trial_in_flight:
+            # 没有探测函数时放行一个试探请求
+            self._trial_in_flight = True
+            return True
+        self.short_circuited += 1
+        return False
+
+    def record_success(self) -> None:
+        self.total_successes += 1
+        self.consecutive_failures = 0
+        self._outcomes.append(True)
+        if self.state != CLOSED:
+            self._close()
+
+    def record_failure(self) -> None:
+        self.total_failures += 1
+        self.consecutive_failures += 1
+        self._outcomes.append(False)
+        if self.state == HALF_OPEN:
+            self._open("试探请求失败")
+            return
+        if self.state == CLOSED:
+            if self.consecutive_failures >= self.failure_threshold:
+                self._open(f"连续失败{self.consecutive_failures}次")
+            elif len(self._outcomes) >= self.min_calls and self.error_rate() >= self.error_rate_threshold:
+                self._open(f"错误率{self.error_rate():.0%}")
+
+    def record_cancelled(self) -> None:
+        """A request was cancelled (e.g. a losing hedge): no outcome, but free the half-open trial slot"""
+        self._trial_in_flight = False
+
+    def _open(self, reason: str) -> None:
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+        self._trial_in_flight = False
+        logger.warning(f"🔌 {self.name}熔断器打开（{reason}），{self.cooldown:.0f}s内直接跳过")
+
+    def _close(self) -> None:
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._outcomes.clear()
+        self._trial_in_flight = False
+        logger.info(f"✅ {self.name}熔断器关闭，恢复正常调用")
+
+    def _half_open(self) -> None:
+        self.state = HALF_OPEN
+        self._trial_in_flight = False
+        logger.info(f"🔍 {self.name}熔断器半开，开始探测")
+        if self.probe is not None and (self._probe_task is None or self._probe_task.done()):
+            try:
+                self._probe_task = asyncio.get_running_loop().create_task(self._run_probe())
+            except RuntimeError:
+                self._probe_task = None
+
+    async def _run_probe(self) -> None:
+        self.probes += 1
+        try:
+            await self.probe()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"🔍 {self.name}探测失败: {e}")
+            if self.state == HALF_OPEN:
+                self._open("探测失败")
+            return
+        if self.state == HALF_OPEN:
+            self._close()
+
+    def status(self) -> Dict[str, Any]:
+        retry_in = 0.0
+        if self.state == OPEN:
+            retry_in = max(self.cooldown - (time.monotonic() - self.opened_at), 0.0)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "error_rate": round(self.error_rate(), 4),
+            "retry_in": round(retry_in, 3),
+            "total_successes": self.total_successes,
+            "total_failures": self.total_failures,
+            "short_circuited": self.short_circuited,
+            "probes": self.probes,
+        }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+
+def get_circuit_breaker(name: str, probe: Optional[Callable[[], Awaitable[Any]]] = None) -> CircuitBreaker:
+    """Process-wide breaker for a provider (the first probe registered is kept)"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers[name] = CircuitBreaker(name, probe=probe)
+    elif breaker.probe is None and probe is not None:
+        breaker.probe = probe
+    return breaker
+
+
+def get_circuit_breaker_status() -> Dict[str, Any]:
+    return {name: breaker.status() for name, breaker in _breakers.items()}
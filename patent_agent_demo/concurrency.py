@@ -0,0 +1,196 @@
+"""
+Adaptive concurrency control for LLM providers
+AIMD limiter: the in-flight window grows additively while calls succeed and is
+cut multiplicatively on 429 / timeout, so throughput tracks the provider's real
+capacity instead of a hardcoded limit. Retry-After pauses new admissions.
+"""
+
+import time
+import asyncio
+import logging
+from collections import deque
+from email.utils import parsedate_to_datetime
+from typing import Any, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD concurrency limiter usable as ``async with limiter:``"""
+
+    def __init__(self, name: str, initial_limit: float = 1, min_limit: float = 1,
+                 max_limit: float = 16, increase_step: float = 1.0,
+                 decrease_factor: float = 0.5, decrease_cooldown: float = 1.0):
+        self.name = name
+        self.min_limit = float(min_limit)
+        self.max_limit = float(max(max_limit, min_limit))
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self._window = float(min(max(initial_limit, self.min_limit), self.max_limit))
+        self._in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+        self.successes = 0
+        self.overloads = 0
+        self.timeouts = 0
+
+    @property
+    def limit(self) -> int:
+        """Current integer number of allowed in-flight calls"""
+        return max(int(self._window), 1)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def paused_for(self) -> float:
+        return max(self._paused_until - time.monotonic(), 0.0)
+
+    async def acquire(self) -> None:
+        while True:
+            pause = self.paused_for()
+            if pause > 0:
+                await asyncio.sleep(pause)
+                continue
+            # 新来的请求只有在没有等待者时才能直接占用空位，否则排在等待队列之后
+            if self._in_flight < self.limit and not self._waiters:
+                self._in_flight += 1
+                return
+            break
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif waiter.done() and not waiter.cancelled():
+                # 名额已移交但被取消，归还给下一个等待者
+                self.release()
+            raise
+        # 名额由_wake_next直接移交，后来者无法抢走；移交后若遇Retry-After暂停，持有名额等待
+        pause = self.paused_for()
+        if pause > 0:
+            try:
+                await asyncio.sleep(pause)
+            except asyncio.CancelledError:
+                self.release()
+                raise
+
+    def release(self) -> None:
+        self._in_flight = max(self._in_flight - 1, 0)
+        self._wake_next()
+
+    def _wake_next(self) -> None:
+        """Hand free slots to the earliest waiters (FIFO), counting them as in flight"""
+        available = self.limit - self._in_flight
+        while available > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self._in_flight += 1
+                waiter.set_result(None)
+                available -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+    def record_success(self) -> None:
+        """Additive increase: the window grows by ``increase_step`` per full window of successes"""
+        self.successes += 1
+        old_limit = self.limit
+        self._window = min(self._window + self.increase_step / self._window, self.max_limit)
+        if self.limit > old_limit:
+            logger.info(f"📈 {self.name}并发窗口提升: {old_limit} -> {self.limit}")
+            self._wake_next()
+
+    def record_overload(self, retry_after: Optional[float] = None) -> None:
+        """Multiplicative decrease on 429, pausing admissions for Retry-After seconds"""
+        self.overloads += 1
+        self._decrease("429")
+        if retry_after and retry_after > 0:
+            self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            logger.warning(f"⏸️ {self.name}遵循Retry-After，暂停新请求 {retry_after:.1f}s")
+
+    def record_timeout(self) -> None:
+        """Multiplicative decrease on timeout"""
+        self.timeouts += 1
+        self._decrease("timeout")
+
+    def _decrease(self, reason: str) -> None:
+        now = time.monotonic()
+        # 同一窗口内的多次失败只收缩一次，避免在途请求把窗口连续砍到底
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        old_limit = self.limit
+        self._window = max(self._window * self.decrease_factor, self.min_limit)
+        logger.warning(f"📉 {self.name}并发窗口收缩({reason}): {old_limit} -> {self.limit}")
+
+    def status(self) -> Dict[str, Any]:
+        limit = self.limit
+        return {
+            "name": self.name,
+            "window": round(self._window, 3),
+            "limit": limit,
+            "min_limit": int(self.min_limit),
+            "max_limit": int(self.max_limit),
+            "in_flight": self._in_flight,
+            "available": max(limit - self._in_flight, 0),
+            "waiting": len(self._waiters),
+            "paused_for": round(self.paused_for(), 3),
+            "successes": self.successes,
+            "overloads": self.overloads,
+            "timeouts": self.timeouts,
+        }
+
+
+def _status_code(error: BaseException) -> Optional[int]:
+    code = getattr(error, "status_code", None)
+    if code is None:
+        response = getattr(error, "response", None)
+        code = getattr(response, "status_code", None)
+    return code if isinstance(code, int) else None
+
+
+def is_overload_error(error: BaseException) -> bool:
+    """True for 429 / provider concurrency-limit errors"""
+    if _status_code(error) == 429:
+        return True
+    msg = str(error).lower()
+    return "429" in msg or "concurrent" in msg or "rate limit" in msg
+
+
+def is_timeout_error(error: BaseException) -> bool:
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError)):
+        return True
+    name = type(error).__name__.lower()
+    return "timeout" in name
+
+
+def retry_after_seconds(error: BaseException) -> Optional[float]:
+    """Parse Retry-After / retry-after-ms from the error's HTTP response, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        ms = headers.get("retry-after-ms")
+        if ms:
+            return max(float(ms) / 1000.0, 0.0)
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(float(value), 0.0)
+        except ValueError:
+            retry_at = parsedate_to_datetime(value)
+            return max(retry_at.timestamp() - time.time(), 0.0)
+    except Exception:
+        return None
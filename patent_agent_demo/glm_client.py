@@ -1,23 +1,18 @@
 import os
 import json
-import asyncio
-import ssl
 import time
+import asyncio
 import logging
-from typing import Dict, Any, List, Optional
+from typing import AsyncIterator, Dict, Any, List, Optional
 from dataclasses import dataclass
 
-# 尝试导入官方OpenAI库
-try:
-    from openai import OpenAI
-    OPENAI_AVAILABLE = True
-except ImportError:
-    OPENAI_AVAILABLE = False
-
-# 确保urllib总是可用
-import urllib.request
-import urllib.parse
-import urllib.error
+from .http_pool import OPENAI_SDK_AVAILABLE, get_async_openai_client, get_shared_http_client
+from .concurrency import is_overload_error, is_timeout_error, retry_after_seconds
+from .key_pool import KeyPool, KeySlot
+from .llm_cache import cached_generate, cache_bypassed, get_llm_cache, make_cache_key
+from .singleflight import llm_singleflight
+from .usage_ledger import coalesced_llm_call, record_llm_usage
+from .retry_policy import RetryPolicy, StageDeadlineExceeded, attempt_timeout, check_stage_deadline, is_retryable
 
 # 设置日志
 logger = logging.getLogger(__name__)
@@ -28,14 +23,28 @@ from .google_a2a_client import PatentAnalysis, PatentDraft, SearchResult
 GLM_API_BASE = "https://open.bigmodel.cn/api/paas/v4/"
 GLM_CHAT_COMPLETIONS = GLM_API_BASE + "chat/completions"
 GLM_MODEL = "glm-4.5-flash"
-
-# 添加并发控制：GLM-4.5-flash只能支持1个并发请求，避免429错误
-# 进一步降低并发，确保不会触发429错误
-GLM_CONCURRENCY_LIMIT = 1
-_glm_semaphore = asyncio.Semaphore(GLM_CONCURRENCY_LIMIT)
-
-# 添加全局锁，确保同一时间只有一个GLM API调用
-_glm_global_lock = asyncio.Lock()
+GLM_SYSTEM_PROMPT = "你是一个专业的专利分析师和专利撰写专家"
+GLM_TEMPERATURE = 0.3
+
+# 自适应并发控制（AIMD）：成功时加性提升并发窗口，遇到429/超时乘性收缩，
+# 并遵循Retry-After，使吞吐量跟随GLM服务端的真实容量，而不是固定为1
+# 每个Key拥有独立的并发窗口和令牌桶，多Key时总吞吐量随Key数量线性扩展
+GLM_CONCURRENCY_INITIAL = int(os.getenv("GLM_CONCURRENCY_INITIAL", "1"))
+GLM_CONCURRENCY_MAX = int(os.getenv("GLM_CONCURRENCY_MAX", "8"))
+# 429未携带Retry-After时的默认暂停时间（秒）
+GLM_OVERLOAD_PAUSE = float(os.getenv("GLM_OVERLOAD_PAUSE", "5"))
+# 每个Key的请求速率预算（每分钟请求数，0表示不限）与突发容量
+GLM_KEY_RPM = float(os.getenv("GLM_KEY_RPM", "60"))
+GLM_KEY_BURST = float(os.getenv("GLM_KEY_BURST", "10"))
+# 连续多少次429后暂停该Key，以及暂停时长（秒）
+GLM_KEY_BENCH_THRESHOLD = int(os.getenv("GLM_KEY_BENCH_THRESHOLD", "3"))
+GLM_KEY_BENCH_SECONDS = float(os.getenv("GLM_KEY_BENCH_SECONDS", "60"))
+
+# GLM调用的统一重试策略（退避、Retry-After与阶段截止时间）
+glm_retry_policy = RetryPolicy("GLM")
+
+# 进程内按Key共享的槽位，多个GLMA2AClient实例共用同一Key的预算
+_glm_key_slots: Dict[str, KeySlot] = {}
 
 _PRIVATE_KEY_PATHS = [
     "/workspace/glm_api_key",              # preferred path with GLM_API_KEY=...
@@ -44,212 +53,370 @@ _PRIVATE_KEY_PATHS = [
 ]
 
 
-def _parse_key_text(text: str) -> Optional[str]:
+def _parse_key_texts(text: str) -> List[str]:
+    """Parse every key in a key file (one per line)"""
+    keys: List[str] = []
     if not text:
-        return None
+        return keys
     for line in text.splitlines():
         s = line.strip()
-        if not s:
+        if not s or s.startswith("#"):
             continue
-        # Accept formats: GLM_API_KEY=..., ZHIPUAI_API_KEY=..., or raw key
+        # Accept formats: GLM_API_KEY=..., ZHIPUAI_API_KEY=..., GLM_API_KEYS=a,b or raw key
         if "=" in s:
             k, v = s.split("=", 1)
             k = k.strip().upper()
             v = v.strip()
             if k in ("GLM_API_KEY", "ZHIPUAI_API_KEY", "API_KEY") and v:
-                return v
+                keys.append(v)
+            elif k == "GLM_API_KEYS" and v:
+                keys.extend(x.strip() for x in v.split(",") if x.strip())
         else:
             # raw key fallback
-            return s
-    return None
+            keys.append(s)
+    return keys
 
 
-def _load_glm_key() -> Optional[str]:
+def _parse_key_text(text: str) -> Optional[str]:
+    keys = _parse_key_texts(text)
+    return keys[0] if keys else None
+
+
+def _dedupe(keys: List[str]) -> List[str]:
+    seen = set()
+    return [k for k in keys if not (k in seen or seen.add(k))]
+
+
+def _load_glm_keys() -> List[str]:
+    """Load the GLM key pool: GLM_API_KEYS (comma/newline separated), single-key env vars, then key files"""
+    keys: List[str] = []
+    env_keys = os.getenv("GLM_API_KEYS")
+    if env_keys:
+        keys.extend(x.strip() for x in env_keys.replace("\n", ",").split(",") if x.strip())
     # Env has priority
     env_key = os.getenv("ZHIPUAI_API_KEY") or os.getenv("GLM_API_KEY")
     if env_key:
-        return env_key.strip()
+        keys.append(env_key.strip())
+    if keys:
+        return _dedupe(keys)
     for p in _PRIVATE_KEY_PATHS:
         try:
             if os.path.exists(p):
                 with open(p, "r", encoding="utf-8") as f:
-                    parsed = _parse_key_text(f.read())
-                    if parsed:
-                        return parsed
+                    keys.extend(_parse_key_texts(f.read()))
         except Exception:
             pass
-    return None
+    return _dedupe(keys)
+
+
+def _load_glm_key() -> Optional[str]:
+    keys = _load_glm_keys()
+    return keys[0] if keys else None
+
+
+def _get_key_slot(key: str) -> KeySlot:
+    slot = _glm_key_slots.get(key)
+    if slot is None:
+        slot = KeySlot(
+            key,
+            provider="GLM",
+            rate_per_minute=GLM_KEY_RPM,
+            burst=GLM_KEY_BURST,
+            initial_limit=GLM_CONCURRENCY_INITIAL,
+            max_limit=GLM_CONCURRENCY_MAX,
+            bench_threshold=GLM_KEY_BENCH_THRESHOLD,
+            bench_seconds=GLM_KEY_BENCH_SECONDS,
+        )
+        _glm_key_slots[key] = slot
+    return slot
 
 
 class GLMA2AClient:
     """OpenAI-compatible HTTP client for GLM-4.5-flash."""
 
-    def __init__(self, api_key: Optional[str] = None):
-        self.api_key = (api_key or _load_glm_key())
-        if not self.api_key:
+    def __init__(self, api_key: Optional[str] = None, api_keys: Optional[List[str]] = None):
+        if api_keys:
+            self.api_keys = _dedupe([k.strip() for k in api_keys if k and k.strip()])
+        elif api_key:
+            self.api_keys = [api_key.strip()]
+        else:
+            self.api_keys = _load_glm_keys()
+        if not self.api_keys:
             raise ValueError("ZHIPUAI_API_KEY is required and fallback is disabled")
+        self.api_key = self.api_keys[0]
+        self.key_pool = KeyPool([_get_key_slot(k) for k in self.api_keys])
+        if len(self.api_keys) > 1:
+            logger.info(f"🔑 GLM Key池已加载 {len(self.api_keys)} 个Key")
         
-        # 初始化官方OpenAI客户端（如果可用）
-        self.openai_client = None
-        if OPENAI_AVAILABLE:
-            try:
-                self.openai_client = OpenAI(
-                    api_key=self.api_key,
-                    base_url=GLM_API_BASE
-                )
-                logger.info("✅ 使用官方OpenAI库初始化GLM客户端")
-            except Exception as e:
-                logger.warning(f"⚠️ 官方OpenAI库初始化失败: {e}，回退到urllib方式")
-                self.openai_client = None
+        # 官方OpenAI库可用时使用AsyncOpenAI（共享连接池，按事件循环惰性创建）
+        self.use_openai_sdk = OPENAI_SDK_AVAILABLE
+        if self.use_openai_sdk:
+            logger.info("✅ 使用官方OpenAI异步库初始化GLM客户端")
         else:
-            logger.info("ℹ️ 官方OpenAI库不可用，使用urllib方式")
+            logger.info("ℹ️ 官方OpenAI库不可用，使用httpx异步方式")
+    
+    @property
+    def openai_client(self):
+        """AsyncOpenAI client for GLM bound to the shared connection pool (None when SDK unavailable)"""
+        return self._openai_client_for(self.api_key)
+    
+    def _openai_client_for(self, api_key: str):
+        if not self.use_openai_sdk:
+            return None
+        return get_async_openai_client(api_key, GLM_API_BASE)
     
     @classmethod
     def get_concurrency_status(cls) -> Dict[str, Any]:
-        """获取当前GLM API并发状态"""
+        """获取当前GLM API并发状态（所有Key的自适应窗口汇总）"""
+        slots = list(_glm_key_slots.values())
+        if not slots:
+            return {
+                "max_concurrency": GLM_CONCURRENCY_INITIAL,
+                "current_available": GLM_CONCURRENCY_INITIAL,
+                "current_in_use": 0,
+                "utilization_percent": 0.0,
+                "keys": 0,
+                "key_pool": [],
+            }
+        pool = KeyPool(slots).status()
+        limit = pool["limit"]
         return {
-            "max_concurrency": GLM_CONCURRENCY_LIMIT,
-            "current_available": _glm_semaphore._value,
-            "current_in_use": GLM_CONCURRENCY_LIMIT - _glm_semaphore._value,
-            "utilization_percent": round((GLM_CONCURRENCY_LIMIT - _glm_semaphore._value) / GLM_CONCURRENCY_LIMIT * 100, 2)
+            "max_concurrency": limit,
+            "current_available": pool["available"],
+            "current_in_use": pool["in_flight"],
+            "utilization_percent": round(pool["in_flight"] / limit * 100, 2),
+            "keys": pool["keys"],
+            "healthy_keys": pool["healthy_keys"],
+            "key_pool": pool["slots"],
         }
     
     @classmethod
     def log_concurrency_status(cls):
         """记录当前并发状态到日志"""
         status = cls.get_concurrency_status()
-        logger.info(f"📊 GLM并发状态: 最大并发数={status['max_concurrency']}, "
+        logger.info(f"📊 GLM并发状态: 当前窗口={status['max_concurrency']}, "
                    f"当前使用={status['current_in_use']}, "
                    f"可用={status['current_available']}, "
                    f"利用率={status['utilization_percent']}%")
 
-    async def _generate_response(self, prompt: str) -> str:
-        """Generate response using GLM-4.5-flash API with OpenAI-compatible format"""
-        # 使用全局锁确保同一时间只有一个GLM API调用
-        async with _glm_global_lock:
-            # 使用信号量控制并发数量 - GLM-4.5-flash最大支持1个并发请求
-            async with _glm_semaphore:
-                # 记录获取信号量前的状态
+    async def _generate_response(self, prompt: str, bypass_cache: bool = False) -> str:
+        """Generate response using GLM-4.5-flash API with OpenAI-compatible format (cached on disk)"""
+        bypass = bypass_cache or cache_bypassed()
+        flight_key = make_cache_key("glm", GLM_MODEL, GLM_SYSTEM_PROMPT, prompt, GLM_TEMPERATURE)
+        # 相同prompt的并发请求只占用一个GLM并发名额；合并的请求也按同一用量计入各自工作流
+        return await coalesced_llm_call(
+            llm_singleflight,
+            flight_key + (":bypass" if bypass else ""),
+            lambda: cached_generate(
+                "glm", GLM_MODEL, GLM_SYSTEM_PROMPT, prompt, GLM_TEMPERATURE,
+                lambda: self._generate_response_uncached(prompt),
+                bypass_cache=bypass,
+            ),
+        )
+
+    async def _generate_response_uncached(self, prompt: str) -> str:
+        """Call GLM through the key pool without consulting the cache"""
+        async def attempt() -> str:
+            # 从Key池选择负载最低的健康Key，占用其速率令牌和并发名额
+            async with self.key_pool.acquire() as slot:
                 self.log_concurrency_status()
-                logger.info(f"🔒 获取GLM并发信号量，准备调用API")
+                logger.info(f"🔒 获取GLM并发名额(Key {slot.label})，准备调用API")
                 try:
-                    # 优先使用官方OpenAI库
-                    if self.openai_client:
-                        return await self._generate_response_openai(prompt)
+                    if self.use_openai_sdk:
+                        content = await self._generate_response_openai(prompt, slot.key)
                     else:
-                        return await self._generate_response_urllib(prompt)
+                        content = await self._generate_response_http(prompt, slot.key)
+                    slot.record_success()
+                    return content
+                except Exception as e:
+                    if is_overload_error(e):
+                        retry_after = retry_after_seconds(e) or GLM_OVERLOAD_PAUSE
+                        logger.warning(f"🚨 检测到429错误（并发过高），收缩Key {slot.label} 并发窗口，{retry_after:.1f}秒后可重试...")
+                        slot.record_overload(retry_after)
+                    elif is_timeout_error(e):
+                        logger.warning(f"⏱️ GLM API调用超时，收缩Key {slot.label} 并发窗口")
+                        slot.record_timeout()
+                    raise
                 finally:
-                    # 记录释放信号量后的状态
-                    self.log_concurrency_status()
-                    logger.info(f"🔓 释放GLM并发信号量，API调用完成")
+                    logger.info(f"🔓 释放GLM并发名额，API调用完成")
+
+        # 每次重试都重新路由，429后可切换到其它健康Key；
+        # 被暂停的Key由Key池按Retry-After控制准入，因此429后不再额外等待
+        return await glm_retry_policy.run(
+            attempt,
+            max_attempts=max(glm_retry_policy.max_attempts, len(self.key_pool)),
+            wait_on_overload=False,
+        )
     
-    async def _generate_response_openai(self, prompt: str) -> str:
-        """使用官方OpenAI库调用GLM API（受并发信号量控制）"""
+    async def _generate_response_stream(self, prompt: str, bypass_cache: bool = False) -> AsyncIterator[str]:
+        """Stream response deltas; failures before the first delta fall back to the non-streaming path"""
+        bypass = bypass_cache or cache_bypassed()
+        cache = get_llm_cache()
+        cache_key = make_cache_key("glm", GLM_MODEL, GLM_SYSTEM_PROMPT, prompt, GLM_TEMPERATURE)
+        if cache is not None and not bypass:
+            cached = await cache.aget(cache_key)
+            if cached is not None:
+                logger.info(f"🎯 LLM缓存命中(流式): glm/{GLM_MODEL} key={cache_key[:12]}")
+                record_llm_usage("glm", GLM_MODEL, cache_hit=True)
+                yield cached
+                return
+
+        parts: List[str] = []
+        try:
+            async with self.key_pool.acquire() as slot:
+                logger.info(f"🌊 GLM流式调用(Key {slot.label})")
+                try:
+                    async for delta in self._stream_with_key(prompt, slot.key):
+                        parts.append(delta)
+                        yield delta
+                    slot.record_success()
+                except Exception as e:
+                    if is_overload_error(e):
+                        slot.record_overload(retry_after_seconds(e) or GLM_OVERLOAD_PAUSE)
+                    elif is_timeout_error(e):
+                        slot.record_timeout()
+                    raise
+        except Exception as e:
+            if parts or isinstance(e, StageDeadlineExceeded):
+                raise
+            logger.warning(f"⚠️ GLM流式调用在首个片段前失败，改用非流式调用: {e}")
+            yield await self._generate_response(prompt, bypass_cache=bypass)
+            return
+
+        content = "".join(parts).strip()
+        if cache is not None and content:
+            try:
+                await cache.aput(cache_key, "glm", GLM_MODEL, content)
+            except Exception as e:
+                logger.warning(f"⚠️ 写入LLM缓存失败: {e}")
+
+    async def _stream_with_key(self, prompt: str, api_key: str) -> AsyncIterator[str]:
+        messages = [
+            {"role": "system", "content": GLM_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ]
+        start = time.monotonic()
+        usage = None
+        if self.use_openai_sdk:
+            stream = await self._openai_client_for(api_key).chat.completions.create(
+                model=GLM_MODEL,
+                messages=messages,
+                temperature=GLM_TEMPERATURE,
+                top_p=0.7,
+                stream=True,
+                timeout=attempt_timeout(300)
+            )
+            async for chunk in stream:
+                check_stage_deadline("GLM")
+                # GLM在最后一个chunk中携带usage
+                if getattr(chunk, "usage", None) is not None:
+                    usage = chunk.usage
+                if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            record_llm_usage("glm", GLM_MODEL, usage, time.monotonic() - start)
+            return
+
+        # httpx直连：解析SSE流
+        payload = {
+            "model": GLM_MODEL,
+            "messages": messages,
+            "temperature": GLM_TEMPERATURE,
+            "top_p": 0.7,
+            "stream": True,
+        }
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+        }
+        async with get_shared_http_client().stream(
+            "POST", GLM_CHAT_COMPLETIONS, json=payload, headers=headers, timeout=attempt_timeout(300)
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                check_stage_deadline("GLM")
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    event = json.loads(data)
+                except ValueError:
+                    continue
+                usage = event.get("usage") or usage
+                choices = event.get("choices") or []
+                delta = (choices[0].get("delta") or {}).get("content") if choices else None
+                if delta:
+                    yield delta
+        record_llm_usage("glm", GLM_MODEL, usage, time.monotonic() - start)
+
+    async def _generate_response_openai(self, prompt: str, api_key: Optional[str] = None) -> str:
+        """使用官方OpenAI异步库调用GLM API，不可重试的SDK错误时回退到httpx直连"""
         try:
             logger.info("🚀 使用官方OpenAI库调用GLM API")
-            response = self.openai_client.chat.completions.create(
+            start = time.monotonic()
+            response = await self._openai_client_for(api_key or self.api_key).chat.completions.create(
                 model=GLM_MODEL,
                 messages=[
-                    {"role": "system", "content": "你是一个专业的专利分析师和专利撰写专家"},
+                    {"role": "system", "content": GLM_SYSTEM_PROMPT},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.3,
+                temperature=GLM_TEMPERATURE,
                 top_p=0.7,
                 stream=False,
-                timeout=300  # 5分钟超时
+                timeout=attempt_timeout(300)  # 5分钟超时，不超过阶段剩余预算
             )
             
             content = response.choices[0].message.content
+            record_llm_usage("glm", GLM_MODEL, response.usage, time.monotonic() - start)
             logger.info(f"✅ 官方OpenAI库调用成功，响应长度: {len(content)}")
             return content.strip()
             
         except Exception as e:
-            error_msg = str(e)
             logger.error(f"❌ 官方OpenAI库调用失败: {e}")
+            # 429/超时/5xx交给统一重试策略和自适应限流器处理
+            if is_retryable(e):
+                raise
             
-            # 检查是否是429错误（并发过高）
-            if "429" in error_msg or "concurrent" in error_msg.lower() or "rate limit" in error_msg.lower():
-                logger.warning(f"🚨 检测到429错误（并发过高），等待后重试...")
-                # 等待更长时间后重试，避免429错误
-                wait_time = 30
-                logger.info(f"⏳ 等待{wait_time}秒后重试...")
-                await asyncio.sleep(wait_time)
-                try:
-                    logger.info("🔄 重试官方OpenAI库调用...")
-                    response = self.openai_client.chat.completions.create(
-                        model=GLM_MODEL,
-                        messages=[
-                            {"role": "system", "content": "你是一个专业的专利分析师和专利撰写专家"},
-                            {"role": "user", "content": prompt}
-                        ],
-                        temperature=0.3,
-                        top_p=0.7,
-                        stream=False,
-                        timeout=300
-                    )
-                    content = response.choices[0].message.content
-                    logger.info(f"✅ 重试成功，响应长度: {len(content)}")
-                    return content.strip()
-                except Exception as retry_error:
-                    logger.error(f"❌ 重试也失败: {retry_error}")
-            
-            # 回退到urllib方式
-            logger.info("🔄 回退到urllib方式")
-            return await self._generate_response_urllib(prompt)
+            # 回退到httpx直连方式
+            logger.info("🔄 回退到httpx直连方式")
+            return await self._generate_response_http(prompt, api_key)
     
-    async def _generate_response_urllib(self, prompt: str) -> str:
-        """使用urllib方式调用GLM API（fallback）"""
+    async def _generate_response_http(self, prompt: str, api_key: Optional[str] = None) -> str:
+        """使用共享httpx连接池直接调用GLM API（fallback）"""
         payload = {
             "model": GLM_MODEL,
             "messages": [
-                {"role": "system", "content": "你是一个专业的专利分析师和专利撰写专家"},
+                {"role": "system", "content": GLM_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
-            "temperature": 0.3,
+            "temperature": GLM_TEMPERATURE,
             "top_p": 0.7,
             "stream": False,
         }
         headers = {
             "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}",
+            "Authorization": f"Bearer {api_key or self.api_key}",
         }
 
-        def _do_request() -> str:
-            req = urllib.request.Request(
-                GLM_CHAT_COMPLETIONS,
-                data=json.dumps(payload).encode("utf-8"),
-                headers=headers,
-                method="POST",
+        # 超时时间300秒（不超过阶段剩余预算）；失败重试由glm_retry_policy统一处理
+        try:
+            start = time.monotonic()
+            resp = await get_shared_http_client().post(
+                GLM_CHAT_COMPLETIONS, json=payload, headers=headers, timeout=attempt_timeout(300)
             )
-            # 优化1: 增加超时时间到300秒，提高GLM-4.5-flash的响应成功率
-            # 优化2: 添加重试机制和更好的错误处理
-            max_retries = 3
-            retry_delay = 5  # 秒
-            
-            for attempt in range(max_retries):
-                try:
-                    with urllib.request.urlopen(req, timeout=300) as resp:
-                        body = resp.read().decode("utf-8")
-                        data = json.loads(body)
-                        # OpenAI-style response
-                        choices = data.get("choices") or []
-                        if choices and "message" in choices[0]:
-                            return choices[0]["message"].get("content", "").strip()
-                        # Fallback parse for variations
-                        return data.get("text") or ""
-                except urllib.error.URLError as e:
-                    if attempt < max_retries - 1:
-                        logger.warning(f"GLM API请求失败 (尝试 {attempt + 1}/{max_retries}): {e}，{retry_delay}秒后重试...")
-                        time.sleep(retry_delay)
-                        retry_delay *= 2  # 指数退避
-                    else:
-                        logger.error(f"GLM API请求最终失败: {e}")
-                        raise
-                except Exception as e:
-                    logger.error(f"GLM API请求异常: {e}")
-                    raise
-
-        return await asyncio.get_event_loop().run_in_executor(None, _do_request)
+            resp.raise_for_status()
+            data = resp.json()
+        except Exception as e:
+            logger.error(f"GLM API请求失败: {e}")
+            raise
+        record_llm_usage("glm", GLM_MODEL, data.get("usage"), time.monotonic() - start)
+        # OpenAI-style response
+        choices = data.get("choices") or []
+        if choices and "message" in choices[0]:
+            return (choices[0]["message"].get("content") or "").strip()
+        # Fallback parse for variations
+        return data.get("text") or ""
 
     # Below mirror the interface used by agents, with simple parsing (same as GoogleA2AClient)
     async def analyze_patent_topic(self, topic: str, description: str) -> PatentAnalysis:
@@ -0,0 +1,173 @@
+"""
+Hedged provider calls
+If the primary provider has not answered by a latency percentile learned from
+recent calls, the fallback provider is fired too; the first success wins and
+the loser is cancelled. A hedge budget bounds the extra cost.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "0").lower() in ("1", "true", "yes")
+# 以主提供方近期延迟的第几百分位作为对冲触发点
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+# 样本不足时的默认触发延迟，以及触发延迟下限（秒）
+LLM_HEDGE_DEFAULT_DELAY = float(os.getenv("LLM_HEDGE_DEFAULT_DELAY", "60"))
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+# 对冲请求占比上限，控制额外成本
+LLM_HEDGE_MAX_RATE = float(os.getenv("LLM_HEDGE_MAX_RATE", "0.1"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10"))
+
+
+class LatencyTracker:
+    """Sliding window of recent successful latencies"""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(int(round(p / 100.0 * (len(ordered) - 1))), len(ordered) - 1)
+        return ordered[index]
+
+
+class HedgeMetrics:
+    def __init__(self):
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+        self.budget_skips = 0
+
+    @property
+    def hedge_rate(self) -> float:
+        return self.hedged / self.calls if self.calls else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": LLM_HEDGING_ENABLED,
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedge_rate, 4),
+            "hedge_wins": self.hedge_wins,
+            "primary_wins_after_hedge": self.primary_wins,
+            "budget_skips": self.budget_skips,
+        }
+
+
+hedge_metrics = HedgeMetrics()
+_latency_trackers: Dict[str, LatencyTracker] = {}
+
+
+def get_latency_tracker(operation: str) -> LatencyTracker:
+    tracker = _latency_trackers.get(operation)
+    if tracker is None:
+        tracker = _latency_trackers[operation] = LatencyTracker()
+    return tracker
+
+
+def hedge_delay(tracker: LatencyTracker) -> float:
+    if len(tracker) < LLM_HEDGE_MIN_SAMPLES:
+        return LLM_HEDGE_DEFAULT_DELAY
+    return max(tracker.percentile(LLM_HEDGE_PERCENTILE) or LLM_HEDGE_DEFAULT_DELAY, LLM_HEDGE_MIN_DELAY)
+
+
+def get_hedging_stats() -> Dict[str, Any]:
+    stats = hedge_metrics.stats()
+    stats["trigger_delays"] = {
+        op.rsplit(".<locals>", 1)[0]: round(hedge_delay(t), 3) for op, t in _latency_trackers.items()
+    }
+    return stats
+
+
+async def _cancel(task: asyncio.Task) -> None:
+    if not task.done():
+        task.cancel()
+    try:
+        await task
+    except BaseException:
+        pass
+
+
+async def hedged_call(operation: str, primary: Callable[[], Awaitable[Any]],
+                      secondary: Callable[[], Awaitable[Any]]) -> Any:
+    """Run ``primary``; fire ``secondary`` when it is slower than the learned percentile.
+
+    A primary failure before the trigger falls through to ``secondary`` like a
+    plain fallback. Raises the secondary's error when both fail.
+    """
+    tracker = get_latency_tracker(operation)
+    hedge_metrics.calls += 1
+    delay = hedge_delay(tracker)
+    start = time.monotonic()
+    primary_task = asyncio.ensure_future(primary())
+    secondary_task: Optional[asyncio.Future] = None
+    try:
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            try:
+                result = primary_task.result()
+            except Exception as e:
+                logger.warning(f"主提供方调用失败，切换到备用提供方: {e}")
+                return await secondary()
+            tracker.record(time.monotonic() - start)
+            return result
+
+        if hedge_metrics.hedge_rate >= LLM_HEDGE_MAX_RATE:
+            hedge_metrics.budget_skips += 1
+            try:
+                result = await primary_task
+            except Exception as e:
+                logger.warning(f"主提供方调用失败，切换到备用提供方: {e}")
+                return await secondary()
+            tracker.record(time.monotonic() - start)
+            return result
+
+        hedge_metrics.hedged += 1
+        logger.info(f"🏁 主提供方超过 {delay:.1f}s 未返回，发起对冲请求")
+        secondary_task = asyncio.ensure_future(secondary())
+        pending = {primary_task, secondary_task}
+        primary_error: Optional[BaseException] = None
+        secondary_error: Optional[BaseException] = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                error = task.exception()
+                if task is primary_task:
+                    if error is None:
+                        tracker.record(time.monotonic() - start)
+                        hedge_metrics.primary_wins += 1
+                        await _cancel(secondary_task)
+                        return task.result()
+                    primary_error = error
+                else:
+                    if error is None:
+                        hedge_metrics.hedge_wins += 1
+                        logger.info("🏁 对冲请求先返回，取消主提供方调用")
+                        # 主提供方至少耗时这么久：记为下界样本，否则慢请求被取消后百分位会逐渐偏低
+                        if primary_error is None:
+                            tracker.record(time.monotonic() - start)
+                        await _cancel(primary_task)
+                        return task.result()
+                    secondary_error = error
+        logger.error(f"对冲请求均失败: primary={primary_error}, secondary={secondary_error}")
+        raise secondary_error or primary_error
+    except asyncio.CancelledError:
+        await _cancel(primary_task)
+        if secondary_task is not None:
+            await _cancel(secondary_task)
+        raise
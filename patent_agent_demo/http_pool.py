@@ -0,0 +1,83 @@
+"""
+Shared async HTTP connection pool for LLM providers
+All OpenAI / GLM calls go through one pooled httpx.AsyncClient per event loop,
+so no provider call ever blocks the event loop and TCP/TLS connections are reused.
+"""
+
+import os
+import asyncio
+import logging
+import weakref
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+# 官方OpenAI库可选：不可用时连接池退化为普通httpx.AsyncClient，GLM改用httpx直连
+try:
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+    OPENAI_SDK_AVAILABLE = True
+except ImportError:
+    AsyncOpenAI = None
+    DefaultAsyncHttpxClient = httpx.AsyncClient
+    OPENAI_SDK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# 连接池配置（可通过环境变量调整）
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "20"))
+LLM_HTTP_TIMEOUT = float(os.getenv("LLM_HTTP_TIMEOUT", "300"))
+LLM_HTTP_CONNECT_TIMEOUT = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT", "10"))
+
+# httpx连接绑定在创建它的事件循环上，因此按事件循环分别缓存
+_loop_http_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_loop_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, Optional[str]], Any]]" = weakref.WeakKeyDictionary()
+
+
+def _current_loop() -> asyncio.AbstractEventLoop:
+    return asyncio.get_running_loop()
+
+
+def get_shared_http_client() -> httpx.AsyncClient:
+    """Return the pooled httpx.AsyncClient for the running event loop"""
+    loop = _current_loop()
+    client = _loop_http_clients.get(loop)
+    if client is None or client.is_closed:
+        client = DefaultAsyncHttpxClient(
+            limits=httpx.Limits(
+                max_connections=LLM_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=LLM_HTTP_MAX_KEEPALIVE,
+            ),
+            timeout=httpx.Timeout(LLM_HTTP_TIMEOUT, connect=LLM_HTTP_CONNECT_TIMEOUT),
+        )
+        _loop_http_clients[loop] = client
+        _loop_openai_clients.pop(loop, None)
+        logger.info(f"🔌 创建共享HTTP连接池: max_connections={LLM_HTTP_MAX_CONNECTIONS}, "
+                    f"keepalive={LLM_HTTP_MAX_KEEPALIVE}")
+    return client
+
+
+def get_async_openai_client(api_key: str, base_url: Optional[str] = None) -> "AsyncOpenAI":
+    """Return an AsyncOpenAI client bound to the shared connection pool of the running loop"""
+    if not OPENAI_SDK_AVAILABLE:
+        raise RuntimeError("openai package is not installed")
+    loop = _current_loop()
+    http_client = get_shared_http_client()
+    clients = _loop_openai_clients.setdefault(loop, {})
+    key = (api_key, base_url)
+    client = clients.get(key)
+    if client is None:
+        # 重试统一由retry_policy处理，关闭SDK内置重试以免叠加
+        client = AsyncOpenAI(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+        clients[key] = client
+    return client
+
+
+async def close_shared_http_client() -> None:
+    """Close the pooled client of the running loop (call on application shutdown)"""
+    loop = _current_loop()
+    _loop_openai_clients.pop(loop, None)
+    client = _loop_http_clients.pop(loop, None)
+    if client is not None and not client.is_closed:
+        await client.aclose()
+        logger.info("🔌 共享HTTP连接池已关闭")
@@ -0,0 +1,156 @@
+"""
+API key pool with per-key rate budgets
+Each key owns a token bucket (requests/minute) and an adaptive concurrency
+window; requests are routed to the least-loaded healthy key and a key is
+temporarily benched after repeated 429s, so throughput scales with key count.
+"""
+
+import time
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from .concurrency import AdaptiveConcurrencyLimiter
+
+logger = logging.getLogger(__name__)
+
+
+def mask_key(key: str) -> str:
+    """Log-safe key label"""
+    if len(key) <= 8:
+        return "***"
+    return f"{key[:4]}...{key[-4:]}"
+
+
+class TokenBucket:
+    """Async token bucket: ``rate_per_minute`` sustained, ``capacity`` burst (rate 0 = unlimited)"""
+
+    def __init__(self, rate_per_minute: float, capacity: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    @property
+    def tokens(self) -> float:
+        if self.rate <= 0:
+            return self.capacity
+        self._refill()
+        return self._tokens
+
+    async def take(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class KeySlot:
+    """One API key with its own rate budget, concurrency window and health state"""
+
+    def __init__(self, key: str, provider: str, rate_per_minute: float, burst: float,
+                 initial_limit: int, max_limit: int, bench_threshold: int, bench_seconds: float):
+        self.key = key
+        self.label = mask_key(key)
+        self.bucket = TokenBucket(rate_per_minute, burst)
+        self.limiter = AdaptiveConcurrencyLimiter(
+            f"{provider}[{self.label}]", initial_limit=initial_limit, min_limit=1, max_limit=max_limit
+        )
+        self.bench_threshold = bench_threshold
+        self.bench_seconds = bench_seconds
+        self.consecutive_overloads = 0
+        self.benched_until = 0.0
+        self.reserved = 0
+
+    def is_healthy(self) -> bool:
+        return time.monotonic() >= self.benched_until
+
+    def load(self) -> float:
+        """Fraction of the concurrency window in use, including callers still waiting for budget"""
+        return (self.limiter.in_flight + self.reserved) / self.limiter.limit
+
+    def record_success(self) -> None:
+        self.consecutive_overloads = 0
+        self.limiter.record_success()
+
+    def record_overload(self, retry_after: Optional[float] = None) -> None:
+        self.consecutive_overloads += 1
+        self.limiter.record_overload(retry_after)
+        if self.consecutive_overloads >= self.bench_threshold:
+            self.benched_until = time.monotonic() + self.bench_seconds
+            self.consecutive_overloads = 0
+            logger.warning(f"🪑 Key {self.label} 连续429，暂停使用 {self.bench_seconds:.0f}s")
+
+    def record_timeout(self) -> None:
+        self.limiter.record_timeout()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "key": self.label,
+            "healthy": self.is_healthy(),
+            "benched_for": round(max(self.benched_until - time.monotonic(), 0.0), 3),
+            "tokens": round(self.bucket.tokens, 3),
+            "window": self.limiter.status(),
+        }
+
+
+class KeyPool:
+    """Routes each request to the least-loaded healthy key"""
+
+    def __init__(self, slots: List[KeySlot]):
+        if not slots:
+            raise ValueError("KeyPool requires at least one key")
+        self.slots = slots
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def choose(self) -> Optional[KeySlot]:
+        healthy = [s for s in self.slots if s.is_healthy()]
+        if not healthy:
+            return None
+        # 优先未处于Retry-After暂停的Key，其次并发负载最低、令牌最多的Key
+        return min(healthy, key=lambda s: (s.limiter.paused_for() > 0, s.load(), -s.bucket.tokens))
+
+    @asynccontextmanager
+    async def acquire(self):
+        """Yield a KeySlot holding one rate token and one concurrency slot"""
+        slot = self.choose()
+        while slot is None:
+            wait = min(s.benched_until for s in self.slots) - time.monotonic()
+            logger.warning(f"⏳ 所有Key均被暂停，等待 {max(wait, 0):.1f}s")
+            await asyncio.sleep(max(wait, 0.05))
+            slot = self.choose()
+        slot.reserved += 1
+        try:
+            await slot.bucket.take()
+            await slot.limiter.acquire()
+        finally:
+            slot.reserved -= 1
+        try:
+            yield slot
+        finally:
+            slot.limiter.release()
+
+    def status(self) -> Dict[str, Any]:
+        windows = [s.limiter.status() for s in self.slots]
+        limit = sum(w["limit"] for w in windows)
+        in_flight = sum(w["in_flight"] for w in windows)
+        return {
+            "keys": len(self.slots),
+            "healthy_keys": sum(1 for s in self.slots if s.is_healthy()),
+            "limit": limit,
+            "in_flight": in_flight,
+            "available": sum(w["available"] for w in windows),
+            "slots": [s.status() for s in self.slots],
+        }
@@ -0,0 +1,204 @@
+"""
+Persistent content-addressed LLM response cache
+Responses are stored in SQLite keyed by sha256(provider, model, system prompt,
+prompt, temperature), with LRU eviction, per-entry TTL and hit/miss counters.
+Disk I/O runs in a worker thread so the event loop never blocks.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, Optional
+
+from .usage_ledger import record_llm_usage
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join("output", "cache", "llm_cache.sqlite3"))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+
+# 当前请求链路是否绕过缓存（例如强制重新生成）
+_cache_bypass: contextvars.ContextVar[bool] = contextvars.ContextVar("llm_cache_bypass", default=False)
+
+
+@contextmanager
+def bypass_llm_cache():
+    """Bypass the cache for every LLM call made inside this context"""
+    token = _cache_bypass.set(True)
+    try:
+        yield
+    finally:
+        _cache_bypass.reset(token)
+
+
+def cache_bypassed() -> bool:
+    return _cache_bypass.get()
+
+
+def make_cache_key(provider: str, model: str, system_prompt: str, prompt: str,
+                   temperature: Optional[float]) -> str:
+    payload = json.dumps([provider, model, system_prompt or "", prompt, temperature],
+                         ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """SQLite-backed LRU cache with TTL"""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = LLM_CACHE_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL,
+                expires_at REAL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, expires_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            response, expires_at = row
+            if expires_at is not None and expires_at <= now:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return response
+
+    def put(self, key: str, provider: str, model: str, response: str,
+            ttl_seconds: Optional[float] = None) -> None:
+        now = time.time()
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        expires_at = now + ttl if ttl and ttl > 0 else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, provider, model, response, created_at, last_access, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, provider, model, response, now, now, expires_at),
+            )
+            self.writes += 1
+            count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN "
+                    "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    async def aget(self, key: str) -> Optional[str]:
+        return await asyncio.to_thread(self.get, key)
+
+    async def aput(self, key: str, provider: str, model: str, response: str,
+                   ttl_seconds: Optional[float] = None) -> None:
+        await asyncio.to_thread(self.put, key, provider, model, response, ttl_seconds)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "path": self.path,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "evictions": self.evictions,
+        }
+
+
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """Process-wide cache instance, or None when disabled / unavailable"""
+    global _llm_cache
+    if not LLM_CACHE_ENABLED:
+        return None
+    if _llm_cache is None:
+        try:
+            _llm_cache = LLMResponseCache()
+            logger.info(f"🗄️ LLM响应缓存已启用: {_llm_cache.path}")
+        except Exception as e:
+            logger.warning(f"⚠️ LLM响应缓存初始化失败，已禁用: {e}")
+            return None
+    return _llm_cache
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    cache = get_llm_cache()
+    return cache.stats() if cache else {"enabled": False}
+
+
+async def cached_generate(provider: str, model: str, system_prompt: str, prompt: str,
+                          temperature: Optional[float], generate, bypass_cache: bool = False) -> str:
+    """Return a cached response or call ``generate()`` and store its result"""
+    cache = get_llm_cache()
+    if cache is None or bypass_cache or cache_bypassed():
+        return await generate()
+    key = make_cache_key(provider, model, system_prompt, prompt, temperature)
+    try:
+        cached = await cache.aget(key)
+    except Exception as e:
+        logger.warning(f"⚠️ 读取LLM缓存失败: {e}")
+        cached = None
+    if cached is not None:
+        logger.info(f"🎯 LLM缓存命中: {provider}/{model} key={key[:12]}")
+        record_llm_usage(provider, model, cache_hit=True)
+        return cached
+    response = await generate()
+    if response:
+        try:
+            await cache.aput(key, provider, model, response)
+        except Exception as e:
+            logger.warning(f"⚠️ 写入LLM缓存失败: {e}")
+    return response
@@ -4,6 +4,7 @@ Provides message passing and coordination infrastructure
 """
 
 import asyncio
+import itertools
 import logging
 from typing import Dict, Any, Optional, List
 from dataclasses import dataclass, asdict
@@ -52,13 +53,22 @@ class Message:
     timestamp: float
     priority: int = 5
 
+# 错误消息至少以该优先级投递，优先于普通消息处理
+ERROR_MESSAGE_PRIORITY = 10
+
 class MessageBusBroker:
-    """Message broker for Message Bus communication"""
+    """Message broker for Message Bus communication.
+
+    Each agent has a priority queue: higher ``Message.priority`` is delivered
+    first (errors at least ERROR_MESSAGE_PRIORITY), FIFO within a priority.
+    ``get_message`` blocks until a message arrives instead of being polled.
+    """
     
     def __init__(self):
         self.agents: Dict[str, AgentInfo] = {}
-        self.message_queues: Dict[str, asyncio.Queue] = {}  # 每个代理有自己的消息队列
+        self.message_queues: Dict[str, asyncio.PriorityQueue] = {}  # 每个代理有自己的优先级消息队列
         self.message_handlers: Dict[str, callable] = {}
+        self._sequence = itertools.count()  # 同优先级内保持先进先出
         
     async def register_agent(self, agent_name: str, capabilities: List[str]):
         """Register an agent with the broker"""
@@ -69,54 +79,36 @@ class MessageBusBroker:
             last_activity=time.time()
         )
         # 为每个代理创建独立的消息队列
-        self.message_queues[agent_name] = asyncio.Queue()
+        self.message_queues[agent_name] = asyncio.PriorityQueue()
         logger.info(f"Agent {agent_name} registered with capabilities: {capabilities}")
         
     async def unregister_agent(self, agent_name: str):
         """Unregister an agent from the broker"""
         if agent_name in self.agents:
             del self.agents[agent_name]
-        if agent_name in self.message_queues:
-            del self.message_queues[agent_name]
+        queue = self.message_queues.pop(agent_name, None)
+        if queue is not None:
+            # 唤醒仍在等待消息的消费者
+            queue.put_nowait((float("-inf"), next(self._sequence), None))
         logger.info(f"Agent {agent_name} unregistered")
             
     async def send_message(self, message: Message):
         """Send a message to the specific agent's queue"""
         recipient = message.recipient
-        logger.info(f"Attempting to send message to {recipient}")
-        logger.info(f"Available recipients: {list(self.message_queues.keys())}")
-        logger.info(f"MessageBusBroker instance ID: {id(self)}")
-        
-        if recipient in self.message_queues:
-            queue = self.message_queues[recipient]
-            logger.info(f"Queue instance ID for {recipient}: {id(queue)}")
-            logger.info(f"PUT: 放入消息前队列大小: {queue.qsize()}")
-            
-            try:
-                await queue.put(message)
-                logger.info(f"PUT: 放入消息后队列大小: {queue.qsize()}")
-                
-                # 立即检查队列大小，看看是否有其他代码在消费
-                await asyncio.sleep(0.01)  # 等待一小段时间
-                logger.info(f"PUT: 等待后队列大小: {queue.qsize()}")
-                
-                logger.info(f"Message sent: {message.type.value} from {message.sender} to {message.recipient}")
-                logger.debug(f"Message content: {message.content}")
-                
-                # 验证消息是否真的被放入队列
-                if queue.qsize() == 0:
-                    logger.warning(f"Message may not have been properly queued for {recipient}")
-                else:
-                    logger.info(f"Message successfully queued for {recipient}")
-                    
-            except Exception as e:
-                logger.error(f"Error putting message in queue for {recipient}: {e}")
-                raise
-        else:
+        queue = self.message_queues.get(recipient)
+        if queue is None:
             logger.warning(f"Recipient {recipient} not found, message dropped")
             logger.warning(f"Available recipients: {list(self.message_queues.keys())}")
             logger.warning(f"Message details: {message.type.value} from {message.sender} to {message.recipient}")
             raise RuntimeError(f"Recipient {recipient} not found in message queues")
+        
+        priority = message.priority
+        if message.type == MessageType.ERROR:
+            priority = max(priority, ERROR_MESSAGE_PRIORITY)
+        queue.put_nowait((-priority, next(self._sequence), message))
+        logger.info(f"Message sent: {message.type.value} from {message.sender} to {recipient} "
+                    f"(priority {priority}, queued {queue.qsize()})")
+        logger.debug(f"Message content: {message.content}")
             
     async def broadcast_message(self, message: Message):
         """Broadcast a message to all agents"""
@@ -132,36 +124,29 @@ class MessageBusBroker:
             )
             await self.send_message(broadcast_msg)
             
-    async def get_message(self, agent_name: str) -> Optional[Message]:
-        """Get a message from a specific agent's queue"""
-        if agent_name not in self.message_queues:
+    async def get_message(self, agent_name: str, timeout: Optional[float] = None) -> Optional[Message]:
+        """Wait for the next message of an agent.
+
+        Returns None after ``timeout`` seconds without a message (``timeout=0``
+        does not wait, None waits indefinitely) or when the agent is unregistered.
+        """
+        queue = self.message_queues.get(agent_name)
+        if queue is None:
             logger.warning(f"Agent {agent_name} not found in message queues")
             return None
         
-        queue = self.message_queues[agent_name]
-        queue_size = queue.qsize()
-        logger.info(f"GET: Agent {agent_name} 检查队列大小: {queue_size}")
-        logger.info(f"MessageBusBroker instance ID: {id(self)}")
-        logger.info(f"Queue instance ID for {agent_name}: {id(queue)}")
-        
-        if queue_size == 0:
-            logger.info(f"GET: Agent {agent_name} 队列为空")
-            return None
-            
         try:
-            message = await asyncio.wait_for(queue.get(), timeout=1.0)
-            if message:
-                logger.info(f"Retrieved message for {agent_name}: {message.type.value} from {message.sender}")
-                logger.debug(f"Message content: {message.content}")
-            return message
-        except asyncio.TimeoutError:
-            logger.debug(f"Timeout getting message for {agent_name}")
-            return None
-        except Exception as e:
-            logger.error(f"Error getting message for {agent_name}: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            if timeout is not None and timeout <= 0:
+                _, _, message = queue.get_nowait()
+            else:
+                _, _, message = await asyncio.wait_for(queue.get(), timeout)
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
             return None
+        
+        if message is not None:
+            logger.info(f"Retrieved message for {agent_name}: {message.type.value} from {message.sender}")
+            logger.debug(f"Message content: {message.content}")
+        return message
             
     async def send_message_direct(self, sender: str, recipient: str, 
                                 content: Dict[str, Any], priority: int = 5):
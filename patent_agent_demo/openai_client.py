@@ -6,23 +6,40 @@ Replaces GLM client with OpenAI GPT-5 API, falls back to GLM-4.5-flash on errors
 import os
 import json
 import logging
+import time
 import asyncio
-from typing import List, Dict, Any, Optional
-from openai import OpenAI
+from typing import AsyncIterator, List, Dict, Any, Optional
+from .http_pool import LLM_HTTP_TIMEOUT, get_async_openai_client
+from .llm_cache import cached_generate, cache_bypassed, get_llm_cache, make_cache_key
+from .singleflight import llm_singleflight
+from .hedging import LLM_HEDGING_ENABLED, hedged_call
+from .circuit_breaker import CLOSED, get_circuit_breaker
+from .usage_ledger import coalesced_llm_call, record_llm_usage
+from .retry_policy import RetryPolicy, StageDeadlineExceeded, attempt_timeout, check_stage_deadline
 from .google_a2a_client import PatentAnalysis, PatentDraft, SearchResult
 
 logger = logging.getLogger(__name__)
 
+OPENAI_MODEL = "gpt-5"
+# OpenAI之后还有GLM回退，默认只重试一次可重试错误，尽快交给回退链
+OPENAI_RETRY_MAX_ATTEMPTS = int(os.getenv("OPENAI_RETRY_MAX_ATTEMPTS", "2"))
+openai_retry_policy = RetryPolicy("OpenAI", max_attempts=OPENAI_RETRY_MAX_ATTEMPTS)
+
 class OpenAIClient:
     """OpenAI GPT-5 client for patent-related tasks with GLM-4.5-flash fallback"""
     
-    def __init__(self):
+    def __init__(self, hedging: Optional[bool] = None):
+        # 对冲模式：OpenAI慢于近期延迟百分位时同时请求GLM，取先返回者
+        self.hedging_enabled = LLM_HEDGING_ENABLED if hedging is None else hedging
         # Load API key from private file
+        self._api_key = None
         api_key_path = os.path.join(os.path.dirname(__file__), "private_openai_key")
         try:
             with open(api_key_path, "r") as f:
                 api_key = f.read().strip()
-            self.client = OpenAI(api_key=api_key)
+            if not api_key:
+                raise ValueError("empty OpenAI API key")
+            self._api_key = api_key
             self.openai_available = True
             logger.info("OpenAI client initialized successfully")
         except Exception as e:
@@ -45,6 +62,11 @@ class OpenAIClient:
             else:
                 logger.warning("OpenAI available but GLM fallback not initialized")
     
+    @property
+    def client(self):
+        """AsyncOpenAI client bound to the shared connection pool of the running event loop"""
+        return get_async_openai_client(self._api_key)
+    
     def _init_glm_fallback(self):
         """Initialize GLM client as fallback"""
         try:
@@ -56,27 +78,87 @@ class OpenAIClient:
             logger.warning(f"Failed to initialize GLM fallback: {e}")
             self.glm_client = None
     
+    @property
+    def openai_breaker(self):
+        """Process-wide circuit breaker for OpenAI, probed with a cheap models.retrieve call"""
+        return get_circuit_breaker("openai", probe=self._probe_openai if self.openai_available else None)
+    
+    @property
+    def glm_breaker(self):
+        return get_circuit_breaker("glm")
+    
+    async def _probe_openai(self):
+        await self.client.models.retrieve(OPENAI_MODEL)
+    
+    async def _responses_create(self, **kwargs):
+        """Non-streaming responses.create with the shared retry policy; records token usage and latency"""
+        kwargs.setdefault("timeout", attempt_timeout(LLM_HTTP_TIMEOUT))
+        start = time.monotonic()
+        response = await openai_retry_policy.run(lambda: self.client.responses.create(**kwargs))
+        record_llm_usage("openai", kwargs.get("model", OPENAI_MODEL),
+                         getattr(response, "usage", None), time.monotonic() - start)
+        return response
+    
+    async def _guarded(self, breaker, func, *args, **kwargs):
+        """Run a provider call and report its outcome to the provider's circuit breaker"""
+        try:
+            result = await func(*args, **kwargs)
+        except asyncio.CancelledError:
+            breaker.record_cancelled()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+        return result
+    
+    async def _call_glm_only(self, glm_func, *args, **kwargs):
+        """Call GLM directly when OpenAI is unavailable or its circuit is open"""
+        if self.glm_client:
+            logger.info("Using GLM-4.5-flash fallback directly")
+            try:
+                result = await self._guarded(self.glm_breaker, glm_func, *args, **kwargs)
+                logger.info("GLM fallback call successful")
+                return result
+            except Exception as glm_error:
+                logger.error(f"GLM fallback call failed: {glm_error}")
+                raise RuntimeError(f"GLM fallback failed: {glm_error}")
+        else:
+            logger.error("GLM fallback not available")
+            raise RuntimeError("Neither OpenAI nor GLM fallback is available")
+    
     async def _call_with_fallback(self, openai_func, glm_func, *args, **kwargs):
-        """Call OpenAI function with GLM fallback"""
+        """Call OpenAI function with GLM fallback; usage is recorded by whichever provider answered"""
+        return await self._route_call(openai_func, glm_func, *args, **kwargs)
+    
+    async def _route_call(self, openai_func, glm_func, *args, **kwargs):
+        """Pick OpenAI, GLM or a hedged pair depending on availability and breaker state"""
         if not self.openai_available:
             logger.warning("OpenAI not available, using GLM fallback directly")
-            if self.glm_client:
-                logger.info("Using GLM-4.5-flash fallback directly")
-                try:
-                    result = await glm_func(*args, **kwargs)
-                    logger.info("GLM fallback call successful")
-                    return result
-                except Exception as glm_error:
-                    logger.error(f"GLM fallback call failed: {glm_error}")
-                    raise RuntimeError(f"GLM fallback failed: {glm_error}")
-            else:
-                logger.error("GLM fallback not available")
-                raise RuntimeError("Neither OpenAI nor GLM fallback is available")
+            return await self._call_glm_only(glm_func, *args, **kwargs)
+        
+        # 熔断器打开时不再等待OpenAI失败，直接走GLM
+        if not self.openai_breaker.allow_request():
+            logger.warning("OpenAI circuit breaker open, routing directly to GLM")
+            return await self._call_glm_only(glm_func, *args, **kwargs)
+        
+        # GLM熔断时对冲没有意义，按普通顺序回退
+        if self.hedging_enabled and self.glm_client and self.glm_breaker.state == CLOSED:
+            logger.info("Attempting OpenAI API call with GLM hedging...")
+            try:
+                return await hedged_call(
+                    openai_func.__qualname__,
+                    lambda: self._guarded(self.openai_breaker, openai_func, *args, **kwargs),
+                    lambda: self._guarded(self.glm_breaker, glm_func, *args, **kwargs),
+                )
+            except Exception as e:
+                logger.error(f"OpenAI and GLM hedge both failed: {e}")
+                raise RuntimeError(f"OpenAI failed and GLM fallback failed: {e}")
         
         try:
             # Try OpenAI first
             logger.info("Attempting OpenAI API call...")
-            result = await openai_func(*args, **kwargs)
+            result = await self._guarded(self.openai_breaker, openai_func, *args, **kwargs)
             logger.info("OpenAI API call successful")
             return result
         except Exception as e:
@@ -85,7 +167,7 @@ class OpenAIClient:
             if self.glm_client:
                 logger.info("Switching to GLM-4.5-flash fallback...")
                 try:
-                    result = await glm_func(*args, **kwargs)
+                    result = await self._guarded(self.glm_breaker, glm_func, *args, **kwargs)
                     logger.info("GLM fallback call successful")
                     return result
                 except Exception as glm_error:
@@ -119,7 +201,7 @@ Provide a comprehensive analysis including:
 Structure the output as JSON with these fields.
 """
             
-            response = self.client.responses.create(
+            response = await self._responses_create(
                 model="gpt-5",
                 input=prompt
             )
@@ -153,7 +235,7 @@ Structure the output as JSON with these fields.
         async def openai_search():
             search_query = f"patent prior art {topic} {' '.join(keywords)}"
             
-            response = self.client.responses.create(
+            response = await self._responses_create(
                 model="gpt-5",
                 tools=[{"type": "web_search_preview"}],
                 input=search_query
@@ -186,8 +268,8 @@ Structure the output as JSON with these fields.
     async def _search_with_duckduckgo(self, topic: str, keywords: List[str], max_results: int) -> List[SearchResult]:
         """Search for prior art using DuckDuckGo (free alternative)"""
         try:
-            import requests
             from urllib.parse import quote_plus
+            from .http_pool import get_shared_http_client
             
             # Create search query
             search_query = f"patent prior art {topic} {' '.join(keywords)}"
@@ -197,7 +279,7 @@ Structure the output as JSON with these fields.
             url = f"https://api.duckduckgo.com/?q={encoded_query}&format=json&no_html=1&skip_disambig=1"
             
             # Make request
-            response = requests.get(url, timeout=10)
+            response = await get_shared_http_client().get(url, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -294,7 +376,7 @@ Create a comprehensive patent draft including:
 Use formal patent writing style and ensure technical accuracy.
 """
             
-            response = self.client.responses.create(
+            response = await self._responses_create(
                 model="gpt-5",
                 input=prompt
             )
@@ -428,7 +510,7 @@ Provide feedback on:
 Structure the output as JSON.
 """
             
-            response = self.client.responses.create(
+            response = await self._responses_create(
                 model="gpt-5",
                 input=prompt
             )
@@ -472,7 +554,7 @@ Make the claims:
 Return the optimized claims as a list.
 """
             
-            response = self.client.responses.create(
+            response = await self._responses_create(
                 model="gpt-5",
                 input=prompt
             )
@@ -508,7 +590,7 @@ Create descriptions for:
 Each description should be detailed enough for a technical illustrator to create the diagram.
 """
             
-            response = self.client.responses.create(
+            response = await self._responses_create(
                 model="gpt-5",
                 input=prompt
             )
@@ -528,20 +610,86 @@ Each description should be detailed enough for a technical illustrator to create
         
         return await self._call_with_fallback(openai_generate, glm_generate)
     
-    async def _generate_response(self, prompt: str) -> str:
-        """Generate response with fallback support"""
+    async def _generate_response(self, prompt: str, bypass_cache: bool = False) -> str:
+        """Generate response with fallback support (cached on disk, identical in-flight prompts coalesced)"""
         
-        async def openai_generate():
-            response = self.client.responses.create(
-                model="gpt-5",
+        async def openai_call():
+            response = await self._responses_create(
+                model=OPENAI_MODEL,
                 input=prompt
             )
             return response.output_text
         
+        async def openai_generate():
+            return await cached_generate("openai", OPENAI_MODEL, "", prompt, None, openai_call,
+                                         bypass_cache=bypass)
+        
         async def glm_generate():
             if self.glm_client:
-                return await self.glm_client._generate_response(prompt)
+                return await self.glm_client._generate_response(prompt, bypass_cache=bypass)
             else:
                 raise RuntimeError("GLM fallback not available")
         
-        return await self._call_with_fallback(openai_generate, glm_generate)
\ No newline at end of file
+        # 相同prompt的并发请求合并为一次提供方调用（含OpenAI→GLM回退链），用量计入每个合并的请求方
+        bypass = bypass_cache or cache_bypassed()
+        flight_key = make_cache_key("openai->glm", OPENAI_MODEL, "", prompt, None) + (":bypass" if bypass else "")
+        return await coalesced_llm_call(
+            llm_singleflight, flight_key, lambda: self._call_with_fallback(openai_generate, glm_generate)
+        )
+    
+    async def _generate_response_stream(self, prompt: str, bypass_cache: bool = False) -> AsyncIterator[str]:
+        """Stream response deltas; falls back to GLM only if OpenAI fails before its first delta"""
+        bypass = bypass_cache or cache_bypassed()
+        if self.openai_available and self.openai_breaker.allow_request():
+            breaker = self.openai_breaker
+            cache = get_llm_cache()
+            cache_key = make_cache_key("openai", OPENAI_MODEL, "", prompt, None)
+            if cache is not None and not bypass:
+                cached = await cache.aget(cache_key)
+                if cached is not None:
+                    breaker.record_cancelled()
+                    record_llm_usage("openai", OPENAI_MODEL, cache_hit=True)
+                    yield cached
+                    return
+            parts: List[str] = []
+            try:
+                logger.info("Attempting OpenAI streaming API call...")
+                start = time.monotonic()
+                usage = None
+                stream = await openai_retry_policy.run(lambda: self.client.responses.create(
+                    model=OPENAI_MODEL,
+                    input=prompt,
+                    stream=True,
+                    timeout=attempt_timeout(LLM_HTTP_TIMEOUT)
+                ))
+                async for event in stream:
+                    check_stage_deadline("OpenAI")
+                    event_type = getattr(event, "type", "")
+                    if event_type == "response.output_text.delta" and event.delta:
+                        parts.append(event.delta)
+                        yield event.delta
+                    elif event_type == "response.completed":
+                        usage = getattr(getattr(event, "response", None), "usage", None)
+                record_llm_usage("openai", OPENAI_MODEL, usage, time.monotonic() - start)
+            except StageDeadlineExceeded:
+                breaker.record_cancelled()
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                if parts:
+                    raise
+                logger.warning(f"OpenAI streaming error before first delta, falling back to GLM: {e}")
+            else:
+                breaker.record_success()
+                text = "".join(parts)
+                if cache is not None and text:
+                    try:
+                        await cache.aput(cache_key, "openai", OPENAI_MODEL, text)
+                    except Exception as e:
+                        logger.warning(f"⚠️ 写入LLM缓存失败: {e}")
+                return
+        
+        if not self.glm_client:
+            raise RuntimeError("Neither OpenAI nor GLM fallback is available")
+        async for delta in self.glm_client._generate_response_stream(prompt, bypass_cache=bypass):
+            yield delta
@@ -0,0 +1,156 @@
+"""
+Shared retry policy for LLM provider calls
+Decorrelated-jitter backoff, Retry-After support, one classification of
+retryable errors, and a stage deadline: retrying stops as soon as the stage's
+remaining budget cannot fit the wait plus another attempt.
+"""
+
+import os
+import time
+import random
+import asyncio
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Iterator, Optional
+
+import httpx
+
+from .concurrency import is_overload_error, is_timeout_error, retry_after_seconds, _status_code
+
+logger = logging.getLogger(__name__)
+
+LLM_RETRY_MAX_ATTEMPTS = int(os.getenv("LLM_RETRY_MAX_ATTEMPTS", "3"))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", "60"))
+# 剩余预算少于该值时不再发起新的尝试（秒）
+LLM_RETRY_MIN_ATTEMPT_SECONDS = float(os.getenv("LLM_RETRY_MIN_ATTEMPT_SECONDS", "10"))
+# 单个阶段的默认时间预算（秒）
+LLM_STAGE_BUDGET_SECONDS = float(os.getenv("LLM_STAGE_BUDGET_SECONDS", "1800"))
+
+OVERLOAD = "overload"
+TIMEOUT = "timeout"
+TRANSIENT = "transient"
+FATAL = "fatal"
+
+# 当前阶段的截止时间（time.monotonic），None表示不限
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("llm_stage_deadline", default=None)
+
+
+@contextmanager
+def stage_deadline(seconds: Optional[float] = LLM_STAGE_BUDGET_SECONDS) -> Iterator[None]:
+    """Bound LLM retries inside this block; nested deadlines keep the earlier one"""
+    outer = _deadline.get()
+    deadline = outer
+    if seconds is not None and seconds > 0:
+        deadline = time.monotonic() + seconds
+        if outer is not None:
+            deadline = min(deadline, outer)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_budget() -> Optional[float]:
+    """Seconds left before the current stage deadline (None when unbounded)"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def attempt_timeout(default: float) -> float:
+    """Per-attempt timeout capped by the remaining stage budget"""
+    remaining = remaining_budget()
+    if remaining is None:
+        return default
+    return max(min(default, remaining), 1.0)
+
+
+class StageDeadlineExceeded(RuntimeError):
+    """Raised between stream chunks once the stage deadline has passed (not a provider fault, never retried)"""
+
+
+def check_stage_deadline(name: str) -> None:
+    """Abort a long-running stream when the current stage deadline has passed"""
+    if remaining_budget() == 0.0:
+        raise StageDeadlineExceeded(f"{name} stream exceeded the stage deadline")
+
+
+def classify_error(error: BaseException) -> str:
+    """overload (429) / timeout / transient (5xx, connection) are retryable; everything else is fatal"""
+    if is_overload_error(error):
+        return OVERLOAD
+    if is_timeout_error(error):
+        return TIMEOUT
+    status = _status_code(error)
+    if status is not None:
+        return TRANSIENT if status in (408, 409) or status >= 500 else FATAL
+    if isinstance(error, (httpx.TransportError, ConnectionError)):
+        return TRANSIENT
+    if "connection" in type(error).__name__.lower():
+        # openai.APIConnectionError 等
+        return TRANSIENT
+    return FATAL
+
+
+def is_retryable(error: BaseException) -> bool:
+    return classify_error(error) != FATAL
+
+
+class RetryPolicy:
+    """Retry an async call with decorrelated jitter, bounded by attempts and the stage deadline"""
+
+    def __init__(self, name: str, max_attempts: int = LLM_RETRY_MAX_ATTEMPTS,
+                 base_delay: float = LLM_RETRY_BASE_DELAY, max_delay: float = LLM_RETRY_MAX_DELAY,
+                 min_attempt_seconds: float = LLM_RETRY_MIN_ATTEMPT_SECONDS):
+        self.name = name
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_attempt_seconds = min_attempt_seconds
+
+    def next_delay(self, previous: float) -> float:
+        """Decorrelated jitter: uniform(base, 3 * previous), capped"""
+        upper = max(self.base_delay, previous * 3)
+        return min(self.max_delay, random.uniform(self.base_delay, upper))
+
+    def backoff(self, error: BaseException, previous: float) -> float:
+        delay = self.next_delay(previous)
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    def can_fit(self, delay: float) -> bool:
+        remaining = remaining_budget()
+        return remaining is None or remaining - delay >= self.min_attempt_seconds
+
+    async def run(self, fn: Callable[[], Awaitable[Any]], max_attempts: Optional[int] = None,
+                  wait_on_overload: bool = True) -> Any:
+        """Call ``fn`` until it succeeds, fails fatally, runs out of attempts or of stage budget.
+
+        ``wait_on_overload=False`` skips the backoff sleep after a 429 for callers
+        whose admission control already enforces Retry-After (e.g. the GLM key pool).
+        """
+        attempts = max(1, max_attempts or self.max_attempts)
+        delay = self.base_delay
+        for attempt in range(1, attempts + 1):
+            try:
+                return await fn()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == FATAL or attempt == attempts:
+                    raise
+                delay = self.backoff(e, delay)
+                wait = 0.0 if kind == OVERLOAD and not wait_on_overload else delay
+                if not self.can_fit(wait):
+                    logger.warning(f"⏳ {self.name}阶段剩余预算不足，放弃重试 ({kind}): {e}")
+                    raise
+                logger.warning(f"🔁 {self.name}调用失败 ({kind}, 尝试 {attempt}/{attempts})，{wait:.1f}秒后重试: {e}")
+                if wait > 0:
+                    await asyncio.sleep(wait)
@@ -0,0 +1,71 @@
+"""
+In-flight request coalescing (single-flight)
+Concurrent identical requests attach to one outstanding call and all receive
+its result. Waiters are shielded: cancelling one never cancels the shared call,
+which is only cancelled once every waiter has gone away.
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Deduplicate concurrent calls that share a key"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._waiters: Dict[Tuple[int, str], int] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        loop = asyncio.get_running_loop()
+        call_key = (id(loop), key)
+        task = self._calls.get(call_key)
+        if task is None or task.done():
+            task = loop.create_task(fn())
+            self._calls[call_key] = task
+            task.add_done_callback(lambda t, k=call_key: self._finish(k, t))
+            self.leaders += 1
+        else:
+            self.followers += 1
+            logger.info(f"🔗 {self.name}合并相同的在途请求 key={key[:12]}")
+        # shield: 某个等待者被取消时，共享调用继续执行并服务其余等待者；
+        # 最后一个等待者也被取消时（例如对冲请求落败），才取消共享调用
+        self._waiters[call_key] = self._waiters.get(call_key, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._waiters.get(call_key, 0) <= 1 and self._calls.get(call_key) is task:
+                task.cancel()
+            raise
+        finally:
+            remaining = self._waiters.get(call_key, 1) - 1
+            if remaining > 0:
+                self._waiters[call_key] = remaining
+            else:
+                self._waiters.pop(call_key, None)
+
+    def _finish(self, call_key: Tuple[int, str], task: asyncio.Task) -> None:
+        if self._calls.get(call_key) is task:
+            del self._calls[call_key]
+        # 所有等待者都已取消时，避免“exception was never retrieved”告警
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._calls),
+            "leaders": self.leaders,
+            "coalesced": self.followers,
+            "coalesce_rate": round(self.followers / total, 4) if total else 0.0,
+        }
+
+
+# 进程内共享的LLM调用合并器
+llm_singleflight = SingleFlight("LLM")
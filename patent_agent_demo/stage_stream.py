@@ -0,0 +1,117 @@
+"""
+Streaming stage output to WebSocket subscribers
+Token deltas are buffered and flushed as coalesced ``stage_delta`` events every
+~150 ms through a sink registered by the service (ConnectionManager), so users
+see text within seconds instead of waiting for a whole section.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STAGE_DELTA_INTERVAL = float(os.getenv("STAGE_DELTA_INTERVAL", "0.15"))
+
+# (workflow_id, message) -> None，由unified_service注册为ConnectionManager.broadcast_workflow_update
+_stage_event_sink: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]] = None
+
+
+def set_stage_event_sink(sink: Optional[Callable[[str, Dict[str, Any]], Awaitable[None]]]) -> None:
+    global _stage_event_sink
+    _stage_event_sink = sink
+
+
+async def publish_stage_event(workflow_id: str, message: Dict[str, Any]) -> None:
+    """Send one event to the registered sink; never raises"""
+    if not workflow_id or _stage_event_sink is None:
+        return
+    try:
+        await _stage_event_sink(workflow_id, message)
+    except Exception as e:
+        logger.warning(f"⚠️ 推送stage事件失败: {e}")
+
+
+class StageDeltaBroadcaster:
+    """Coalesce token deltas of one section into periodic ``stage_delta`` events"""
+
+    def __init__(self, workflow_id: str, stage: str, section: str,
+                 interval: float = STAGE_DELTA_INTERVAL,
+                 on_flush: Optional[Callable[[str], None]] = None):
+        self.workflow_id = workflow_id
+        self.stage = stage
+        self.section = section
+        self.interval = interval
+        self.on_flush = on_flush
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._timer: Optional[asyncio.Task] = None
+        self._timer_flushing = False
+        self.seq = 0
+        self.chars = 0
+
+    async def push(self, delta: str) -> None:
+        if not delta:
+            return
+        self._buffer.append(delta)
+        wait = self.interval - (time.monotonic() - self._last_flush)
+        if wait <= 0:
+            await self.flush()
+        elif self._timer is None or self._timer.done():
+            self._timer = asyncio.get_running_loop().create_task(self._flush_later(wait))
+
+    async def _flush_later(self, wait: float) -> None:
+        await asyncio.sleep(wait)
+        self._timer_flushing = True
+        try:
+            await self.flush()
+        finally:
+            self._timer_flushing = False
+
+    async def flush(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        chunk = "".join(self._buffer)
+        self._buffer.clear()
+        self.chars += len(chunk)
+        if self.on_flush is not None:
+            try:
+                self.on_flush(chunk)
+            except Exception as e:
+                logger.warning(f"⚠️ 写入流式片段失败: {e}")
+        self.seq += 1
+        await publish_stage_event(self.workflow_id, {
+            "type": "stage_delta",
+            "workflow_id": self.workflow_id,
+            "stage": self.stage,
+            "section": self.section,
+            "seq": self.seq,
+            "delta": chunk,
+            "timestamp": time.time(),
+        })
+
+    async def close(self) -> None:
+        """Flush what is left and tell subscribers the section is complete"""
+        if self._timer is not None and not self._timer.done():
+            # 定时器已在flush中时缓冲区已清空，取消会丢掉正在推送的片段，只能等它完成
+            if not self._timer_flushing:
+                self._timer.cancel()
+            try:
+                await self._timer
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+        await publish_stage_event(self.workflow_id, {
+            "type": "stage_delta",
+            "workflow_id": self.workflow_id,
+            "stage": self.stage,
+            "section": self.section,
+            "seq": self.seq + 1,
+            "delta": "",
+            "done": True,
+            "chars": self.chars,
+            "timestamp": time.time(),
+        })
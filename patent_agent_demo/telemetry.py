@@ -1,14 +1,18 @@
 import logging
 from typing import Any, Dict, Tuple
 
+from .usage_ledger import capture_usage
+
 logger = logging.getLogger("telemetry")
 
 
 def estimate_tokens_from_text(text: str) -> int:
+    """Fallback estimate when the provider returned no usage (cache hits, coalesced calls)"""
     if not text:
         return 0
-    # Rough heuristic: 1 token ~ 4 characters
-    return max(1, len(text) // 4)
+    # Rough heuristic: each CJK character is ~1 token, other text ~4 characters per token
+    cjk = sum(1 for ch in text if "\u4e00" <= ch <= "\u9fff" or "\u3000" <= ch <= "\u303f" or "\uff00" <= ch <= "\uffef")
+    return max(1, cjk + (len(text) - cjk) // 4)
 
 
 class A2ALoggingProxy:
@@ -38,33 +42,38 @@ class A2ALoggingProxy:
         logger.info(f"AGENT_API_OUTPUT agent={self.agent_name} method={method_name} preview=\n{safe_out}")
 
     # Methods used by agents
-    async def _generate_response(self, prompt: str) -> str:
-        text = await self._client._generate_response(prompt)
-        usage = getattr(self._client, "last_usage", None)
-        await self._log_and_update("_generate_response", prompt, text, usage)
+    async def _generate_response(self, prompt: str, **kwargs) -> str:
+        with capture_usage() as usage:
+            text = await self._client._generate_response(prompt, **kwargs)
+        await self._log_and_update("_generate_response", prompt, text, usage.usage)
         return text
 
     async def analyze_patent_topic(self, *args, **kwargs):
-        result = await self._client.analyze_patent_topic(*args, **kwargs)
-        await self._log_and_update("analyze_patent_topic", "", str(result), getattr(self._client, "last_usage", None))
+        with capture_usage() as usage:
+            result = await self._client.analyze_patent_topic(*args, **kwargs)
+        await self._log_and_update("analyze_patent_topic", "", str(result), usage.usage)
         return result
 
     async def generate_patent_draft(self, *args, **kwargs):
-        result = await self._client.generate_patent_draft(*args, **kwargs)
-        await self._log_and_update("generate_patent_draft", "", str(result), getattr(self._client, "last_usage", None))
+        with capture_usage() as usage:
+            result = await self._client.generate_patent_draft(*args, **kwargs)
+        await self._log_and_update("generate_patent_draft", "", str(result), usage.usage)
         return result
 
     async def review_patent_draft(self, *args, **kwargs):
-        result = await self._client.review_patent_draft(*args, **kwargs)
-        await self._log_and_update("review_patent_draft", "", str(result), getattr(self._client, "last_usage", None))
+        with capture_usage() as usage:
+            result = await self._client.review_patent_draft(*args, **kwargs)
+        await self._log_and_update("review_patent_draft", "", str(result), usage.usage)
         return result
 
     async def optimize_patent_claims(self, *args, **kwargs):
-        result = await self._client.optimize_patent_claims(*args, **kwargs)
-        await self._log_and_update("optimize_patent_claims", "", str(result), getattr(self._client, "last_usage", None))
+        with capture_usage() as usage:
+            result = await self._client.optimize_patent_claims(*args, **kwargs)
+        await self._log_and_update("optimize_patent_claims", "", str(result), usage.usage)
         return result
 
     async def generate_technical_diagrams(self, *args, **kwargs):
-        result = await self._client.generate_technical_diagrams(*args, **kwargs)
-        await self._log_and_update("generate_technical_diagrams", "", str(result), getattr(self._client, "last_usage", None))
+        with capture_usage() as usage:
+            result = await self._client.generate_technical_diagrams(*args, **kwargs)
+        await self._log_and_update("generate_technical_diagrams", "", str(result), usage.usage)
         return result
\ No newline at end of file
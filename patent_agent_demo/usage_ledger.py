@@ -0,0 +1,247 @@
+"""
+LLM token usage ledger
+Provider usage objects (prompt / completion / cached tokens) are normalized and
+aggregated per workflow, stage and agent together with call latency, so the
+report can show which stage burns the tokens and the time.
+"""
+
+import os
+import time
+import threading
+import contextvars
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+LLM_USAGE_MAX_WORKFLOWS = int(os.getenv("LLM_USAGE_MAX_WORKFLOWS", "200"))
+
+# 当前调用归属的 (workflow_id, stage, agent)，由智能体执行入口设置
+_usage_scope: contextvars.ContextVar[Tuple[str, str, str]] = contextvars.ContextVar(
+    "llm_usage_scope", default=("", "", "")
+)
+
+# 调用期间记录的用量收集器（由capture_usage设置）；子任务继承同一收集器对象，
+# 因此对冲、合并等在子任务中完成的调用也会被收集，且并发调用互不覆盖
+_usage_captures: contextvars.ContextVar[Tuple["UsageCapture", ...]] = contextvars.ContextVar(
+    "llm_usage_captures", default=()
+)
+
+# coalesced_calls: 合并到其他工作流在途调用上的次数（其token同时计入双方，提供方只计费一次）
+_COUNTERS = ("calls", "cache_hits", "coalesced_calls", "prompt_tokens", "completion_tokens", "cached_tokens",
+             "total_tokens", "latency_seconds")
+
+
+@contextmanager
+def usage_scope(workflow_id: Optional[str] = None, stage: Optional[str] = None,
+                agent: Optional[str] = None) -> Iterator[None]:
+    """Attribute LLM calls made inside this block; unset fields inherit the outer scope"""
+    outer = _usage_scope.get()
+    token = _usage_scope.set((
+        workflow_id if workflow_id is not None else outer[0],
+        stage if stage is not None else outer[1],
+        agent if agent is not None else outer[2],
+    ))
+    try:
+        yield
+    finally:
+        _usage_scope.reset(token)
+
+
+def current_usage_scope() -> Tuple[str, str, str]:
+    return _usage_scope.get()
+
+
+class UsageCapture:
+    """Provider usage recorded while a ``capture_usage`` block was active"""
+
+    def __init__(self):
+        # (provider, model, normalized usage, latency, cache_hit)
+        self.records: List[Tuple[str, str, Optional[Dict[str, int]], float, bool]] = []
+
+    @property
+    def usage(self) -> Optional[Dict[str, int]]:
+        """Summed normalized usage, None when no call reported any"""
+        usages = [usage for _, _, usage, _, _ in self.records if usage]
+        if not usages:
+            return None
+        return {name: sum(usage.get(name, 0) for usage in usages)
+                for name in ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens")}
+
+
+@contextmanager
+def capture_usage() -> Iterator[UsageCapture]:
+    """Collect the usage of LLM calls made inside this block (per call chain, not per client)"""
+    capture = UsageCapture()
+    token = _usage_captures.set(_usage_captures.get() + (capture,))
+    try:
+        yield capture
+    finally:
+        _usage_captures.reset(token)
+
+
+def _field(obj: Any, name: str) -> Any:
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def normalize_usage(usage: Any) -> Optional[Dict[str, int]]:
+    """Map a chat-completions or responses-API usage object/dict to one shape"""
+    if usage is None:
+        return None
+    prompt = _field(usage, "prompt_tokens")
+    completion = _field(usage, "completion_tokens")
+    details = _field(usage, "prompt_tokens_details")
+    if prompt is None and completion is None:
+        # Responses API: input_tokens / output_tokens
+        prompt = _field(usage, "input_tokens")
+        completion = _field(usage, "output_tokens")
+        details = _field(usage, "input_tokens_details")
+    if prompt is None and completion is None:
+        return None
+    prompt = int(prompt or 0)
+    completion = int(completion or 0)
+    total = _field(usage, "total_tokens")
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "cached_tokens": int(_field(details, "cached_tokens") or 0),
+        "total_tokens": int(total) if total is not None else prompt + completion,
+    }
+
+
+def _empty() -> Dict[str, Any]:
+    return {name: 0 for name in _COUNTERS}
+
+
+def _add(target: Dict[str, Any], entry: Dict[str, Any]) -> None:
+    for name in _COUNTERS:
+        target[name] += entry[name]
+
+
+def _rounded(entry: Dict[str, Any]) -> Dict[str, Any]:
+    result = dict(entry)
+    result["latency_seconds"] = round(result["latency_seconds"], 3)
+    return result
+
+
+class UsageLedger:
+    """In-memory token/latency totals keyed by workflow -> (stage, agent, provider, model)"""
+
+    def __init__(self, max_workflows: int = LLM_USAGE_MAX_WORKFLOWS):
+        self.max_workflows = max_workflows
+        self._workflows: "OrderedDict[str, Dict[Tuple[str, str, str, str], Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, model: str, usage: Optional[Dict[str, int]] = None,
+               latency: float = 0.0, cache_hit: bool = False, coalesced: bool = False) -> None:
+        workflow_id, stage, agent = _usage_scope.get()
+        usage = usage or {}
+        with self._lock:
+            entries = self._workflows.get(workflow_id)
+            if entries is None:
+                entries = self._workflows[workflow_id] = {}
+                while len(self._workflows) > self.max_workflows:
+                    self._workflows.popitem(last=False)
+            key = (stage, agent, provider, model)
+            entry = entries.get(key)
+            if entry is None:
+                entry = entries[key] = _empty()
+            entry["calls"] += 1
+            entry["cache_hits"] += 1 if cache_hit else 0
+            entry["coalesced_calls"] += 1 if coalesced else 0
+            for name in ("prompt_tokens", "completion_tokens", "cached_tokens", "total_tokens"):
+                entry[name] += int(usage.get(name) or 0)
+            entry["latency_seconds"] += latency
+
+    def workflow_usage(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        """Totals for a workflow plus breakdowns by stage and agent (None if nothing recorded)"""
+        with self._lock:
+            entries = self._workflows.get(workflow_id)
+            if entries is None:
+                return None
+            entries = {key: dict(value) for key, value in entries.items()}
+        totals = _empty()
+        by_stage: Dict[str, Dict[str, Any]] = {}
+        by_agent: Dict[str, Dict[str, Any]] = {}
+        rows = []
+        for (stage, agent, provider, model), entry in entries.items():
+            _add(totals, entry)
+            _add(by_stage.setdefault(stage or "unknown", _empty()), entry)
+            _add(by_agent.setdefault(agent or "unknown", _empty()), entry)
+            rows.append({"stage": stage, "agent": agent, "provider": provider, "model": model,
+                         **_rounded(entry)})
+        return {
+            "workflow_id": workflow_id,
+            "totals": _rounded(totals),
+            "by_stage": {k: _rounded(v) for k, v in by_stage.items()},
+            "by_agent": {k: _rounded(v) for k, v in by_agent.items()},
+            "entries": rows,
+            "generated_at": time.time(),
+        }
+
+    def restore(self, workflow_id: str, usage: Optional[Dict[str, Any]]) -> bool:
+        """Seed a workflow from a persisted ``workflow_usage`` snapshot unless it is already tracked"""
+        if not usage or not usage.get("entries"):
+            return False
+        with self._lock:
+            if workflow_id in self._workflows:
+                return False
+            entries = self._workflows[workflow_id] = {}
+            while len(self._workflows) > self.max_workflows:
+                self._workflows.popitem(last=False)
+            for row in usage["entries"]:
+                key = (row.get("stage", ""), row.get("agent", ""), row.get("provider", ""), row.get("model", ""))
+                entry = entries.setdefault(key, _empty())
+                for name in _COUNTERS:
+                    entry[name] += row.get(name) or 0
+        return True
+
+    def clear(self, workflow_id: Optional[str] = None) -> None:
+        with self._lock:
+            if workflow_id is None:
+                self._workflows.clear()
+            else:
+                self._workflows.pop(workflow_id, None)
+
+
+usage_ledger = UsageLedger()
+
+
+def _record(provider: str, model: str, usage: Optional[Dict[str, int]], latency: float,
+            cache_hit: bool, coalesced: bool = False) -> None:
+    usage_ledger.record(provider, model, usage, latency, cache_hit, coalesced)
+    for capture in _usage_captures.get():
+        capture.records.append((provider, model, usage, latency, cache_hit))
+
+
+def record_llm_usage(provider: str, model: str, usage: Any = None, latency: float = 0.0,
+                     cache_hit: bool = False) -> Optional[Dict[str, int]]:
+    """Normalize a provider usage object, add it to the ledger and return the normalized dict"""
+    normalized = normalize_usage(usage)
+    _record(provider, model, normalized, latency, cache_hit)
+    return normalized
+
+
+async def coalesced_llm_call(flight: Any, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+    """Run ``fn`` through a SingleFlight; followers are charged the shared call's usage in their own scope"""
+    led = False
+
+    async def lead():
+        nonlocal led
+        led = True
+        with capture_usage() as capture:
+            result = await fn()
+        return result, capture
+
+    result, capture = await flight.do(key, lead)
+    if not led:
+        for provider, model, usage, latency, cache_hit in capture.records:
+            _record(provider, model, usage, latency, cache_hit, coalesced=True)
+    return result
+
+
+def get_workflow_usage(workflow_id: str) -> Optional[Dict[str, Any]]:
+    return usage_ledger.workflow_usage(workflow_id)
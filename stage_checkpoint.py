@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Stage Checkpoint - Resume workflows from the last completed stage
+Every completed stage writes its raw result as a JSON checkpoint next to the
+readable markdown file and records its checksum in stage_index.json. On restart
+or service start, stages with a valid result (in the workflow store or on disk)
+are kept and only the remaining stages run again.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from stage_scheduler import STAGE_DEPENDENCIES, topological_order
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_STAGES_ROOT = "workflow_stages"
+
+# 服务启动时自动续跑上次被中断的工作流
+WORKFLOW_AUTO_RESUME = os.getenv("WORKFLOW_AUTO_RESUME", "true").lower() == "true"
+
+DEFAULT_STAGES = ["planning", "search", "discussion", "drafting", "review", "rewrite"]
+
+
+def workflow_directory_path(workflow_id: str, topic: str) -> str:
+    """Same naming as create_workflow_directory: workflow_stages/<id>_<safe topic>"""
+    safe_topic = "".join(c for c in topic if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    safe_topic = safe_topic.replace(' ', '_')[:50]
+    return f"{WORKFLOW_STAGES_ROOT}/{workflow_id}_{safe_topic}"
+
+
+def find_workflow_directory(workflow_id: str) -> Optional[str]:
+    """Locate the stage directory of a workflow without knowing its topic"""
+    if not os.path.isdir(WORKFLOW_STAGES_ROOT):
+        return None
+    for item in sorted(os.listdir(WORKFLOW_STAGES_ROOT)):
+        if item.startswith(f"{workflow_id}_"):
+            return f"{WORKFLOW_STAGES_ROOT}/{item}"
+    return None
+
+
+def is_valid_result(result: Any) -> bool:
+    """A stage result can be reused unless it is missing or an error payload"""
+    if result is None or result == "" or result == {}:
+        return False
+    return not (isinstance(result, dict) and result.get("error"))
+
+
+def write_stage_checkpoint(dir_path: str, stage: str, result: Any) -> Dict[str, Any]:
+    """Atomically write the raw stage result; return the stage_index fields for it"""
+    payload = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+    filename = f"{stage}_result.json"
+    tmp_path = f"{dir_path}/.{filename}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, f"{dir_path}/{filename}")
+    return {"result_file": filename, "sha256": hashlib.sha256(payload).hexdigest(), "size": len(payload)}
+
+
+def load_stage_checkpoints(dir_path: str) -> Dict[str, Any]:
+    """Read checkpointed stage results listed in stage_index.json, skipping corrupt ones"""
+    index_file = f"{dir_path}/stage_index.json"
+    if not os.path.exists(index_file):
+        return {}
+    try:
+        with open(index_file, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except Exception as e:
+        logger.warning(f"⚠️ 无法读取阶段索引 {index_file}: {e}")
+        return {}
+
+    results = {}
+    for stage, info in index.get("stages", {}).items():
+        filename = info.get("result_file")
+        if not filename:
+            continue  # 旧版本只保存了markdown，无法恢复原始结果
+        try:
+            with open(f"{dir_path}/{filename}", "rb") as f:
+                payload = f.read()
+            if hashlib.sha256(payload).hexdigest() != info.get("sha256"):
+                logger.warning(f"⚠️ 阶段 {stage} 的检查点校验失败，将重新执行")
+                continue
+            result = json.loads(payload.decode("utf-8"))
+        except Exception as e:
+            logger.warning(f"⚠️ 阶段 {stage} 的检查点不可用: {e}")
+            continue
+        if is_valid_result(result):
+            results[stage] = result
+    return results
+
+
+def prepare_resume(workflow: Dict[str, Any], dependencies: Optional[Dict[str, List[str]]] = None) -> List[str]:
+    """Keep stages with a valid result, reset the rest to pending; return the kept stages.
+
+    Results missing from the workflow are restored from the on-disk checkpoints.
+    A stage is only kept when all of its dependencies are kept too, since a
+    re-run dependency would make its result stale.
+    """
+    dependencies = STAGE_DEPENDENCIES if dependencies is None else dependencies
+    stages = list(workflow["stages"])
+    results = workflow.setdefault("results", {})
+    dir_path = workflow.get("workflow_directory") or find_workflow_directory(workflow["workflow_id"])
+    checkpoints = load_stage_checkpoints(dir_path) if dir_path else {}
+
+    kept: List[str] = []
+    for stage in topological_order(stages, {s: dependencies.get(s, []) for s in stages}):
+        info = workflow["stages"][stage]
+        result = results.get(stage)
+        if info.get("status") != "completed" or not is_valid_result(result):
+            result = checkpoints.get(stage)
+        deps_kept = all(dep in kept for dep in dependencies.get(stage, []))
+        if deps_kept and is_valid_result(result):
+            results[stage] = result
+            if info.get("status") != "completed":
+                workflow["stages"][stage] = {"status": "completed", "started_at": info.get("started_at"),
+                                             "completed_at": info.get("completed_at") or time.time(),
+                                             "file_path": info.get("file_path"), "resumed": True}
+            kept.append(stage)
+        else:
+            results.pop(stage, None)
+            workflow["stages"][stage] = {"status": "pending", "started_at": None, "completed_at": None}
+
+    pending = [stage for stage in stages if stage not in kept]
+    workflow["status"] = "restarted"
+    workflow["current_stage"] = pending[0] if pending else stages[-1]
+    for key in ("error", "failure_reason", "failed_at", "completed_at"):
+        workflow.pop(key, None)
+    return [stage for stage in stages if stage in kept]
+
+
+def rebuild_workflow(workflow_id: str) -> Optional[Dict[str, Any]]:
+    """Rebuild a workflow from its stage directory when the workflow store lost it"""
+    dir_path = find_workflow_directory(workflow_id)
+    if not dir_path or not os.path.exists(f"{dir_path}/metadata.json"):
+        return None
+    with open(f"{dir_path}/metadata.json", 'r', encoding='utf-8') as f:
+        metadata = json.load(f)
+    stages = metadata.get("stages") or DEFAULT_STAGES
+    workflow = {
+        "workflow_id": workflow_id,
+        "topic": metadata.get("topic", ""),
+        "description": metadata.get("description", ""),
+        "workflow_type": "patent",
+        "test_mode": metadata.get("test_mode", False),
+        "status": "restarted",
+        "created_at": time.time(),
+        "stages": {stage: {"status": "pending", "started_at": None, "completed_at": None} for stage in stages},
+        "results": {},
+        "current_stage": stages[0],
+        "workflow_directory": dir_path,
+    }
+    logger.info(f"🧱 Rebuilt workflow {workflow_id} from {dir_path}")
+    return workflow
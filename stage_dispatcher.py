@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Stage Dispatcher - In-process agent execution with remote fallback
+Local agents are called directly (no JSON round-trip, TCP connection or
+request validation per stage); only agents configured as remote go over the
+shared pooled HTTP client.
+"""
+
+import os
+import time
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from models import TaskRequest, TaskResponse
+from patent_agent_demo.http_pool import get_shared_http_client
+from patent_agent_demo.retry_policy import stage_deadline
+from patent_agent_demo.usage_ledger import usage_scope
+
+logger = logging.getLogger(__name__)
+
+# Stage -> agent name (agent endpoints live at /agents/{agent})
+STAGE_TO_AGENT = {
+    "planning": "planner",
+    "search": "searcher",
+    "discussion": "discussion",
+    "drafting": "writer",
+    "review": "reviewer",
+    "rewrite": "rewriter",
+    "compressor": "compressor",
+}
+
+# 远程智能体配置，例如 "writer=http://10.0.0.5:8000/agents/writer,reviewer=http://..."
+REMOTE_AGENT_URLS = os.getenv("REMOTE_AGENT_URLS", "")
+REMOTE_AGENT_TIMEOUT = float(os.getenv("REMOTE_AGENT_TIMEOUT", "300"))
+
+TaskHandler = Callable[[TaskRequest], Awaitable[Dict[str, Any]]]
+
+
+def _parse_remote_urls(text: str) -> Dict[str, str]:
+    urls = {}
+    for item in text.split(","):
+        if "=" in item:
+            agent, url = item.split("=", 1)
+            if agent.strip() and url.strip():
+                urls[agent.strip()] = url.strip().rstrip("/")
+    return urls
+
+
+class StageDispatcher:
+    """Route agent tasks to a local handler or, for remote agents, to pooled HTTP"""
+
+    def __init__(self, remote_urls: Optional[Dict[str, str]] = None):
+        self._local: Dict[str, TaskHandler] = {}
+        self._labels: Dict[str, str] = {}
+        self._remote: Dict[str, str] = dict(remote_urls or {})
+        self.local_calls = 0
+        self.remote_calls = 0
+
+    def register_local(self, agent: str, handler: TaskHandler, label: Optional[str] = None) -> None:
+        self._local[agent] = handler
+        self._labels[agent] = label or agent
+
+    def register_remote(self, agent: str, base_url: str) -> None:
+        self._remote[agent] = base_url.rstrip("/")
+
+    def local_handler(self, agent: str) -> Optional[TaskHandler]:
+        """Handler that runs ``agent`` in-process, None when the agent is remote or unknown"""
+        return self._local.get(agent) if self.is_local(agent) else None
+
+    def is_local(self, agent: str) -> bool:
+        return agent not in self._remote and agent in self._local
+
+    async def run_local(self, agent: str, request: TaskRequest) -> Dict[str, Any]:
+        """Run a local handler with usage attribution and the stage retry deadline"""
+        handler = self._local.get(agent)
+        if handler is None:
+            raise RuntimeError(f"No local handler registered for agent: {agent}")
+        with usage_scope(request.workflow_id, request.stage_name, agent), stage_deadline():
+            return await handler(request)
+
+    async def dispatch(self, agent: str, request: TaskRequest,
+                       timeout: float = REMOTE_AGENT_TIMEOUT) -> TaskResponse:
+        """Execute a task on an agent, in-process when it is local"""
+        if self.is_local(agent):
+            self.local_calls += 1
+            logger.info(f"⚡ 进程内执行 {agent} 智能体任务: {request.task_id}")
+            result = await self.run_local(agent, request)
+            return TaskResponse.model_construct(
+                task_id=request.task_id,
+                status="completed",
+                result=result,
+                message=f"{self._labels[agent]} completed successfully in {'TEST' if request.test_mode else 'REAL'} mode",
+                test_mode=request.test_mode,
+            )
+
+        base_url = self._remote.get(agent)
+        if not base_url:
+            raise RuntimeError(f"Agent service not found: {agent}")
+        self.remote_calls += 1
+        logger.info(f"🌐 远程执行 {agent} 智能体任务: {base_url}")
+        start = time.monotonic()
+        response = await get_shared_http_client().post(
+            f"{base_url}/execute", json=request.model_dump(), timeout=timeout
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Agent {agent} failed with status {response.status_code}: {response.text}")
+        logger.info(f"✅ 远程 {agent} 智能体完成，耗时 {time.monotonic() - start:.1f}s")
+        return TaskResponse(**response.json())
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "local_agents": sorted(a for a in self._local if a not in self._remote),
+            "remote_agents": dict(self._remote),
+            "local_calls": self.local_calls,
+            "remote_calls": self.remote_calls,
+        }
+
+
+def build_task_request(workflow_id: str, stage: str, topic: str, description: str, test_mode: bool,
+                       previous_results: Dict[str, Any], context: Dict[str, Any]) -> TaskRequest:
+    """Build a TaskRequest without re-validating (and copying) previous results"""
+    return TaskRequest.model_construct(
+        task_id=f"{workflow_id}_{stage}_{int(time.time())}",
+        workflow_id=workflow_id,
+        stage_name=stage,
+        topic=topic,
+        description=description,
+        test_mode=test_mode,
+        previous_results=previous_results,
+        context=context,
+    )
+
+
+# 进程内共享的调度器，unified_service启动时注册本地智能体
+stage_dispatcher = StageDispatcher(_parse_remote_urls(REMOTE_AGENT_URLS))
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Stage Memo - Reuse stage results across workflows by input fingerprint
+A stage result is a function of (stage, topic, description, upstream results,
+prompt version, model). The fingerprint of those inputs keys a durable SQLite
+memo, so re-running a workflow after changing a late stage does not redo
+planning/search/discussion. The prompt version is a hash of the stage
+handler's source (plus the helpers and agent modules it uses), which
+invalidates memoized results whenever a prompt template is edited.
+"""
+
+import os
+import ast
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import inspect
+import sqlite3
+import logging
+import threading
+import importlib.util
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from stage_scheduler import STAGE_DEPENDENCIES
+
+logger = logging.getLogger(__name__)
+
+STAGE_MEMO_ENABLED = os.getenv("STAGE_MEMO_ENABLED", "true").lower() in ("1", "true", "yes")
+STAGE_MEMO_PATH = os.getenv("STAGE_MEMO_PATH", os.path.join("output", "cache", "stage_memo.sqlite3"))
+STAGE_MEMO_MAX_ENTRIES = int(os.getenv("STAGE_MEMO_MAX_ENTRIES", "2000"))
+STAGE_MEMO_TTL_SECONDS = float(os.getenv("STAGE_MEMO_TTL_SECONDS", str(7 * 24 * 3600)))
+# 手动提升该值可让所有阶段的记忆结果失效
+STAGE_PROMPT_VERSION = os.getenv("STAGE_PROMPT_VERSION", "1")
+
+# 每次执行都会变化、不影响阶段输出的字段，计算指纹时忽略；
+# memoized由adopt_result在命中时写入，不能让复用上游结果改变下游阶段的指纹
+VOLATILE_KEYS = {
+    "workflow_id", "task_id", "timestamp", "isolation_timestamp", "isolation_level", "stage_name",
+    "execution_time", "created_at", "started_at", "completed_at", "context_timestamp", "memoized",
+}
+
+
+def _digest(value: Any) -> str:
+    payload = json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _strip_volatile(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip_volatile(v) for k, v in value.items() if k not in VOLATILE_KEYS}
+    if isinstance(value, (list, tuple)):
+        return [_strip_volatile(v) for v in value]
+    if hasattr(value, "model_dump"):
+        return _strip_volatile(value.model_dump(mode="json"))
+    return value
+
+
+def _module_source(name: str) -> str:
+    module = sys.modules.get(name)
+    try:
+        if module is not None:
+            return inspect.getsource(module)
+        spec = importlib.util.find_spec(name)
+        if spec and spec.origin and spec.origin.endswith(".py"):
+            with open(spec.origin, "r", encoding="utf-8") as f:
+                return f.read()
+    except (ImportError, OSError, TypeError, ValueError):
+        pass
+    return ""
+
+
+def handler_source(handler: Callable) -> str:
+    """Normalized source of ``handler``, the module functions it calls and the project modules it imports"""
+    module = inspect.getmodule(handler)
+    try:
+        tree = ast.parse(inspect.getsource(module))
+    except (OSError, TypeError):
+        return getattr(handler, "__qualname__", repr(handler))
+    functions = {node.name: node for node in tree.body
+                 if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))}
+    seen: Set[str] = set()
+    imported: Set[str] = set()
+    pending = [handler.__name__]
+    parts: List[str] = []
+    while pending:
+        name = pending.pop()
+        if name in seen or name not in functions:
+            continue
+        seen.add(name)
+        node = functions[name]
+        # ast.unparse去掉注释和格式差异，只有真实改动才会改变版本
+        parts.append(ast.unparse(node))
+        for child in ast.walk(node):
+            if isinstance(child, ast.Call) and isinstance(child.func, ast.Name):
+                pending.append(child.func.id)
+            elif isinstance(child, ast.ImportFrom) and child.module and child.module.startswith("patent_agent_demo"):
+                imported.add(child.module)
+    parts.extend(_module_source(name) for name in sorted(imported))
+    return "\n".join(parts)
+
+
+_prompt_versions: Dict[str, str] = {}
+
+
+def prompt_version(stage: str) -> str:
+    """Hash of the code (and thus prompt templates) that produces ``stage``'s result"""
+    version = _prompt_versions.get(stage)
+    if version is None:
+        from stage_dispatcher import STAGE_TO_AGENT, stage_dispatcher
+        handler = stage_dispatcher.local_handler(STAGE_TO_AGENT.get(stage, stage))
+        source = handler_source(handler) if handler else f"remote:{stage}"
+        version = _prompt_versions[stage] = _digest([STAGE_PROMPT_VERSION, source])[:16]
+    return version
+
+
+def model_identity() -> str:
+    """Models the stage handlers call"""
+    try:
+        from patent_agent_demo.glm_client import GLM_MODEL
+        from patent_agent_demo.openai_client import OPENAI_MODEL
+    except Exception:
+        return "unknown"
+    return f"glm:{GLM_MODEL}|openai:{OPENAI_MODEL}"
+
+
+def stage_fingerprint(stage: str, topic: str, description: str, test_mode: bool,
+                      results: Dict[str, Any], scope: str = "service",
+                      dependencies: Optional[Dict[str, List[str]]] = None) -> str:
+    """Fingerprint of everything a stage reads; only results of declared dependencies count"""
+    dependencies = STAGE_DEPENDENCIES if dependencies is None else dependencies
+    upstream = {dep: _digest(_strip_volatile(results.get(dep))) for dep in dependencies.get(stage, [])}
+    return _digest([scope, stage, topic, description, bool(test_mode), upstream,
+                    prompt_version(stage), model_identity()])
+
+
+def is_memoizable(result: Any) -> bool:
+    if isinstance(result, dict):
+        return bool(result) and not result.get("error") and result.get("status") != "failed"
+    return result is not None and not isinstance(result, str)
+
+
+class StageMemo:
+    """SQLite-backed LRU of stage results keyed by input fingerprint"""
+
+    def __init__(self, path: str = STAGE_MEMO_PATH, max_entries: int = STAGE_MEMO_MAX_ENTRIES,
+                 ttl_seconds: float = STAGE_MEMO_TTL_SECONDS):
+        self.path = path
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.forced = 0
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS stage_memo (
+                fingerprint TEXT PRIMARY KEY,
+                stage TEXT NOT NULL,
+                result TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used_at REAL NOT NULL,
+                hits INTEGER DEFAULT 0
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_stage_memo_last_used ON stage_memo(last_used_at)")
+        self._conn.commit()
+
+    def get(self, fingerprint: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT result, created_at FROM stage_memo WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone()
+            if row is not None and self.ttl_seconds > 0 and row[1] + self.ttl_seconds <= now:
+                self._conn.execute("DELETE FROM stage_memo WHERE fingerprint = ?", (fingerprint,))
+                self._conn.commit()
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE stage_memo SET last_used_at = ?, hits = hits + 1 WHERE fingerprint = ?",
+                               (now, fingerprint))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, fingerprint: str, stage: str, result: Any) -> None:
+        now = time.time()
+        payload = json.dumps(result, ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO stage_memo (fingerprint, stage, result, created_at, last_used_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (fingerprint) DO UPDATE SET result=excluded.result, "
+                "created_at=excluded.created_at, last_used_at=excluded.last_used_at",
+                (fingerprint, stage, payload, now, now),
+            )
+            self.writes += 1
+            overflow = self._conn.execute("SELECT COUNT(*) FROM stage_memo").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM stage_memo WHERE fingerprint IN "
+                    "(SELECT fingerprint FROM stage_memo ORDER BY last_used_at ASC LIMIT ?)", (overflow,)
+                )
+            self._conn.commit()
+
+    async def run(self, stage: str, fingerprint: str, workflow_id: Optional[str],
+                  compute: Callable[[], Any], force: bool = False) -> Any:
+        """Return the memoized result for ``fingerprint`` or compute and store it.
+
+        ``force`` always recomputes (and refreshes the stored result).
+        """
+        if force:
+            self.forced += 1
+        else:
+            try:
+                cached = await asyncio.to_thread(self.get, fingerprint)
+            except Exception as e:
+                logger.warning(f"⚠️ 读取阶段记忆失败: {e}")
+                cached = None
+            if cached is not None:
+                logger.info(f"♻️ 阶段 {stage} 命中记忆结果 fingerprint={fingerprint[:12]}，跳过执行")
+                return adopt_result(cached, workflow_id)
+        result = await compute()
+        if is_memoizable(result):
+            try:
+                await asyncio.to_thread(self.put, fingerprint, stage, result)
+            except Exception as e:
+                logger.warning(f"⚠️ 写入阶段记忆失败: {e}")
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM stage_memo")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT stage, COUNT(*) FROM stage_memo GROUP BY stage").fetchall())
+        lookups = self.hits + self.misses
+        return {
+            "enabled": True,
+            "path": self.path,
+            "entries": sum(counts.values()),
+            "entries_by_stage": counts,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "writes": self.writes,
+            "forced": self.forced,
+            "prompt_versions": dict(_prompt_versions),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def adopt_result(result: Any, workflow_id: Optional[str]) -> Any:
+    """Rebind a memoized result to the workflow reusing it"""
+    if isinstance(result, dict) and workflow_id:
+        result = dict(result)
+        if "workflow_id" in result:
+            result["workflow_id"] = workflow_id
+        if isinstance(result.get("result"), dict) and "workflow_id" in result["result"]:
+            result["result"] = dict(result["result"], workflow_id=workflow_id)
+        result["memoized"] = True
+    return result
+
+
+_stage_memo: Optional[StageMemo] = None
+
+
+def get_stage_memo() -> Optional[StageMemo]:
+    """Process-wide memo, or None when disabled / unavailable"""
+    global _stage_memo
+    if not STAGE_MEMO_ENABLED:
+        return None
+    if _stage_memo is None:
+        try:
+            _stage_memo = StageMemo()
+            logger.info(f"🗄️ 阶段结果记忆已启用: {_stage_memo.path}")
+        except Exception as e:
+            logger.warning(f"⚠️ 阶段结果记忆初始化失败，已禁用: {e}")
+            return None
+    return _stage_memo
+
+
+def get_stage_memo_stats() -> Dict[str, Any]:
+    memo = get_stage_memo()
+    return memo.stats() if memo else {"enabled": False}
+
+
+async def memoized_stage(stage: str, topic: str, description: str, test_mode: bool,
+                         results: Dict[str, Any], workflow_id: Optional[str], compute: Callable[[], Any],
+                         force: bool = False, scope: str = "service") -> Any:
+    """Run ``compute()`` for a stage unless a result with the same input fingerprint is memoized"""
+    memo = get_stage_memo()
+    if memo is None:
+        return await compute()
+    fingerprint = stage_fingerprint(stage, topic, description, test_mode, results, scope)
+    return await memo.run(stage, fingerprint, workflow_id, compute, force)
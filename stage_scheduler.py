@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Stage Scheduler - Dependency-graph execution of workflow stages
+Stages declare the earlier stages whose results they actually read; every stage
+whose dependencies are complete starts immediately, bounded by a process-wide
+concurrency cap shared by all workflows.
+"""
+
+import os
+import asyncio
+import logging
+import weakref
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# 全局同时执行的阶段数上限（所有工作流共享）
+STAGE_MAX_CONCURRENCY = int(os.getenv("STAGE_MAX_CONCURRENCY", "4"))
+
+# 阶段数据依赖（与CoordinatorAgent._load_agent_dependencies同样的结构），
+# 只列出该阶段真正读取其结果的前序阶段
+STAGE_DEPENDENCIES: Dict[str, List[str]] = {
+    "planning": [],
+    "search": [],  # execute_searcher_task只使用topic/description
+    "discussion": ["planning", "search"],
+    "drafting": ["planning", "search", "discussion"],
+    "review": ["planning", "search", "discussion", "drafting"],
+    "rewrite": ["planning", "search", "discussion", "drafting", "review"],
+}
+
+
+def topological_order(stages: List[str], dependencies: Dict[str, List[str]]) -> List[str]:
+    """Order stages so every stage follows its dependencies; raise ValueError on cycles or unknown deps"""
+    order: List[str] = []
+    state: Dict[str, int] = {}  # 1=visiting, 2=done
+
+    def visit(stage: str) -> None:
+        if state.get(stage) == 2:
+            return
+        if state.get(stage) == 1:
+            raise ValueError(f"Stage dependency cycle at: {stage}")
+        state[stage] = 1
+        for dep in dependencies.get(stage, []):
+            if dep not in stages:
+                raise ValueError(f"Stage {stage} depends on unknown stage: {dep}")
+            visit(dep)
+        state[stage] = 2
+        order.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return order
+
+
+class StageScheduler:
+    """Run stages as a DAG under a shared concurrency cap"""
+
+    def __init__(self, dependencies: Optional[Dict[str, List[str]]] = None,
+                 max_concurrency: int = STAGE_MAX_CONCURRENCY):
+        self.dependencies = dict(dependencies if dependencies is not None else STAGE_DEPENDENCIES)
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = \
+            weakref.WeakKeyDictionary()
+        self.running = 0
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def run(self, stages: List[str], run_stage: Callable[[str], Awaitable[bool]]) -> Dict[str, str]:
+        """Execute ``run_stage(stage)`` for every stage once its dependencies succeeded.
+
+        ``run_stage`` returns True on success. After a failure no new stage is
+        started; stages already running are allowed to finish. Returns the final
+        status of every stage: completed / failed / skipped.
+        """
+        order = topological_order(stages, self.dependencies)
+        status: Dict[str, str] = {stage: "pending" for stage in order}
+        tasks: Dict[asyncio.Task, str] = {}
+
+        async def guarded(stage: str) -> bool:
+            async with self._semaphore():
+                self.running += 1
+                try:
+                    return await run_stage(stage)
+                finally:
+                    self.running -= 1
+
+        try:
+            await self._drive(order, status, tasks, guarded)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+
+        for stage, value in status.items():
+            if value == "pending":
+                status[stage] = "skipped"
+        return status
+
+    async def _drive(self, order, status, tasks, guarded) -> None:
+        failed = False
+        while True:
+            if not failed:
+                for stage in order:
+                    if status[stage] != "pending":
+                        continue
+                    if all(status[dep] == "completed" for dep in self.dependencies.get(stage, [])):
+                        status[stage] = "running"
+                        tasks[asyncio.ensure_future(guarded(stage))] = stage
+                        logger.info(f"🧩 阶段 {stage} 的依赖已满足，开始调度")
+            if not tasks:
+                break
+            done, _ = await asyncio.wait(tasks.keys(), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                stage = tasks.pop(task)
+                try:
+                    ok = task.result()
+                except Exception as e:
+                    logger.error(f"❌ 阶段 {stage} 执行异常: {e}")
+                    ok = False
+                status[stage] = "completed" if ok else "failed"
+                failed = failed or not ok
+
+
+# 进程内共享的阶段调度器，全局并发上限对所有工作流生效
+stage_scheduler = StageScheduler()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+消息总线微基准
+对比旧的轮询方式（队列为空返回None、消费者每0.1秒轮询、发送后等待10ms）与
+当前的阻塞优先级队列：消息投递延迟（发送到被消费者取出）和空闲智能体的CPU占用。
+
+用法: python test/bench_message_bus.py [--messages 200] [--idle-agents 50] [--idle-seconds 3]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import statistics
+import sys
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.message_bus import Message, MessageBusBroker, MessageType
+
+
+class PollingBroker:
+    """Reproduction of the previous broker: plain FIFO, non-blocking get, 10 ms sleep per send"""
+
+    def __init__(self):
+        self.message_queues = {}
+
+    async def register_agent(self, agent_name, capabilities):
+        self.message_queues[agent_name] = asyncio.Queue()
+
+    async def send_message(self, message):
+        await self.message_queues[message.recipient].put(message)
+        await asyncio.sleep(0.01)
+
+    async def get_message(self, agent_name, timeout=None):
+        queue = self.message_queues[agent_name]
+        if queue.qsize() == 0:
+            return None
+        return await queue.get()
+
+
+async def polling_consumer(broker, name, on_message, stop):
+    # 旧版BaseAgent._message_processing_loop
+    while not stop.is_set():
+        message = await broker.get_message(name)
+        if message:
+            on_message(message)
+        await asyncio.sleep(0.1)
+
+
+async def blocking_consumer(broker, name, on_message, stop):
+    while not stop.is_set():
+        message = await broker.get_message(name, timeout=60)
+        if message:
+            on_message(message)
+
+
+async def measure_latency(broker, consumer, messages):
+    latencies = []
+    received = asyncio.Event()
+
+    def on_message(message):
+        latencies.append(time.perf_counter() - message.timestamp)
+        received.set()
+
+    stop = asyncio.Event()
+    await broker.register_agent("receiver", ["bench"])
+    task = asyncio.ensure_future(consumer(broker, "receiver", on_message, stop))
+    start = time.perf_counter()
+    for i in range(messages):
+        received.clear()
+        await broker.send_message(Message(id=str(i), type=MessageType.STATUS, sender="bench", recipient="receiver",
+                                          content={}, timestamp=time.perf_counter()))
+        await received.wait()
+    total = time.perf_counter() - start
+    stop.set()
+    task.cancel()
+    latencies.sort()
+    return {
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "throughput_per_s": messages / total,
+    }
+
+
+async def measure_idle_cpu(broker, consumer, agents, seconds):
+    stop = asyncio.Event()
+    tasks = []
+    for i in range(agents):
+        await broker.register_agent(f"idle-{i}", ["bench"])
+        tasks.append(asyncio.ensure_future(consumer(broker, f"idle-{i}", lambda m: None, stop)))
+    await asyncio.sleep(0.2)
+    cpu_start, wall_start = time.process_time(), time.perf_counter()
+    await asyncio.sleep(seconds)
+    cpu = time.process_time() - cpu_start
+    wall = time.perf_counter() - wall_start
+    stop.set()
+    for task in tasks:
+        task.cancel()
+    return {"cpu_percent": 100.0 * cpu / wall}
+
+
+async def main(messages, idle_agents, idle_seconds):
+    logging.disable(logging.INFO)
+    rows = []
+    for label, broker_cls, consumer in (("before (polling)", PollingBroker, polling_consumer),
+                                        ("after (blocking)", MessageBusBroker, blocking_consumer)):
+        latency = await measure_latency(broker_cls(), consumer, messages)
+        idle = await measure_idle_cpu(broker_cls(), consumer, idle_agents, idle_seconds)
+        rows.append((label, latency, idle))
+
+    print(f"📊 消息总线微基准: {messages}条消息, {idle_agents}个空闲智能体/{idle_seconds}s")
+    print(f"{'broker':<18}{'mean latency':>14}{'p95 latency':>14}{'msgs/s':>10}{'idle CPU':>10}")
+    for label, latency, idle in rows:
+        print(f"{label:<18}{latency['mean_ms']:>11.2f} ms{latency['p95_ms']:>11.2f} ms"
+              f"{latency['throughput_per_s']:>10.0f}{idle['cpu_percent']:>9.2f}%")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Message bus latency / idle CPU microbenchmark")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--idle-agents", type=int, default=50)
+    parser.add_argument("--idle-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    asyncio.run(main(args.messages, args.idle_agents, args.idle_seconds))
+    print("✅ 基准完成")
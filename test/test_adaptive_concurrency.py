@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+测试自适应并发限流器（AIMD）
+验证并发窗口在成功时加性提升、429时乘性收缩、遵循Retry-After，
+以及释放的名额按先来先得直接移交给等待者
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.concurrency import AdaptiveConcurrencyLimiter
+
+
+class FakeProvider:
+    """模拟只支持固定并发数的LLM服务，超出时返回429"""
+
+    def __init__(self, capacity: int, latency: float = 0.02):
+        self.capacity = capacity
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+        self.rejected = 0
+
+    async def call(self):
+        if self.in_flight >= self.capacity:
+            self.rejected += 1
+            raise RuntimeError("429 Too Many Requests: concurrent limit")
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+
+
+async def _run_requests(limiter, provider, total: int):
+    async def one():
+        while True:
+            async with limiter:
+                try:
+                    await provider.call()
+                    limiter.record_success()
+                    return
+                except RuntimeError:
+                    limiter.record_overload()
+    await asyncio.gather(*(one() for _ in range(total)))
+
+
+def test_window_grows_on_success():
+    """持续成功时窗口应从1增长到上限"""
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1, max_limit=8)
+        provider = FakeProvider(capacity=100)
+        await _run_requests(limiter, provider, 200)
+        print(f"📈 最终窗口: {limiter.status()}")
+        assert limiter.limit == 8
+        assert provider.peak <= 8
+        assert provider.rejected == 0
+    asyncio.run(run())
+
+
+def test_window_shrinks_on_overload():
+    """遇到429时窗口应乘性收缩，并最终贴近服务端真实容量"""
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=8, max_limit=16,
+                                             decrease_cooldown=0.0)
+        provider = FakeProvider(capacity=3)
+        await _run_requests(limiter, provider, 150)
+        status = limiter.status()
+        print(f"📉 最终窗口: {status}, 429次数: {provider.rejected}")
+        assert status["overloads"] > 0
+        assert limiter.limit <= 4
+        assert status["in_flight"] == 0
+    asyncio.run(run())
+
+
+def test_retry_after_pauses_admission():
+    """Retry-After期间不放行新请求"""
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=4)
+        limiter.record_overload(retry_after=0.2)
+        start = time.monotonic()
+        async with limiter:
+            pass
+        elapsed = time.monotonic() - start
+        print(f"⏸️ 等待时间: {elapsed:.3f}s")
+        assert elapsed >= 0.18
+        assert limiter.limit == 2
+    asyncio.run(run())
+
+
+def test_released_slot_goes_to_earliest_waiter():
+    """释放后立即重新申请的调用方不能抢走已唤醒等待者的名额"""
+    async def run():
+        limiter = AdaptiveConcurrencyLimiter("test", initial_limit=1)
+        order = []
+
+        async def waiter(name):
+            async with limiter:
+                order.append(name)
+
+        await limiter.acquire()
+        first = asyncio.ensure_future(waiter("A"))
+        await asyncio.sleep(0.01)
+        limiter.release()
+        await limiter.acquire()  # A已被唤醒但尚未运行，名额仍属于A
+        order.append("holder")
+        second = asyncio.ensure_future(waiter("B"))
+        await asyncio.sleep(0.01)
+        limiter.release()
+        await limiter.acquire()
+        order.append("holder")
+        limiter.release()
+        await asyncio.gather(first, second)
+        assert order == ["A", "holder", "B", "holder"]
+        assert limiter.in_flight == 0 and limiter.status()["waiting"] == 0
+
+        # 被移交名额后取消的等待者会把名额继续交给下一位
+        await limiter.acquire()
+        cancelled = asyncio.ensure_future(waiter("cancelled"))
+        later = asyncio.ensure_future(waiter("later"))
+        await asyncio.sleep(0.01)
+        limiter.release()
+        cancelled.cancel()
+        await asyncio.gather(later)
+        assert order[-1] == "later" and limiter.in_flight == 0
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_window_grows_on_success()
+    test_window_shrinks_on_overload()
+    test_retry_after_pauses_admission()
+    test_released_slot_goes_to_earliest_waiter()
+    print("✅ 自适应并发限流器测试通过")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+测试工作流准入控制
+验证运行数上限、优先级顺序（交互式优先于批量、测试模式优先于真实模式）、队列满时拒绝以及排队位置/ETA
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from admission import AdmissionController, AdmissionRejected, priority_rank
+
+
+def test_priority_rank():
+    ranks = [priority_rank("interactive", True), priority_rank("interactive", False),
+             priority_rank("batch", True), priority_rank("batch", False)]
+    assert ranks == sorted(ranks) and len(set(ranks)) == 4
+
+
+def test_running_cap_and_priority_order():
+    async def run():
+        controller = AdmissionController(max_running=1, max_queued=10)
+        release = asyncio.Event()
+        started = []
+
+        def job(name):
+            async def body():
+                started.append(name)
+                await release.wait()
+            return body
+
+        assert controller.submit("first", job("first"))["admission"] == "running"
+        controller.submit("batch-real", job("batch-real"), "batch", False)
+        controller.submit("batch-test", job("batch-test"), "batch", True)
+        ticket = controller.submit("interactive-real", job("interactive-real"), "interactive", False)
+        assert ticket["queue_position"] == 1 and ticket["eta_seconds"] > 0
+        assert controller.position("batch-real") == 3
+        await asyncio.sleep(0)
+        assert started == ["first"]
+
+        release.set()
+        for _ in range(20):
+            await asyncio.sleep(0)
+        assert started == ["first", "interactive-real", "batch-test", "batch-real"]
+        assert controller.status()["admitted"] == 4
+    asyncio.run(run())
+
+
+def test_full_queue_rejects_with_retry_after():
+    async def run():
+        controller = AdmissionController(max_running=1, max_queued=1)
+        release = asyncio.Event()
+
+        async def body():
+            await release.wait()
+
+        controller.submit("a", body)
+        controller.submit("b", body)
+        try:
+            controller.submit("c", body)
+            assert False, "full queue should reject"
+        except AdmissionRejected as e:
+            assert e.retry_after >= 1
+        controller.submit("resumed", body, force=True)  # 重启续跑不受队列上限限制
+        assert controller.cancel("b") and controller.position("b") is None
+        assert controller.status()["queued"] == ["resumed"]
+        release.set()
+        await asyncio.sleep(0.01)
+        assert controller.status()["running"] == []
+        assert controller.status()["rejected"] == 1
+    asyncio.run(run())
+
+
+def test_duration_updates_eta():
+    controller = AdmissionController(max_running=2)
+    before = controller.estimate_start(3, test_mode=True)
+    controller.record_duration(True, 100.0, alpha=1.0)
+    assert controller.estimate_start(3, test_mode=True) == 150 > before
+
+
+if __name__ == "__main__":
+    test_priority_rank()
+    test_running_cap_and_priority_order()
+    test_full_queue_rejects_with_retry_after()
+    test_duration_updates_eta()
+    print("✅ 准入控制测试通过")
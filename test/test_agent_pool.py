@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+测试智能体实例池
+验证预热、实例复用与借出前重置、实例数上限下的等待、创建失败不占用名额、取消等待，
+以及统一服务为各智能体注册了实例池且撰写任务复用同一个已启动的WriterAgentSimple
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent_pool import AgentPool
+
+
+class FakeAgent:
+    def __init__(self, number):
+        self.number = number
+        self.test_mode = None
+        self.started = True
+        self.stopped = False
+
+    async def stop(self):
+        self.stopped = True
+
+
+def make_pool(size=2, fail_first=False):
+    created = []
+
+    async def factory():
+        if fail_first and not created:
+            created.append(None)
+            raise RuntimeError("start failed")
+        await asyncio.sleep(0)
+        agent = FakeAgent(len(created))
+        created.append(agent)
+        return agent
+
+    def reset(agent, test_mode=False):
+        agent.test_mode = test_mode
+
+    return AgentPool("fake", factory, reset, size=size), created
+
+
+def test_warm_reuse_and_reset():
+    async def run():
+        pool, created = make_pool(size=2)
+        await pool.warm()
+        assert len(created) == 2 and pool.stats()["idle"] == 2
+
+        async with pool.checkout(test_mode=True) as agent:
+            assert agent.test_mode is True and pool.in_use == 1
+        async with pool.checkout() as again:
+            assert again is agent and again.test_mode is False
+        assert len(created) == 2 and pool.stats()["checkouts"] == 2
+
+        await pool.close()
+        assert all(a.stopped for a in created) and pool.stats()["created"] == 0
+    asyncio.run(run())
+
+
+def test_bounded_checkouts_wait_for_release():
+    async def run():
+        pool, created = make_pool(size=2)
+        release = asyncio.Event()
+        in_use = []
+
+        async def task(i):
+            async with pool.checkout() as agent:
+                in_use.append(agent)
+                await release.wait()
+
+        tasks = [asyncio.ensure_future(task(i)) for i in range(5)]
+        await asyncio.sleep(0.01)
+        assert len(in_use) == 2 and pool.stats()["waiting"] == 3
+        release.set()
+        await asyncio.gather(*tasks)
+        assert len(created) == 2 and len(in_use) == 5 and pool.stats()["waits"] == 3
+
+        # 取消的等待者不会占用归还的实例
+        release.clear()
+        holders = [asyncio.ensure_future(task(i)) for i in range(2)]
+        await asyncio.sleep(0.01)
+        waiter = asyncio.ensure_future(task(2))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        release.set()
+        await asyncio.gather(*holders)
+        async with pool.checkout():
+            pass
+        assert pool.stats()["waiting"] == 0 and pool.in_use == 0
+    asyncio.run(run())
+
+
+def test_failed_creation_releases_slot():
+    async def run():
+        pool, created = make_pool(size=1, fail_first=True)
+        try:
+            async with pool.checkout():
+                pass
+            assert False, "factory failure should propagate"
+        except RuntimeError:
+            pass
+        async with pool.checkout() as agent:
+            assert agent.number == 1
+        assert pool.stats()["created"] == 1
+    asyncio.run(run())
+
+
+def test_unified_service_reuses_started_writer():
+    async def run():
+        import unified_service
+        from agent_pool import agent_pool_stats, get_agent_pool
+        from models import TaskRequest
+        from patent_agent_demo.agents.writer_agent_simple import TaskResult
+
+        assert {"planner", "searcher", "discussion", "writer", "reviewer", "rewriter"} <= set(agent_pool_stats())
+
+        pool = get_agent_pool("writer")
+        agents = []
+        original = pool._factory
+
+        async def factory():
+            agent = await original()
+
+            async def execute_task(task_data):
+                agents.append((agent, agent.test_mode))
+                return TaskResult(success=False, data={}, error_message="stub")
+
+            agent.execute_task = execute_task
+            return agent
+
+        pool._factory = factory
+        try:
+            for test_mode in (True, False):
+                request = TaskRequest(task_id="t", workflow_id="wf", stage_name="drafting", topic="主题",
+                                      description="d", test_mode=test_mode, previous_results={}, context={})
+                await unified_service.execute_writer_task(request)
+        finally:
+            pool._factory = original
+            await pool.close()
+        assert agents[0][0] is agents[1][0] and agents[0][0].openai_client is not None
+        assert [mode for _, mode in agents] == [True, False]
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_warm_reuse_and_reset()
+    test_bounded_checkouts_wait_for_release()
+    test_failed_creation_releases_slot()
+    test_unified_service_reuses_started_writer()
+    print("✅ 智能体实例池测试通过")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+测试批量生成的阶段共享
+验证阶段输入键沿依赖链传递、批次内相同输入的阶段只执行一次、失败结果不共享以及批次进度汇总
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_runner import SharedStageWork, batch_progress, stage_input_key
+
+
+def make_workflow(workflow_id, topic, status="running", stages=None):
+    return {"workflow_id": workflow_id, "topic": topic, "description": "d", "test_mode": False,
+            "status": status, "results": {}, "stages": stages or {}}
+
+
+def test_stage_keys_chain_through_dependencies():
+    a, b, c = make_workflow("a", "同一主题"), make_workflow("b", "同一主题"), make_workflow("c", "其他主题")
+    for stage in ("planning", "search", "discussion"):
+        assert stage_input_key(stage, a) == stage_input_key(stage, b)
+    assert stage_input_key("search", a) != stage_input_key("search", c)
+    # 上游键不同，下游阶段即使主题相同也不共享
+    b["stage_keys"]["planning"] = "different"
+    assert stage_input_key("discussion", a) != stage_input_key("discussion", b)
+
+
+def test_identical_stages_run_once():
+    async def run():
+        work = SharedStageWork("batch-1")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.02)
+            return {"workflow_id": "wf-1", "strategy": {"topic": "t"}}
+
+        results = await asyncio.gather(*(work.run("key", f"wf-{i}", compute) for i in range(1, 4)))
+        later = await work.run("key", "wf-9", compute)
+        assert len(calls) == 1
+        assert [r["workflow_id"] for r in results] == ["wf-1", "wf-2", "wf-3"]
+        assert later["workflow_id"] == "wf-9" and later["strategy"] is results[0]["strategy"]
+        assert work.stats() == {"stages_computed": 1, "stages_shared": 3}
+    asyncio.run(run())
+
+
+def test_failed_results_are_not_shared():
+    async def run():
+        work = SharedStageWork("batch-2")
+        outcomes = iter([{"error": True, "message": "boom"}, {"ok": True}])
+
+        async def compute():
+            return next(outcomes)
+
+        assert (await work.run("key", "wf-1", compute))["error"]
+        assert await work.run("key", "wf-2", compute) == {"ok": True}
+    asyncio.run(run())
+
+
+def test_batch_progress():
+    done = {"planning": {"status": "completed"}, "search": {"status": "completed"}}
+    half = {"planning": {"status": "completed"}, "search": {"status": "running"}}
+    batch = {"workflow_id": "batch-3", "created_at": 0}
+    progress = batch_progress(batch, [make_workflow("a", "t", "completed", done), make_workflow("b", "t", "running", half)])
+    assert progress["status"] == "running" and progress["finished"] == 1 and progress["progress"] == 75.0
+    assert progress["items"][1]["completed_stages"] == 1
+
+    progress = batch_progress(batch, [make_workflow("a", "t", "completed", done), make_workflow("b", "t", "failed", half)])
+    assert progress["status"] == "completed_with_errors"
+
+
+if __name__ == "__main__":
+    test_stage_keys_chain_through_dependencies()
+    test_identical_stages_run_once()
+    test_failed_results_are_not_shared()
+    test_batch_progress()
+    print("✅ 批量阶段共享测试通过")
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+测试按提供方的熔断器
+验证连续失败/高错误率时打开、打开期间直接跳过、冷却后通过探测恢复
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=3, cooldown=60)
+    for _ in range(3):
+        assert breaker.allow_request()
+        breaker.record_failure()
+    assert breaker.state == OPEN
+    assert not breaker.allow_request()
+    assert breaker.status()["short_circuited"] == 1
+
+
+def test_opens_on_error_rate():
+    breaker = CircuitBreaker("test", failure_threshold=100, error_rate_threshold=0.5,
+                             window=10, min_calls=10, cooldown=60)
+    for i in range(10):
+        breaker.record_failure() if i % 2 else breaker.record_success()
+    assert breaker.state == OPEN
+
+
+def test_half_open_trial_request_closes():
+    breaker = CircuitBreaker("test", failure_threshold=1, cooldown=0.0)
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.allow_request()          # 冷却结束，放行一个试探请求
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow_request()      # 试探期间其余请求仍被跳过
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe():
+    async def run():
+        results = {"ok": False}
+
+        async def probe():
+            if not results["ok"]:
+                raise RuntimeError("401 invalid key")
+
+        breaker = CircuitBreaker("test", failure_threshold=1, cooldown=0.0, probe=probe)
+        breaker.record_failure()
+        assert not breaker.allow_request()  # 有探测函数时真实请求不放行
+        await asyncio.sleep(0.01)
+        assert breaker.state == OPEN        # 探测失败，重新打开
+        results["ok"] = True
+        assert not breaker.allow_request()
+        await asyncio.sleep(0.01)
+        assert breaker.state == CLOSED
+        print(f"🔍 熔断器状态: {breaker.status()}")
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_opens_after_consecutive_failures()
+    test_opens_on_error_rate()
+    test_half_open_trial_request_closes()
+    test_half_open_probe()
+    print("✅ 熔断器测试通过")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+测试协调器的任务完成事件
+验证状态/错误消息直接唤醒等待中的阶段（无轮询延迟）、超时处理以及已完成任务记录的上限
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.agents import coordinator_agent as coordinator_module
+from patent_agent_demo.agents.coordinator_agent import CoordinatorAgent, PatentWorkflow, WorkflowStage
+from patent_agent_demo.message_bus import Message, MessageType
+
+
+def make_coordinator(reply):
+    """Coordinator whose broker answers every task with ``reply(task_id)``"""
+    coordinator = CoordinatorAgent(test_mode=True)
+    outcome = {}
+
+    class Broker:
+        async def send_message(self, message):
+            task_id = message.content["task"]["id"]
+            response = reply(task_id)
+            if response is not None:
+                # 智能体在另一个协程中完成并回复
+                asyncio.get_running_loop().call_later(0.01, lambda: asyncio.ensure_future(
+                    coordinator._process_message(response)))
+
+    async def available(agent_name):
+        return True
+
+    async def completed(workflow_id, stage_index, result):
+        outcome["completed"] = result
+
+    async def failed(workflow_id, stage_index, error):
+        outcome["failed"] = error
+
+    coordinator.broker = Broker()
+    coordinator._check_agent_availability = available
+    coordinator._build_task_content = lambda workflow, index, task_type, context: {"task": {"id": f"task-{index}"}}
+    coordinator._handle_stage_completion = completed
+    coordinator._handle_stage_error = failed
+    coordinator.active_workflows["wf"] = PatentWorkflow(
+        workflow_id="wf", topic="t", description="d", current_stage=0, overall_status="running",
+        start_time=time.time(), stages=[WorkflowStage("Planning & Strategy", "planner_agent", "pending")])
+    return coordinator, outcome
+
+
+def status_message(task_id, success=True, result=None):
+    return Message(id="m", type=MessageType.STATUS, sender="planner_agent", recipient="coordinator_agent",
+                   content={"task_id": task_id, "status": "completed", "success": success,
+                            "result": result if result is not None else {"plan": "p"}},
+                   timestamp=time.time())
+
+
+def test_completion_wakes_stage_immediately():
+    async def run():
+        coordinator, outcome = make_coordinator(status_message)
+        start = time.monotonic()
+        await coordinator._execute_workflow_stage("wf", 0)
+        assert outcome == {"completed": {"plan": "p"}}
+        assert time.monotonic() - start < 0.5
+        assert "task-0" in coordinator.completed_tasks and not coordinator._task_waiters
+    asyncio.run(run())
+
+
+def test_error_message_fails_stage():
+    async def run():
+        def reply(task_id):
+            return Message(id="e", type=MessageType.ERROR, sender="planner_agent", recipient="coordinator_agent",
+                           content={"task_id": task_id, "error": "boom"}, timestamp=time.time())
+        coordinator, outcome = make_coordinator(reply)
+        await coordinator._execute_workflow_stage("wf", 0)
+        assert "boom" in outcome["failed"] and coordinator.failed_tasks["task-0"] == "boom"
+    asyncio.run(run())
+
+
+def test_timeout_and_bounded_history():
+    async def run():
+        original = coordinator_module.COORDINATOR_TASK_TIMEOUT, coordinator_module.COORDINATOR_TASK_HISTORY
+        coordinator_module.COORDINATOR_TASK_TIMEOUT, coordinator_module.COORDINATOR_TASK_HISTORY = 0.05, 3
+        try:
+            coordinator, outcome = make_coordinator(lambda task_id: None)
+            await coordinator._execute_workflow_stage("wf", 0)
+            assert "timed out" in outcome["failed"] and not coordinator._task_waiters
+
+            for i in range(10):
+                await coordinator._handle_status_message_override(status_message(f"t{i}"))
+            assert list(coordinator.completed_tasks) == ["t7", "t8", "t9"]
+        finally:
+            coordinator_module.COORDINATOR_TASK_TIMEOUT, coordinator_module.COORDINATOR_TASK_HISTORY = original
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_completion_wakes_stage_immediately()
+    test_error_message_fails_stage()
+    test_timeout_and_bounded_history()
+    print("✅ 协调器任务完成事件测试通过")
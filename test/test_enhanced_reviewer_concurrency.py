@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试增强版审核智能体的并行综合审核
+验证新颖性、创造性、实用性与批判性四项分析并行执行，改进建议与总体评估在其后执行，
+以及超时或失败的分支降级为各自的回退结果而不拖住整个审核
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.agents import reviewer_agent as reviewer_module
+from patent_agent_demo.agents.reviewer_agent import EnhancedReviewerAgent
+
+CALL_SECONDS = 0.1
+
+
+def make_reviewer(slow=None, failing=None):
+    reviewer = EnhancedReviewerAgent()
+    events = []
+
+    async def keywords(chapter_5_content):
+        return ["关键词"]
+
+    async def deep_search(keywords, topic):
+        return {"results": []}
+
+    def branch(name):
+        async def analysis(*args):
+            events.append(("start", name))
+            await asyncio.sleep(CALL_SECONDS * (10 if name == slow else 1))
+            if name == failing:
+                raise RuntimeError("provider down")
+            events.append(("end", name))
+            return {"branch": name}
+        return analysis
+
+    reviewer._extract_chapter_5_keywords = keywords
+    reviewer._deep_search_chapter_5 = deep_search
+    for name in ("_analyze_novelty", "_analyze_inventiveness", "_analyze_utility", "_critical_analysis",
+                 "_generate_improvement_suggestions", "_generate_overall_assessment"):
+        setattr(reviewer, name, branch(name))
+    return reviewer, events
+
+
+def review(reviewer):
+    return reviewer.comprehensive_review("第三章", "第四章", "第五章", "主题", {})
+
+
+def test_analyses_run_concurrently_before_dependent_steps():
+    async def run():
+        reviewer, events = make_reviewer()
+        start = time.monotonic()
+        result = await review(reviewer)
+        elapsed = time.monotonic() - start
+
+        # 四项分析一轮，改进建议与总体评估一轮；串行需要6轮
+        assert elapsed < 3.5 * CALL_SECONDS
+        assert result["novelty_analysis"] == {"branch": "_analyze_novelty"}
+        assert result["overall_assessment"] == {"branch": "_generate_overall_assessment"}
+        first_dependent = events.index(("start", "_generate_improvement_suggestions"))
+        assert sum(1 for kind, _ in events[:first_dependent] if kind == "end") == 4
+        assert all(e[0] == "start" for e in events[:4])
+    asyncio.run(run())
+
+
+def test_slow_or_failing_branch_degrades_to_fallback():
+    async def run():
+        original = reviewer_module.REVIEW_ANALYSIS_TIMEOUT
+        reviewer_module.REVIEW_ANALYSIS_TIMEOUT = CALL_SECONDS * 3
+        try:
+            reviewer, _ = make_reviewer(slow="_analyze_inventiveness", failing="_critical_analysis")
+            start = time.monotonic()
+            result = await review(reviewer)
+            elapsed = time.monotonic() - start
+        finally:
+            reviewer_module.REVIEW_ANALYSIS_TIMEOUT = original
+
+        assert elapsed < 6 * CALL_SECONDS
+        assert result["inventiveness_analysis"]["analysis"] == "创造性分析暂时不可用"
+        assert result["critical_analysis"]["analysis"] == reviewer._generate_fallback_critical_analysis()["analysis"]
+        assert result["novelty_analysis"] == {"branch": "_analyze_novelty"}
+        assert result["improvement_suggestions"] == {"branch": "_generate_improvement_suggestions"}
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_analyses_run_concurrently_before_dependent_steps()
+    test_slow_or_failing_branch_degrades_to_fallback()
+    print("✅ 并行综合审核测试通过")
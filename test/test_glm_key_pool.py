@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+测试GLM多Key池
+使用本地模拟服务（每个Key有固定并发上限，超出返回429），
+验证请求按负载路由、429后Key被暂停、总吞吐量随Key数量近似线性增长，
+以及未安装openai库时GLM客户端退化为httpx直连
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 测试中放开速率预算，并发窗口直接从上限开始
+os.environ.setdefault("GLM_KEY_RPM", "0")
+os.environ.setdefault("GLM_CONCURRENCY_INITIAL", "4")
+os.environ.setdefault("GLM_CONCURRENCY_MAX", "4")
+
+from patent_agent_demo import glm_client
+from patent_agent_demo.glm_client import GLMA2AClient, _parse_key_texts
+from patent_agent_demo.key_pool import KeyPool, KeySlot
+from patent_agent_demo.llm_cache import bypass_llm_cache
+
+PER_KEY_CAPACITY = 4
+LATENCY = 0.05
+
+
+class FakeGLMProvider:
+    """模拟GLM服务：每个Key最多PER_KEY_CAPACITY个并发请求"""
+
+    def __init__(self):
+        self.in_flight = {}
+        self.calls = {}
+        self.rejected = 0
+
+    async def complete(self, api_key: str, prompt: str) -> str:
+        if self.in_flight.get(api_key, 0) >= PER_KEY_CAPACITY:
+            self.rejected += 1
+            raise RuntimeError("Error code: 429 - concurrent limit exceeded")
+        self.in_flight[api_key] = self.in_flight.get(api_key, 0) + 1
+        self.calls[api_key] = self.calls.get(api_key, 0) + 1
+        try:
+            await asyncio.sleep(LATENCY)
+            return f"ok:{prompt}"
+        finally:
+            self.in_flight[api_key] -= 1
+
+
+class FakeGLMClient(GLMA2AClient):
+    """把真实HTTP调用替换为本地模拟服务，路由/限流逻辑保持不变"""
+
+    def __init__(self, provider: FakeGLMProvider, api_keys):
+        super().__init__(api_keys=api_keys)
+        self.provider = provider
+
+    async def _generate_response_openai(self, prompt: str, api_key=None) -> str:
+        return await self.provider.complete(api_key or self.api_key, prompt)
+
+
+async def _measure(num_keys: int, requests: int = 80) -> float:
+    glm_client._glm_key_slots.clear()
+    provider = FakeGLMProvider()
+    client = FakeGLMClient(provider, [f"fake-key-{num_keys}-{i:04d}" for i in range(num_keys)])
+    start = time.monotonic()
+    # 绕过磁盘缓存，确保每个请求都打到模拟服务
+    with bypass_llm_cache():
+        results = await asyncio.gather(*(client._generate_response(f"p{i}") for i in range(requests)))
+    elapsed = time.monotonic() - start
+    assert len(results) == requests
+    assert provider.rejected == 0
+    # 负载应均匀分布到所有Key
+    assert len(provider.calls) == num_keys
+    assert max(provider.calls.values()) - min(provider.calls.values()) <= PER_KEY_CAPACITY
+    print(f"🔑 {num_keys} 个Key: {requests} 个请求耗时 {elapsed:.3f}s, 分布 {sorted(provider.calls.values())}")
+    return elapsed
+
+
+def test_throughput_scales_with_keys():
+    """总吞吐量随Key数量近似线性增长"""
+    async def run():
+        t1 = await _measure(1)
+        t4 = await _measure(4)
+        speedup = t1 / t4
+        print(f"🚀 4个Key加速比: {speedup:.2f}x")
+        assert speedup >= 3.0
+    asyncio.run(run())
+
+
+def test_key_benched_after_repeated_429():
+    """连续429后Key被暂停，请求改为路由到其它Key"""
+    async def run():
+        bad = KeySlot("bad-key-00000000", "GLM", 0, 1, 1, 1, bench_threshold=2, bench_seconds=30)
+        good = KeySlot("good-key-0000000", "GLM", 0, 1, 1, 1, bench_threshold=2, bench_seconds=30)
+        pool = KeyPool([bad, good])
+        bad.record_overload()
+        bad.record_overload()
+        assert not bad.is_healthy()
+        for _ in range(3):
+            async with pool.acquire() as slot:
+                assert slot is good
+        print(f"🪑 Key池状态: healthy_keys={pool.status()['healthy_keys']}")
+    asyncio.run(run())
+
+
+def test_parse_multi_key_file():
+    """Key文件支持多行多Key"""
+    text = "# GLM keys\nGLM_API_KEY=aaa\nZHIPUAI_API_KEY=bbb\nccc\nGLM_API_KEYS=ddd, eee\n"
+    assert _parse_key_texts(text) == ["aaa", "bbb", "ccc", "ddd", "eee"]
+
+
+def test_works_without_openai_sdk():
+    # 在子进程中屏蔽openai库，避免影响本进程已导入的模块
+    script = textwrap.dedent("""
+        import asyncio, sys
+        sys.modules["openai"] = None
+        from patent_agent_demo.http_pool import OPENAI_SDK_AVAILABLE, get_shared_http_client
+        from patent_agent_demo.glm_client import GLMA2AClient
+        client = GLMA2AClient(api_key="k")
+        assert not OPENAI_SDK_AVAILABLE and not client.use_openai_sdk and client.openai_client is None
+
+        async def main():
+            assert get_shared_http_client() is get_shared_http_client()
+        asyncio.run(main())
+        print("ok")
+    """)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True)
+    assert result.returncode == 0 and result.stdout.strip().endswith("ok"), result.stderr
+
+
+if __name__ == "__main__":
+    test_parse_multi_key_file()
+    test_key_benched_after_repeated_429()
+    test_throughput_scales_with_keys()
+    test_works_without_openai_sdk()
+    print("✅ GLM多Key池测试通过")
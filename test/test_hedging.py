@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+测试对冲请求（hedged calls）
+验证主提供方慢于延迟百分位时发起备用请求、先返回者胜出且落败者被取消，
+以及对冲胜出时主提供方的已耗时仍记入延迟样本
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo import hedging
+from patent_agent_demo.hedging import LatencyTracker, hedged_call, get_latency_tracker
+
+
+def test_latency_percentile():
+    tracker = LatencyTracker()
+    for i in range(1, 101):
+        tracker.record(i / 100)
+    assert abs(tracker.percentile(95) - 0.95) < 0.011
+    assert tracker.percentile(50) <= 0.51
+
+
+def _prime(operation: str, seconds: float):
+    tracker = get_latency_tracker(operation)
+    for _ in range(hedging.LLM_HEDGE_MIN_SAMPLES):
+        tracker.record(seconds)
+
+
+def test_slow_primary_is_hedged_and_cancelled():
+    async def run():
+        hedging.hedge_metrics = hedging.HedgeMetrics()
+        hedging.LLM_HEDGE_MIN_DELAY = 0.01
+        hedging.LLM_HEDGE_MAX_RATE = 1.0
+        _prime("slow-op", 0.02)
+        primary_cancelled = []
+
+        async def primary():
+            try:
+                await asyncio.sleep(5)
+                return "primary"
+            except asyncio.CancelledError:
+                primary_cancelled.append(1)
+                raise
+
+        async def secondary():
+            await asyncio.sleep(0.01)
+            return "secondary"
+
+        result = await hedged_call("slow-op", primary, secondary)
+        stats = hedging.get_hedging_stats()
+        print(f"🏁 对冲统计: {stats}")
+        assert result == "secondary"
+        assert primary_cancelled == [1]
+        assert stats["hedged"] == 1 and stats["hedge_wins"] == 1
+        # 被取消的主请求按已耗时记为下界样本
+        tracker = get_latency_tracker("slow-op")
+        assert len(tracker) == hedging.LLM_HEDGE_MIN_SAMPLES + 1 and tracker.percentile(100) > 0.02
+    asyncio.run(run())
+
+
+def test_fast_primary_is_not_hedged():
+    async def run():
+        hedging.hedge_metrics = hedging.HedgeMetrics()
+        hedging.LLM_HEDGE_MIN_DELAY = 0.01
+        _prime("fast-op", 0.2)
+        secondary_calls = []
+
+        async def primary():
+            await asyncio.sleep(0.01)
+            return "primary"
+
+        async def secondary():
+            secondary_calls.append(1)
+            return "secondary"
+
+        assert await hedged_call("fast-op", primary, secondary) == "primary"
+        assert secondary_calls == []
+        assert hedging.hedge_metrics.hedged == 0
+    asyncio.run(run())
+
+
+def test_primary_failure_falls_back():
+    async def run():
+        async def primary():
+            raise RuntimeError("openai down")
+
+        async def secondary():
+            return "glm"
+
+        assert await hedged_call("failing-op", primary, secondary) == "glm"
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_latency_percentile()
+    test_slow_primary_is_hedged_and_cancelled()
+    test_fast_primary_is_not_hedged()
+    test_primary_failure_falls_back()
+    print("✅ 对冲请求测试通过")
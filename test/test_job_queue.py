@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+测试SQLite租约任务队列
+验证租约/心跳/完成、worker崩溃后过期租约被其他worker回收、重试上限、多连接并发领取不重复，
+以及入队后立即被worker领取时API进程不会用旧状态覆盖worker写入的状态
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from job_queue import JobQueue
+
+
+def test_lease_heartbeat_complete():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(os.path.join(tmp, "jobs.sqlite3"), lease_seconds=30)
+        first = queue.enqueue("patent_workflow", {"workflow_id": "wf-1"}, job_id="wf-1")
+        queue.enqueue("patent_workflow", {"workflow_id": "wf-1"}, job_id="wf-1")  # 未完成时重复入队无效
+        queue.enqueue("patent_workflow", {"workflow_id": "wf-2"}, job_id="wf-2")
+
+        job = queue.lease("worker-a")
+        assert job["job_id"] == first and job["payload"] == {"workflow_id": "wf-1"}
+        assert job["attempt"] == 1 and not job["reclaimed"]
+        assert queue.heartbeat(first, "worker-a")
+        assert not queue.heartbeat(first, "worker-b")
+        assert queue.complete(first, "worker-a")
+        assert queue.get(first)["status"] == "done"
+        assert queue.lease("worker-b")["job_id"] == "wf-2"
+        assert queue.lease("worker-b") is None
+        stats = queue.stats()
+        assert stats["done"] == 1 and stats["leased"] == 1 and stats["active_workers"] == ["worker-b"]
+        queue.close()
+
+
+def test_expired_lease_is_reclaimed():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.sqlite3")
+        queue = JobQueue(path, lease_seconds=0.05, max_attempts=2)
+        queue.enqueue("patent_workflow", {"workflow_id": "wf-1"}, job_id="wf-1")
+        assert queue.lease("crashed")["attempt"] == 1
+        assert queue.lease("other") is None  # 租约未过期
+
+        time.sleep(0.1)
+        other = JobQueue(path, lease_seconds=0.05, max_attempts=2)  # 另一个进程的连接
+        job = other.lease("other")
+        assert job["reclaimed"] and job["attempt"] == 2
+        assert not queue.heartbeat("wf-1", "crashed")
+        assert not queue.complete("wf-1", "crashed")
+
+        time.sleep(0.1)
+        assert other.lease("third") is None  # 超过重试上限
+        assert other.get("wf-1")["status"] == "failed"
+        queue.close()
+        other.close()
+
+
+def test_fail_requeues_until_max_attempts():
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(os.path.join(tmp, "jobs.sqlite3"), max_attempts=2)
+        queue.enqueue("patent_workflow", {}, job_id="job")
+        queue.fail(queue.lease("w")["job_id"], "w", "boom")
+        assert queue.get("job")["status"] == "queued"
+        queue.fail(queue.lease("w")["job_id"], "w", "boom")
+        assert queue.get("job")["status"] == "failed"
+
+        queue.enqueue("patent_workflow", {}, job_id="job")  # 重新入队已失败的任务
+        assert queue.lease("w")["attempt"] == 1
+        queue.close()
+
+
+def test_concurrent_leases_are_exclusive():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "jobs.sqlite3")
+        producer = JobQueue(path)
+        for i in range(40):
+            producer.enqueue("patent_workflow", {"i": i}, job_id=f"job-{i}")
+        leased = []
+        lock = threading.Lock()
+
+        def worker(name):
+            queue = JobQueue(path)
+            while True:
+                job = queue.lease(name)
+                if job is None:
+                    break
+                with lock:
+                    leased.append(job["job_id"])
+                queue.complete(job["job_id"], name)
+            queue.close()
+
+        threads = [threading.Thread(target=worker, args=(f"w{i}",)) for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert sorted(leased) == sorted(f"job-{i}" for i in range(40))
+        assert producer.stats()["done"] == 40
+        producer.close()
+
+
+def test_worker_state_survives_schedule():
+    import unified_service
+    from workflow_store import WorkflowStore
+
+    with tempfile.TemporaryDirectory() as tmp:
+        queue = JobQueue(os.path.join(tmp, "jobs.sqlite3"), lease_seconds=30)
+        worker_store = WorkflowStore(unified_service.workflow_store.path)
+        original_enqueue, original_queue = queue.enqueue, unified_service.job_queue
+
+        def enqueue_then_lease(*args, **kwargs):
+            # worker在入队之后、schedule_workflow返回之前领取任务并写入运行状态
+            job_id = original_enqueue(*args, **kwargs)
+            job = queue.lease("worker-a")
+            workflow = worker_store[job["payload"]["workflow_id"]]
+            workflow["status"] = "running"
+            workflow["results"]["planning"] = {"plan": "worker"}
+            worker_store.save(job["payload"]["workflow_id"])
+            return job_id
+
+        queue.enqueue = enqueue_then_lease
+        unified_service.job_queue = queue
+        unified_service.app.state.workflows["wf-race"] = {
+            "workflow_id": "wf-race", "topic": "t", "description": "d", "status": "created",
+            "current_stage": None, "test_mode": True, "created_at": time.time(), "stages": {}, "results": {},
+        }
+        try:
+            ticket = unified_service.schedule_workflow("wf-race", "t", "d", True)
+            assert ticket["admission"] == "queued"
+            saved = WorkflowStore(unified_service.workflow_store.path)["wf-race"]
+            assert saved["status"] == "running" and saved["results"] == {"planning": {"plan": "worker"}}
+            assert unified_service.app.state.workflows["wf-race"]["status"] == "running"
+        finally:
+            unified_service.job_queue = original_queue
+            del unified_service.app.state.workflows["wf-race"]
+            worker_store.close()
+            queue.close()
+
+
+if __name__ == "__main__":
+    test_lease_heartbeat_complete()
+    test_expired_lease_is_reclaimed()
+    test_fail_requeues_until_max_attempts()
+    test_concurrent_leases_are_exclusive()
+    test_worker_state_survives_schedule()
+    print("✅ 任务队列测试通过")
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+测试LLM响应磁盘缓存
+验证命中/未命中计数、TTL过期、LRU淘汰以及按请求绕过缓存
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo import llm_cache
+from patent_agent_demo.llm_cache import LLMResponseCache, make_cache_key, cached_generate, bypass_llm_cache
+
+
+def _new_cache(**kwargs) -> LLMResponseCache:
+    path = os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3")
+    return LLMResponseCache(path=path, **kwargs)
+
+
+def test_key_depends_on_all_inputs():
+    base = make_cache_key("glm", "glm-4.5-flash", "sys", "prompt", 0.3)
+    assert base == make_cache_key("glm", "glm-4.5-flash", "sys", "prompt", 0.3)
+    assert base != make_cache_key("openai", "glm-4.5-flash", "sys", "prompt", 0.3)
+    assert base != make_cache_key("glm", "glm-4.5-flash", "sys", "prompt", 0.7)
+    assert base != make_cache_key("glm", "glm-4.5-flash", "other", "prompt", 0.3)
+
+
+def test_hit_miss_and_ttl():
+    cache = _new_cache(ttl_seconds=0.2)
+    assert cache.get("k") is None
+    cache.put("k", "glm", "m", "value")
+    assert cache.get("k") == "value"
+    time.sleep(0.25)
+    assert cache.get("k") is None
+    stats = cache.stats()
+    print(f"📊 缓存统计: {stats}")
+    assert stats["hits"] == 1 and stats["misses"] == 2
+
+
+def test_lru_eviction():
+    cache = _new_cache(max_entries=2)
+    cache.put("a", "glm", "m", "A")
+    time.sleep(0.01)
+    cache.put("b", "glm", "m", "B")
+    time.sleep(0.01)
+    assert cache.get("a") == "A"  # a 成为最近使用
+    time.sleep(0.01)
+    cache.put("c", "glm", "m", "C")
+    assert cache.get("b") is None
+    assert cache.get("a") == "A" and cache.get("c") == "C"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_cached_generate_and_bypass():
+    async def run():
+        llm_cache._llm_cache = _new_cache()
+        calls = []
+
+        async def generate():
+            calls.append(1)
+            return f"answer-{len(calls)}"
+
+        first = await cached_generate("glm", "m", "sys", "same prompt", 0.3, generate)
+        second = await cached_generate("glm", "m", "sys", "same prompt", 0.3, generate)
+        assert first == second == "answer-1"
+        assert len(calls) == 1
+
+        bypassed = await cached_generate("glm", "m", "sys", "same prompt", 0.3, generate, bypass_cache=True)
+        assert bypassed == "answer-2"
+        with bypass_llm_cache():
+            assert await cached_generate("glm", "m", "sys", "same prompt", 0.3, generate) == "answer-3"
+        print(f"🎯 调用次数: {len(calls)}, 统计: {llm_cache.get_llm_cache_stats()}")
+    try:
+        asyncio.run(run())
+    finally:
+        llm_cache._llm_cache = None
+
+
+if __name__ == "__main__":
+    test_key_depends_on_all_inputs()
+    test_hit_miss_and_ttl()
+    test_lru_eviction()
+    test_cached_generate_and_bypass()
+    print("✅ LLM响应缓存测试通过")
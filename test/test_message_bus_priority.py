@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+测试消息总线的优先级队列与阻塞等待
+验证按Message.priority投递（错误消息至少为10）、同优先级先进先出、阻塞等待被发送立即唤醒、
+超时返回None以及注销时唤醒等待者
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.message_bus import Message, MessageBusBroker, MessageType
+
+
+def make_message(message_id, priority=5, message_type=MessageType.COORDINATION):
+    return Message(id=message_id, type=message_type, sender="sender", recipient="agent",
+                   content={}, timestamp=time.time(), priority=priority)
+
+
+def test_priority_order_and_fifo():
+    async def run():
+        broker = MessageBusBroker()
+        await broker.register_agent("agent", ["test"])
+        await broker.send_message(make_message("low", 1))
+        await broker.send_message(make_message("normal-1"))
+        await broker.send_message(make_message("error", 1, MessageType.ERROR))
+        await broker.send_message(make_message("normal-2"))
+        await broker.send_message(make_message("high", 8))
+        received = []
+        while True:
+            message = await broker.get_message("agent", timeout=0)
+            if message is None:
+                break
+            received.append(message.id)
+        assert received == ["error", "high", "normal-1", "normal-2", "low"]
+    asyncio.run(run())
+
+
+def test_blocking_get_wakes_on_send():
+    async def run():
+        broker = MessageBusBroker()
+        await broker.register_agent("agent", ["test"])
+        assert await broker.get_message("agent", timeout=0.01) is None
+
+        waiter = asyncio.ensure_future(broker.get_message("agent"))
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        start = time.monotonic()
+        await broker.send_message(make_message("m"))
+        assert (await waiter).id == "m" and time.monotonic() - start < 0.05
+
+        waiter = asyncio.ensure_future(broker.get_message("agent"))
+        await asyncio.sleep(0.01)
+        await broker.unregister_agent("agent")
+        assert await asyncio.wait_for(waiter, 1) is None
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_priority_order_and_fifo()
+    test_blocking_get_wakes_on_send()
+    print("✅ 消息总线优先级队列测试通过")
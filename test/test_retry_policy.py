@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+测试统一重试策略
+验证错误分类、去相关抖动退避、Retry-After、阶段截止时间不足时停止重试，
+以及流式调用带有单次超时并在片段之间检查阶段截止时间
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+
+from patent_agent_demo.openai_client import OpenAIClient
+from patent_agent_demo.retry_policy import (
+    FATAL, OVERLOAD, TIMEOUT, TRANSIENT, RetryPolicy, StageDeadlineExceeded, attempt_timeout,
+    classify_error, remaining_budget, stage_deadline,
+)
+
+
+def _status_error(status: int, headers=None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://example.invalid/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return httpx.HTTPStatusError(f"HTTP {status}", request=request, response=response)
+
+
+def test_classify_errors():
+    assert classify_error(_status_error(429)) == OVERLOAD
+    assert classify_error(asyncio.TimeoutError()) == TIMEOUT
+    assert classify_error(_status_error(503)) == TRANSIENT
+    assert classify_error(httpx.ConnectError("refused")) == TRANSIENT
+    assert classify_error(_status_error(401)) == FATAL
+    assert classify_error(ValueError("bad json")) == FATAL
+
+
+def test_decorrelated_jitter_bounds():
+    policy = RetryPolicy("test", base_delay=1.0, max_delay=20.0)
+    delay = policy.base_delay
+    for _ in range(50):
+        nxt = policy.next_delay(delay)
+        assert policy.base_delay <= nxt <= min(policy.max_delay, max(policy.base_delay, delay * 3))
+        delay = nxt
+
+
+def test_retries_transient_then_succeeds_and_skips_fatal():
+    async def run():
+        policy = RetryPolicy("test", max_attempts=3, base_delay=0.01, max_delay=0.02, min_attempt_seconds=0)
+        calls = []
+
+        async def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise _status_error(502)
+            return "ok"
+
+        assert await policy.run(flaky) == "ok"
+        assert len(calls) == 3
+
+        fatal_calls = []
+
+        async def fatal():
+            fatal_calls.append(1)
+            raise _status_error(400)
+
+        try:
+            await policy.run(fatal)
+            assert False, "fatal error should propagate"
+        except httpx.HTTPStatusError:
+            pass
+        assert len(fatal_calls) == 1
+    asyncio.run(run())
+
+
+def test_retry_after_is_honoured():
+    async def run():
+        policy = RetryPolicy("test", max_attempts=2, base_delay=0.01, max_delay=0.02, min_attempt_seconds=0)
+        calls = []
+
+        async def limited():
+            calls.append(time.monotonic())
+            if len(calls) == 1:
+                raise _status_error(429, {"retry-after-ms": "200"})
+            return "ok"
+
+        assert await policy.run(limited) == "ok"
+        waited = calls[1] - calls[0]
+        print(f"⏱️ 429后等待 {waited:.3f}s")
+        assert waited >= 0.19
+    asyncio.run(run())
+
+
+def test_deadline_stops_retrying():
+    async def run():
+        policy = RetryPolicy("test", max_attempts=5, base_delay=0.5, max_delay=1.0, min_attempt_seconds=0.5)
+        calls = []
+
+        async def always_busy():
+            calls.append(1)
+            raise _status_error(503)
+
+        with stage_deadline(0.8):
+            assert 0 < remaining_budget() <= 0.8
+            assert attempt_timeout(300) <= 1.0
+            start = time.monotonic()
+            try:
+                await policy.run(always_busy)
+                assert False, "should give up"
+            except httpx.HTTPStatusError:
+                pass
+            elapsed = time.monotonic() - start
+        print(f"⏳ 截止时间内尝试 {len(calls)} 次，耗时 {elapsed:.3f}s")
+        assert len(calls) < 5
+        assert elapsed < 0.8
+        assert remaining_budget() is None
+    asyncio.run(run())
+
+
+class SlowStreamClient(OpenAIClient):
+    """OpenAIClient whose Responses API streams one delta every 50ms"""
+
+    def __init__(self):
+        self.openai_available = True
+        self.glm_client = None
+        self.requests = []
+
+    @property
+    def client(self):
+        async def create(**kwargs):
+            self.requests.append(kwargs)
+
+            async def events():
+                for i in range(20):
+                    await asyncio.sleep(0.05)
+                    yield SimpleNamespace(type="response.output_text.delta", delta=f"片段{i}")
+            return events()
+        return SimpleNamespace(responses=SimpleNamespace(create=create))
+
+
+def test_stream_is_bounded_by_stage_deadline():
+    async def run():
+        client = SlowStreamClient()
+        deltas = []
+        start = time.monotonic()
+        with stage_deadline(0.2):
+            try:
+                async for delta in client._generate_response_stream("prompt", bypass_cache=True):
+                    deltas.append(delta)
+                assert False, "stream should stop at the stage deadline"
+            except StageDeadlineExceeded:
+                pass
+        elapsed = time.monotonic() - start
+        assert client.requests[0]["stream"] is True and client.requests[0]["timeout"] <= 1.0
+        assert 0 < len(deltas) < 20 and elapsed < 0.5
+        assert classify_error(StageDeadlineExceeded("late")) == FATAL
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_classify_errors()
+    test_decorrelated_jitter_bounds()
+    test_retries_transient_then_succeeds_and_skips_fatal()
+    test_retry_after_is_honoured()
+    test_deadline_stops_retrying()
+    test_stream_is_bounded_by_stage_deadline()
+    print("✅ 统一重试策略测试通过")
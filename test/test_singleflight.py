@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+测试在途请求合并（single-flight）
+验证相同key的并发请求只触发一次调用，且单个等待者取消不会中断共享调用
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.singleflight import SingleFlight
+
+
+def test_concurrent_identical_requests_share_one_call():
+    async def run():
+        flight = SingleFlight("test")
+        calls = []
+
+        async def provider_call():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "shared result"
+
+        results = await asyncio.gather(*(flight.do("same", provider_call) for _ in range(10)))
+        assert results == ["shared result"] * 10
+        assert len(calls) == 1
+        stats = flight.stats()
+        print(f"🔗 合并统计: {stats}")
+        assert stats["leaders"] == 1 and stats["coalesced"] == 9 and stats["in_flight"] == 0
+
+        # 调用完成后相同key会重新发起
+        await flight.do("same", provider_call)
+        assert len(calls) == 2
+    asyncio.run(run())
+
+
+def test_cancelling_one_waiter_keeps_shared_call():
+    async def run():
+        flight = SingleFlight("test")
+        finished = []
+
+        async def provider_call():
+            await asyncio.sleep(0.1)
+            finished.append(1)
+            return "done"
+
+        first = asyncio.create_task(flight.do("k", provider_call))
+        second = asyncio.create_task(flight.do("k", provider_call))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        assert await second == "done"
+        assert finished == [1]
+        try:
+            await first
+            raise AssertionError("first waiter should be cancelled")
+        except asyncio.CancelledError:
+            pass
+    asyncio.run(run())
+
+
+def test_cancelling_last_waiter_cancels_call():
+    async def run():
+        flight = SingleFlight("test")
+        finished = []
+
+        async def provider_call():
+            await asyncio.sleep(0.1)
+            finished.append(1)
+
+        only = asyncio.create_task(flight.do("k", provider_call))
+        await asyncio.sleep(0.01)
+        only.cancel()
+        await asyncio.sleep(0.15)
+        assert finished == []
+        assert flight.stats()["in_flight"] == 0
+    asyncio.run(run())
+
+
+def test_errors_propagate_to_all_waiters():
+    async def run():
+        flight = SingleFlight("test")
+
+        async def failing_call():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("429")
+
+        results = await asyncio.gather(*(flight.do("k", failing_call) for _ in range(3)),
+                                       return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_concurrent_identical_requests_share_one_call()
+    test_cancelling_one_waiter_keeps_shared_call()
+    test_cancelling_last_waiter_cancels_call()
+    test_errors_propagate_to_all_waiters()
+    print("✅ single-flight测试通过")
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+测试阶段检查点与断点续跑
+验证检查点校验、只保留依赖完整的已完成阶段、从阶段目录重建丢失的工作流，
+以及重启接口拒绝仍在执行中的工作流、force只作用于重启后的一次运行
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stage_checkpoint
+from stage_checkpoint import (load_stage_checkpoints, prepare_resume, rebuild_workflow,
+                              write_stage_checkpoint)
+
+STAGES = ["planning", "search", "discussion", "drafting", "review", "rewrite"]
+
+
+def write_index(dir_path, entries):
+    with open(f"{dir_path}/stage_index.json", "w", encoding="utf-8") as f:
+        json.dump({"stages": entries, "final_patent": None}, f)
+
+
+def make_workflow(statuses, results):
+    return {
+        "workflow_id": "wf-1",
+        "topic": "专利 主题",
+        "description": "d",
+        "test_mode": True,
+        "status": "failed",
+        "failure_reason": "drafting stage failed",
+        "stages": {s: {"status": statuses.get(s, "pending"), "started_at": None, "completed_at": None} for s in STAGES},
+        "results": results,
+        "current_stage": "drafting",
+    }
+
+
+def test_checkpoint_roundtrip_and_corruption():
+    with tempfile.TemporaryDirectory() as tmp:
+        entries = {
+            "planning": write_stage_checkpoint(tmp, "planning", {"strategy": {"topic": "专利"}}),
+            "search": write_stage_checkpoint(tmp, "search", {"results": [1]}),
+            "discussion": write_stage_checkpoint(tmp, "discussion", {"error": True, "message": "boom"}),
+            "drafting": {"filename": "drafting_1.md"},  # 旧格式，没有原始结果
+        }
+        with open(f"{tmp}/search_result.json", "w", encoding="utf-8") as f:
+            f.write('{"results": [2]}')  # 被篡改，校验和不匹配
+        write_index(tmp, entries)
+
+        assert load_stage_checkpoints(tmp) == {"planning": {"strategy": {"topic": "专利"}}}
+        assert not any(name.endswith(".tmp") for name in os.listdir(tmp))
+
+
+def test_prepare_resume_keeps_completed_prefix():
+    with tempfile.TemporaryDirectory() as tmp:
+        write_index(tmp, {"search": write_stage_checkpoint(tmp, "search", {"results": [1]})})
+        workflow = make_workflow(
+            {"planning": "completed", "discussion": "completed", "drafting": "failed"},
+            {"planning": {"strategy": 1}, "discussion": {"ideas": 1}, "drafting": {"error": True}},
+        )
+        workflow["workflow_directory"] = tmp
+
+        kept = prepare_resume(workflow)
+        # search从磁盘检查点恢复；drafting失败后其余阶段重新执行
+        assert kept == ["planning", "search", "discussion"]
+        assert workflow["results"]["search"] == {"results": [1]}
+        assert "drafting" not in workflow["results"]
+        assert workflow["stages"]["drafting"]["status"] == "pending"
+        assert workflow["current_stage"] == "drafting"
+        assert workflow["status"] == "restarted" and "failure_reason" not in workflow
+
+
+def test_missing_dependency_invalidates_dependents():
+    workflow = make_workflow(
+        {"search": "completed", "discussion": "completed"},
+        {"search": {"results": [1]}, "discussion": {"ideas": 1}},
+    )
+    workflow["workflow_directory"] = None
+    kept = prepare_resume(workflow)
+    assert kept == ["search"]
+    assert workflow["stages"]["discussion"]["status"] == "pending"
+    assert "discussion" not in workflow["results"]
+
+
+def test_rebuild_from_stage_directory():
+    original_root = stage_checkpoint.WORKFLOW_STAGES_ROOT
+    with tempfile.TemporaryDirectory() as tmp:
+        stage_checkpoint.WORKFLOW_STAGES_ROOT = tmp
+        dir_path = f"{tmp}/wf-9_topic"
+        os.makedirs(dir_path)
+        with open(f"{dir_path}/metadata.json", "w", encoding="utf-8") as f:
+            json.dump({"workflow_id": "wf-9", "topic": "topic", "description": "desc", "test_mode": True,
+                       "stages": STAGES}, f)
+        write_index(dir_path, {"planning": write_stage_checkpoint(dir_path, "planning", "Mock planning")})
+
+        workflow = rebuild_workflow("wf-9")
+        assert workflow["description"] == "desc" and workflow["workflow_directory"] == dir_path
+        assert prepare_resume(workflow) == ["planning"]
+        assert workflow["current_stage"] == "search"
+        assert rebuild_workflow("missing") is None
+    stage_checkpoint.WORKFLOW_STAGES_ROOT = original_root
+
+
+def test_restart_endpoints_reject_active_workflow():
+    async def run():
+        import unified_service
+        from fastapi import HTTPException
+
+        scheduled = []
+        original = unified_service.schedule_workflow
+        unified_service.schedule_workflow = lambda workflow_id, *args: scheduled.append(workflow_id) or {
+            "queue_position": 0, "eta_seconds": 0, "admission": "started"}
+        workflow = make_workflow({"planning": "completed"}, {"planning": {"plan": 1}})
+        workflow.update(workflow_id="wf-restart", status="running", workflow_type="patent", workflow_directory=None)
+        unified_service.app.state.workflows["wf-restart"] = workflow
+        try:
+            for restart in (unified_service.restart_patent_workflow, unified_service.restart_workflow):
+                try:
+                    await restart("wf-restart", from_scratch=True)
+                    assert False, "restarting a running workflow should be rejected"
+                except HTTPException as e:
+                    assert e.status_code == 409
+            assert workflow["results"] == {"planning": {"plan": 1}} and not scheduled
+
+            workflow["status"] = "failed"
+            response = await unified_service.restart_workflow("wf-restart", force=True)
+            assert response["resumed_stages"] == ["planning"] and scheduled == ["wf-restart"]
+            assert workflow["status"] == "restarted" and workflow["force"] is True
+
+            # force只作用于这一次运行，运行结束后不再保留
+            workflow["status"] = "completed"
+            unified_service.end_workflow_run("wf-restart")
+            assert "force" not in workflow
+        finally:
+            unified_service.schedule_workflow = original
+            unified_service.app.state.workflows.pop("wf-restart", None)
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_checkpoint_roundtrip_and_corruption()
+    test_prepare_resume_keeps_completed_prefix()
+    test_missing_dependency_invalidates_dependents()
+    test_rebuild_from_stage_directory()
+    test_restart_endpoints_reject_active_workflow()
+    print("✅ 阶段检查点测试通过")
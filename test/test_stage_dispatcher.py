@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+测试阶段调度器
+验证本地智能体在进程内直接执行（结果按引用传递、带用量归属），以及远程智能体配置解析
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stage_dispatcher import StageDispatcher, _parse_remote_urls, build_task_request
+from patent_agent_demo.usage_ledger import current_usage_scope
+from patent_agent_demo.retry_policy import remaining_budget
+
+
+def test_local_dispatch_is_in_process():
+    async def run():
+        dispatcher = StageDispatcher()
+        seen = {}
+
+        async def fake_writer(request):
+            seen["previous_results"] = request.previous_results
+            seen["scope"] = current_usage_scope()
+            seen["budget"] = remaining_budget()
+            return {"title": f"Patent Application: {request.topic}", "test_mode": request.test_mode}
+
+        dispatcher.register_local("writer", fake_writer, "Patent drafting")
+        previous = {"planning": {"strategy": {"topic": "t"}}}
+        request = build_task_request("wf-1", "drafting", "t", "d", True, previous, {"workflow_id": "wf-1"})
+        response = await dispatcher.dispatch("writer", request)
+
+        assert response.status == "completed"
+        assert response.result["title"] == "Patent Application: t"
+        assert seen["previous_results"] is previous  # 无JSON往返、无拷贝
+        assert seen["scope"] == ("wf-1", "drafting", "writer")
+        assert seen["budget"] is not None
+        assert response.model_dump()["task_id"].startswith("wf-1_drafting_")
+        assert dispatcher.status()["local_calls"] == 1
+    asyncio.run(run())
+
+
+def test_unknown_and_remote_agents():
+    async def run():
+        dispatcher = StageDispatcher({"reviewer": "http://10.0.0.5:8000/agents/reviewer"})
+
+        async def fake_reviewer(request):
+            return {}
+
+        dispatcher.register_local("reviewer", fake_reviewer)
+        assert not dispatcher.is_local("reviewer")
+        request = build_task_request("wf-2", "planning", "t", "d", False, {}, {})
+        try:
+            await dispatcher.dispatch("planner", request)
+            assert False, "unknown agent should fail"
+        except RuntimeError as e:
+            assert "planner" in str(e)
+    asyncio.run(run())
+
+
+def test_parse_remote_urls():
+    urls = _parse_remote_urls("writer=http://a:1/agents/writer/, reviewer = http://b:2/agents/reviewer,bad")
+    assert urls == {"writer": "http://a:1/agents/writer", "reviewer": "http://b:2/agents/reviewer"}
+
+
+if __name__ == "__main__":
+    test_local_dispatch_is_in_process()
+    test_unknown_and_remote_agents()
+    test_parse_remote_urls()
+    print("✅ 阶段调度器测试通过")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+测试阶段结果记忆
+验证指纹只取决于阶段输入（忽略workflow_id/时间戳等易变字段）、提示词版本变化使结果失效、
+命中时跳过执行、force强制重算、失败结果不被记忆、多阶段链路重复执行时没有阶段被重算，
+以及WorkflowManager的force只作用于一次运行
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import uuid
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stage_memo
+from stage_memo import StageMemo, handler_source, stage_fingerprint
+
+
+def build_prompt(topic):
+    return f"请为{topic}撰写专利"
+
+
+async def fake_handler(request):
+    return {"content": build_prompt(request.topic)}
+
+
+def test_fingerprint_ignores_volatile_fields():
+    planning = {"strategy": "s", "workflow_id": "wf-1", "timestamp": 1.0}
+    search = {"results": [1, 2], "workflow_id": "wf-1"}
+    a = stage_fingerprint("discussion", "t", "d", False, {"planning": planning, "search": search})
+    b = stage_fingerprint("discussion", "t", "d", False, {
+        "planning": dict(planning, workflow_id="wf-2", timestamp=2.0),
+        "search": dict(search, workflow_id="wf-2"),
+        "drafting": {"content": "不是依赖，不影响指纹"},
+    })
+    assert a == b
+    assert a != stage_fingerprint("discussion", "t", "d", False, {"planning": dict(planning, strategy="x"), "search": search})
+    assert a != stage_fingerprint("discussion", "t", "d", False, {"planning": planning, "search": search}, scope="manager")
+    # 上游结果不影响无依赖的阶段
+    assert stage_fingerprint("planning", "t", "d", False, {}) == stage_fingerprint("planning", "t", "d", False, {"search": search})
+
+
+def test_prompt_change_invalidates():
+    source = handler_source(fake_handler)
+    assert "build_prompt" in source and "撰写专利" in source
+    before = stage_fingerprint("planning", "t", "d", False, {})
+    saved = dict(stage_memo._prompt_versions)
+    try:
+        stage_memo._prompt_versions["planning"] = "edited-template"
+        assert stage_fingerprint("planning", "t", "d", False, {}) != before
+    finally:
+        stage_memo._prompt_versions.clear()
+        stage_memo._prompt_versions.update(saved)
+
+
+def test_memo_hit_force_and_errors():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            memo = StageMemo(os.path.join(tmp, "memo.sqlite3"), max_entries=10)
+            calls = []
+
+            async def compute():
+                calls.append(1)
+                return {"workflow_id": "wf-1", "strategy": "s"}
+
+            first = await memo.run("planning", "fp", "wf-1", compute)
+            again = await memo.run("planning", "fp", "wf-2", compute)
+            assert len(calls) == 1 and first["strategy"] == again["strategy"]
+            assert again["workflow_id"] == "wf-2" and again["memoized"]
+
+            await memo.run("planning", "fp", "wf-3", compute, force=True)
+            assert len(calls) == 2
+
+            async def failing():
+                calls.append(1)
+                return {"error": True, "message": "boom"}
+
+            await memo.run("search", "bad", "wf-1", failing)
+            await memo.run("search", "bad", "wf-1", failing)
+            assert len(calls) == 4
+
+            stats = memo.stats()
+            assert stats["entries"] == 1 and stats["hits"] == 1 and stats["forced"] == 1
+            memo.close()
+    asyncio.run(run())
+
+
+def test_lru_bound():
+    with tempfile.TemporaryDirectory() as tmp:
+        memo = StageMemo(os.path.join(tmp, "memo.sqlite3"), max_entries=2)
+        for key in ("a", "b", "c"):
+            memo.put(key, "planning", {"key": key})
+        assert memo.get("a") is None and memo.get("c") == {"key": "c"}
+        memo.close()
+
+
+def test_rerunning_chain_never_recomputes():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            saved = stage_memo._stage_memo
+            stage_memo._stage_memo = StageMemo(os.path.join(tmp, "memo.sqlite3"))
+            computed = []
+            try:
+                for run_number in range(4):
+                    workflow_id = f"wf-{run_number}"
+                    results = {}
+                    for stage in ("planning", "search", "discussion", "drafting", "review", "rewrite"):
+                        async def compute(stage=stage):
+                            computed.append(stage)
+                            # 输出不确定：任何重算都会让下游指纹变化
+                            return {"workflow_id": workflow_id, "content": f"{stage}-{uuid.uuid4()}"}
+
+                        results[stage] = await stage_memo.memoized_stage(
+                            stage, "t", "d", False, results, workflow_id, compute)
+                    assert results["rewrite"]["workflow_id"] == workflow_id
+                assert computed == ["planning", "search", "discussion", "drafting", "review", "rewrite"]
+            finally:
+                stage_memo._stage_memo.close()
+                stage_memo._stage_memo = saved
+    asyncio.run(run())
+
+
+def test_manager_force_applies_to_one_run():
+    async def run():
+        from models import WorkflowState
+        from workflow_manager import WorkflowManager
+        from workflow_store import WorkflowStore
+
+        with tempfile.TemporaryDirectory() as tmp:
+            manager = WorkflowManager()
+            manager.workflows = WorkflowStore(
+                os.path.join(tmp, "workflows.sqlite3"), namespace="manager", results_key="stage_results",
+                encode=lambda workflow: workflow.model_dump(mode="json"), decode=WorkflowState.model_validate)
+            manager._should_compress_context = lambda stage_name, workflow: False
+            failing = {"stage": None}
+
+            async def assign(workflow_id, stage_name, workflow):
+                assert workflow.force is True
+                if stage_name == failing["stage"]:
+                    raise RuntimeError("agent down")
+                return {"content": stage_name}
+
+            manager._assign_task_to_agent = assign
+            workflow_id = manager.create_workflow("主题", "描述", force=True)
+            await manager.execute_workflow_with_agents(workflow_id)
+            assert manager.workflows[workflow_id].status == "completed"
+            assert manager.workflows[workflow_id].force is False
+
+            # 失败的运行同样清除force
+            failing["stage"] = "planning"
+            manager.reset_workflow(workflow_id, from_scratch=True, force=True)
+            await manager.execute_workflow_with_agents(workflow_id)
+            assert manager.workflows[workflow_id].status == "failed"
+            assert manager.workflows[workflow_id].force is False
+            manager.workflows.close()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_fingerprint_ignores_volatile_fields()
+    test_prompt_change_invalidates()
+    test_memo_hit_force_and_errors()
+    test_lru_bound()
+    test_rerunning_chain_never_recomputes()
+    test_manager_force_applies_to_one_run()
+    print("✅ 阶段结果记忆测试通过")
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+测试DAG阶段调度器
+验证无依赖阶段并发执行、依赖顺序、失败后跳过后续阶段、全局并发上限以及环检测
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from stage_scheduler import STAGE_DEPENDENCIES, StageScheduler, topological_order
+
+STAGES = ["planning", "search", "discussion", "drafting", "review", "rewrite"]
+STAGE_SECONDS = 0.1
+
+
+def test_independent_stages_run_concurrently():
+    async def run():
+        scheduler = StageScheduler(STAGE_DEPENDENCIES, max_concurrency=4)
+        finished = []
+        started = {}
+
+        async def run_stage(stage):
+            started[stage] = time.monotonic()
+            for dep in STAGE_DEPENDENCIES[stage]:
+                assert dep in finished, f"{stage} started before {dep}"
+            await asyncio.sleep(STAGE_SECONDS)
+            finished.append(stage)
+            return True
+
+        start = time.monotonic()
+        status = await scheduler.run(STAGES, run_stage)
+        elapsed = time.monotonic() - start
+        print(f"⏱️ 6个阶段耗时 {elapsed:.2f}s（串行约 {6 * STAGE_SECONDS:.2f}s）")
+        assert all(value == "completed" for value in status.values())
+        assert abs(started["planning"] - started["search"]) < STAGE_SECONDS / 2
+        assert elapsed < 5.5 * STAGE_SECONDS
+    asyncio.run(run())
+
+
+def test_failure_skips_dependents():
+    async def run():
+        scheduler = StageScheduler(STAGE_DEPENDENCIES)
+        executed = []
+
+        async def run_stage(stage):
+            executed.append(stage)
+            await asyncio.sleep(0.01)
+            return stage != "search"
+
+        status = await scheduler.run(STAGES, run_stage)
+        assert status["planning"] == "completed"
+        assert status["search"] == "failed"
+        assert all(status[s] == "skipped" for s in ["discussion", "drafting", "review", "rewrite"])
+        assert sorted(executed) == ["planning", "search"]
+    asyncio.run(run())
+
+
+def test_global_concurrency_cap():
+    async def run():
+        scheduler = StageScheduler({}, max_concurrency=2)
+        peak = 0
+
+        async def run_stage(stage):
+            nonlocal peak
+            peak = max(peak, scheduler.running)
+            await asyncio.sleep(0.02)
+            return True
+
+        # 两个工作流共享同一个调度器的并发上限
+        await asyncio.gather(scheduler.run(["a", "b", "c"], run_stage), scheduler.run(["d", "e"], run_stage))
+        assert peak == 2
+    asyncio.run(run())
+
+
+def test_cycle_and_unknown_dependency():
+    for deps in ({"a": ["b"], "b": ["a"]}, {"a": ["missing"]}):
+        try:
+            topological_order(["a", "b"], deps)
+            assert False, "invalid graph should be rejected"
+        except ValueError:
+            pass
+
+
+if __name__ == "__main__":
+    test_independent_stages_run_concurrently()
+    test_failure_skips_dependents()
+    test_global_concurrency_cap()
+    test_cycle_and_unknown_dependency()
+    print("✅ DAG阶段调度器测试通过")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+测试流式生成推送
+验证token片段被合并为stage_delta事件推送、结束时不丢失正在推送的片段，并增量写入output/progress章节文件
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo import stage_stream
+from patent_agent_demo.stage_stream import StageDeltaBroadcaster, set_stage_event_sink
+from patent_agent_demo.agents.writer_agent_simple import WriterAgentSimple, WritingTask
+
+
+class FakeStreamingClient:
+    """模拟逐token返回的LLM客户端"""
+
+    def __init__(self, tokens, delay=0.01):
+        self.tokens = tokens
+        self.delay = delay
+
+    async def _generate_response_stream(self, prompt: str, bypass_cache: bool = False):
+        for token in self.tokens:
+            await asyncio.sleep(self.delay)
+            yield token
+
+
+def _collect_events():
+    events = []
+
+    async def sink(workflow_id, message):
+        events.append((workflow_id, message))
+    set_stage_event_sink(sink)
+    return events
+
+
+def test_broadcaster_coalesces_deltas():
+    async def run():
+        events = _collect_events()
+        broadcaster = StageDeltaBroadcaster("wf-1", "drafting", "background", interval=0.05)
+        for i in range(50):
+            await broadcaster.push(f"t{i} ")
+            await asyncio.sleep(0.005)
+        await broadcaster.close()
+        deltas = [m for _, m in events if not m.get("done")]
+        text = "".join(m["delta"] for m in deltas)
+        print(f"🌊 50个片段合并为 {len(deltas)} 个stage_delta事件")
+        assert text == "".join(f"t{i} " for i in range(50))
+        assert 2 <= len(deltas) < 20
+        assert events[-1][1]["done"] is True
+        assert all(m["type"] == "stage_delta" for _, m in events)
+    try:
+        asyncio.run(run())
+    finally:
+        set_stage_event_sink(None)
+
+
+def test_close_keeps_chunk_of_running_flush():
+    async def run():
+        events = []
+        entered, release = asyncio.Event(), asyncio.Event()
+
+        async def slow_sink(workflow_id, message):
+            if not message.get("done") and not entered.is_set():
+                entered.set()
+                await release.wait()
+            events.append(message)
+        set_stage_event_sink(slow_sink)
+        broadcaster = StageDeltaBroadcaster("wf-1", "drafting", "background", interval=0.02)
+        await broadcaster.push("x")
+        await broadcaster.push("first")
+        # 定时器已进入flush（缓冲区已清空、片段正在推送）时结束本节
+        await entered.wait()
+        await broadcaster.push("second")
+        closing = asyncio.create_task(broadcaster.close())
+        await asyncio.sleep(0.01)
+        release.set()
+        await closing
+        deltas = [m["delta"] for m in events if not m.get("done")]
+        assert "".join(deltas) == "xfirstsecond", deltas
+        assert events[-1]["done"] is True and events[-1]["chars"] == len("xfirstsecond")
+    try:
+        asyncio.run(run())
+    finally:
+        set_stage_event_sink(None)
+
+
+def test_writer_streams_into_section_file():
+    async def run():
+        events = _collect_events()
+        writer = WriterAgentSimple(test_mode=True)
+        tokens = ["背景", "技术", "内容"] * 20
+        writer.openai_client = FakeStreamingClient(tokens)
+        task = WritingTask("t1", "主题", "描述", {}, {}, "patent_examiners", "technical_legal", workflow_id="wf-2")
+        progress_dir = tempfile.mkdtemp()
+        path = os.path.join(progress_dir, "02_background.md")
+
+        sizes = []
+
+        async def watch():
+            while True:
+                await asyncio.sleep(0.1)
+                if os.path.exists(path):
+                    sizes.append(os.path.getsize(path))
+
+        watcher = asyncio.create_task(watch())
+        text = await writer._generate_section(task, "prompt", "background", progress_dir,
+                                              "02_background.md", "背景技术")
+        watcher.cancel()
+        assert text == "".join(tokens)
+        with open(path, encoding="utf-8") as f:
+            assert f.read() == "# 背景技术\n\n" + "".join(tokens)
+        # 生成过程中文件在逐步增长
+        assert len(set(sizes)) >= 2
+        assert any(m["section"] == "background" for _, m in events)
+        assert all(wid == "wf-2" for wid, _ in events)
+    try:
+        asyncio.run(run())
+    finally:
+        set_stage_event_sink(None)
+
+
+if __name__ == "__main__":
+    test_broadcaster_coalesces_deltas()
+    test_close_keeps_chunk_of_running_flush()
+    test_writer_streams_into_section_file()
+    print("✅ 流式推送测试通过")
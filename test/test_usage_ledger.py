@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+测试LLM Token用量账本
+验证两种usage格式的归一化、按工作流/阶段/智能体汇总、缓存命中计数、
+并发调用各自收集本次用量、合并请求的跟随者同样计费，以及从持久化快照恢复
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo import llm_cache
+from patent_agent_demo.llm_cache import LLMResponseCache, cached_generate
+from patent_agent_demo.singleflight import SingleFlight
+from patent_agent_demo.usage_ledger import (
+    capture_usage, coalesced_llm_call, get_workflow_usage, normalize_usage, record_llm_usage,
+    usage_ledger, usage_scope,
+)
+from patent_agent_demo.telemetry import estimate_tokens_from_text
+
+
+def test_normalize_chat_and_responses_usage():
+    chat = SimpleNamespace(prompt_tokens=120, completion_tokens=30, total_tokens=150,
+                           prompt_tokens_details=SimpleNamespace(cached_tokens=100))
+    assert normalize_usage(chat) == {"prompt_tokens": 120, "completion_tokens": 30,
+                                     "cached_tokens": 100, "total_tokens": 150}
+    responses = SimpleNamespace(input_tokens=80, output_tokens=20, total_tokens=100,
+                                input_tokens_details=SimpleNamespace(cached_tokens=64))
+    assert normalize_usage(responses)["cached_tokens"] == 64
+    http = {"prompt_tokens": 10, "completion_tokens": 5}
+    assert normalize_usage(http)["total_tokens"] == 15
+    assert normalize_usage(None) is None
+
+
+def test_aggregate_by_stage_and_agent():
+    async def run():
+        usage_ledger.clear()
+        usage = {"prompt_tokens": 100, "completion_tokens": 40, "total_tokens": 140}
+
+        async def stage_call(stage: str, agent: str, times: int):
+            with usage_scope("wf-1", stage, agent):
+                for _ in range(times):
+                    record_llm_usage("glm", "glm-4.5-flash", usage, latency=0.5)
+
+        # 并发阶段互不串扰（contextvar按任务隔离）
+        await asyncio.gather(stage_call("planning", "planner", 2), stage_call("drafting", "writer", 3))
+        with usage_scope("wf-2", "review", "reviewer"):
+            record_llm_usage("openai", "gpt-5", {"input_tokens": 1, "output_tokens": 1})
+
+        summary = get_workflow_usage("wf-1")
+        print(f"📊 用量汇总: {summary['totals']}")
+        assert summary["totals"]["calls"] == 5
+        assert summary["totals"]["total_tokens"] == 700
+        assert summary["by_stage"]["drafting"]["completion_tokens"] == 120
+        assert summary["by_agent"]["planner"]["latency_seconds"] == 1.0
+        assert get_workflow_usage("wf-2")["totals"]["calls"] == 1
+        assert get_workflow_usage("missing") is None
+    asyncio.run(run())
+
+
+def test_cache_hit_is_recorded_without_tokens():
+    async def run():
+        usage_ledger.clear()
+        llm_cache._llm_cache = LLMResponseCache(path=os.path.join(tempfile.mkdtemp(), "c.sqlite3"))
+
+        async def generate():
+            record_llm_usage("glm", "m", {"prompt_tokens": 50, "completion_tokens": 10})
+            return "answer"
+
+        with usage_scope("wf-cache", "search", "searcher"):
+            await cached_generate("glm", "m", "sys", "prompt", 0.3, generate)
+            await cached_generate("glm", "m", "sys", "prompt", 0.3, generate)
+        totals = get_workflow_usage("wf-cache")["totals"]
+        assert totals["calls"] == 2 and totals["cache_hits"] == 1
+        assert totals["prompt_tokens"] == 50
+    try:
+        asyncio.run(run())
+    finally:
+        llm_cache._llm_cache = None
+
+
+def test_concurrent_calls_capture_their_own_usage():
+    async def run():
+        usage_ledger.clear()
+
+        # 同一个客户端实例上交错完成的两次调用，各自只看到自己的用量
+        async def call(tokens: int, delay: float):
+            with capture_usage() as usage:
+                await asyncio.sleep(delay)
+                record_llm_usage("glm", "m", {"prompt_tokens": tokens, "completion_tokens": tokens})
+                await asyncio.sleep(0.02)
+            return usage.usage
+
+        slow, fast = await asyncio.gather(call(100, 0.0), call(7, 0.01))
+        assert slow["completion_tokens"] == 100 and fast["completion_tokens"] == 7
+        with capture_usage() as empty:
+            pass
+        assert empty.usage is None
+    asyncio.run(run())
+
+
+def test_coalesced_followers_are_charged():
+    async def run():
+        usage_ledger.clear()
+        flight = SingleFlight("test")
+
+        async def provider_call():
+            await asyncio.sleep(0.02)
+            record_llm_usage("glm", "m", {"prompt_tokens": 30, "completion_tokens": 10}, latency=0.02)
+            return "answer"
+
+        async def request(workflow_id: str):
+            with usage_scope(workflow_id, "search", "searcher"), capture_usage() as usage:
+                result = await coalesced_llm_call(flight, "same-prompt", provider_call)
+            return result, usage.usage
+
+        results = await asyncio.gather(request("wf-leader"), request("wf-follower"))
+        assert [r for r, _ in results] == ["answer", "answer"]
+        assert all(usage["total_tokens"] == 40 for _, usage in results)
+        leader = get_workflow_usage("wf-leader")["totals"]
+        follower = get_workflow_usage("wf-follower")["totals"]
+        assert leader["total_tokens"] == follower["total_tokens"] == 40
+        assert leader["coalesced_calls"] == 0 and follower["coalesced_calls"] == 1
+    asyncio.run(run())
+
+
+def test_restore_persisted_snapshot():
+    usage_ledger.clear()
+    with usage_scope("wf-persisted", "planning", "planner"):
+        record_llm_usage("glm", "m", {"prompt_tokens": 20, "completion_tokens": 5}, latency=0.25)
+    snapshot = get_workflow_usage("wf-persisted")
+
+    # 新进程（或API进程）中恢复后继续累计，已在账本中的工作流不会被覆盖
+    usage_ledger.clear()
+    assert usage_ledger.restore("wf-persisted", snapshot)
+    assert not usage_ledger.restore("wf-persisted", snapshot)
+    with usage_scope("wf-persisted", "planning", "planner"):
+        record_llm_usage("glm", "m", {"prompt_tokens": 20, "completion_tokens": 5}, latency=0.25)
+    totals = get_workflow_usage("wf-persisted")["totals"]
+    assert totals["calls"] == 2 and totals["total_tokens"] == 50 and totals["latency_seconds"] == 0.5
+
+
+def test_estimate_counts_chinese_characters():
+    assert estimate_tokens_from_text("专利撰写系统") == 6
+    assert estimate_tokens_from_text("abcdefgh") == 2
+
+
+if __name__ == "__main__":
+    test_normalize_chat_and_responses_usage()
+    test_aggregate_by_stage_and_agent()
+    test_cache_hit_is_recorded_without_tokens()
+    test_concurrent_calls_capture_their_own_usage()
+    test_coalesced_followers_are_charged()
+    test_restore_persisted_snapshot()
+    test_estimate_counts_chinese_characters()
+    print("✅ Token用量账本测试通过")
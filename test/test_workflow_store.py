@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+测试SQLite工作流存储
+验证重启后工作流可恢复、阶段结果往返、LRU淘汰不影响运行中的工作流、列表查询不加载大结果，
+以及只重写内容变化的阶段结果（包括原地修改）、asave()在线程中写入且旧快照不覆盖新状态
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from workflow_store import WorkflowStore
+
+
+def make_workflow(workflow_id, status="running"):
+    return {
+        "workflow_id": workflow_id,
+        "topic": f"topic {workflow_id}",
+        "description": "描述",
+        "workflow_type": "enhanced",
+        "test_mode": True,
+        "status": status,
+        "created_at": 1.0,
+        "stages": {
+            "planning": {"status": "completed", "started_at": 1.0, "completed_at": 2.0},
+            "search": {"status": "pending", "started_at": None, "completed_at": None},
+        },
+        "results": {"planning": {"strategy": {"topic": "专利"}, "content": "x" * 1000}},
+        "current_stage": "search",
+    }
+
+
+def test_persists_across_restart():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "workflows.sqlite3")
+        store = WorkflowStore(path)
+        store["wf-1"] = make_workflow("wf-1")
+        workflow = store["wf-1"]
+        workflow["stages"]["search"]["status"] = "completed"
+        workflow["results"]["search"] = {"results": [1, 2, 3]}
+        workflow["status"] = "completed"
+        store.save("wf-1")
+        store.close()
+
+        reopened = WorkflowStore(path)
+        assert "wf-1" in reopened and len(reopened) == 1
+        loaded = reopened["wf-1"]
+        assert loaded["status"] == "completed"
+        assert loaded["stages"]["search"]["status"] == "completed"
+        assert loaded["results"]["planning"]["strategy"]["topic"] == "专利"
+        assert loaded["results"]["search"] == {"results": [1, 2, 3]}
+        assert list(loaded["stages"]) == ["planning", "search"]
+        reopened.close()
+
+
+def test_lru_keeps_active_workflows():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = WorkflowStore(os.path.join(tmp, "workflows.sqlite3"), cache_size=2)
+        store["active"] = make_workflow("active", status="running")
+        for i in range(3):
+            store[f"done-{i}"] = make_workflow(f"done-{i}", status="completed")
+        assert "active" in store._cache
+        assert len(store._cache) == 2
+        assert store["done-0"]["status"] == "completed"  # 从数据库重新加载
+        assert store.stats()["misses"] >= 1
+        store.close()
+
+
+def test_summaries_and_delete():
+    with tempfile.TemporaryDirectory() as tmp:
+        store = WorkflowStore(os.path.join(tmp, "workflows.sqlite3"), cache_size=1)
+        store["wf-a"] = make_workflow("wf-a", status="completed")
+        store["wf-b"] = make_workflow("wf-b", status="running")
+        summaries = store.summaries()
+        assert [s["workflow_id"] for s in summaries] == ["wf-a", "wf-b"]
+        assert all("results" not in s for s in summaries)
+        assert summaries[0]["stages"]["planning"]["status"] == "completed"
+        assert [s["workflow_id"] for s in store.summaries(status="running")] == ["wf-b"]
+
+        del store["wf-a"]
+        assert "wf-a" not in store and list(store) == ["wf-b"]
+        store.close()
+
+
+def test_sees_writes_from_other_process():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "workflows.sqlite3")
+        api, worker = WorkflowStore(path), WorkflowStore(path)  # 两个进程各自的连接与缓存
+        api["wf-1"] = make_workflow("wf-1", status="pending")
+        assert api["wf-1"]["status"] == "pending"
+
+        workflow = worker["wf-1"]
+        workflow["status"] = "completed"
+        workflow["results"]["search"] = {"results": [1]}
+        worker.save("wf-1")
+
+        assert api["wf-1"]["status"] == "completed"
+        assert api["wf-1"]["results"]["search"] == {"results": [1]}
+        assert api.summaries()[0]["status"] == "completed"
+        api.close()
+        worker.close()
+
+
+def test_workflow_state_namespace():
+    from models import WorkflowState
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "workflows.sqlite3")
+        kwargs = dict(namespace="manager", results_key="stage_results",
+                      encode=lambda w: w.model_dump(mode="json"), decode=WorkflowState.model_validate)
+        store = WorkflowStore(path, **kwargs)
+        state = WorkflowState(workflow_id="wf-m", topic="t", description="d", status="running",
+                              current_stage=2, stage_results={"planning": {"ok": True}})
+        store["wf-m"] = state
+        store.close()
+
+        reopened = WorkflowStore(path, **kwargs)
+        loaded = reopened["wf-m"]
+        assert isinstance(loaded, WorkflowState)
+        assert loaded.stage_results == {"planning": {"ok": True}}
+        assert loaded.current_stage == 2 and loaded.stages[0] == "planning"
+        assert "wf-m" not in WorkflowStore(path)  # 命名空间互相隔离
+        reopened.close()
+
+
+def test_rewrites_only_changed_results():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "workflows.sqlite3")
+        store = WorkflowStore(path)
+        store["wf-h"] = make_workflow("wf-h")
+        workflow = store["wf-h"]
+        workflow["results"]["search"] = {"results": [1]}
+        store.save("wf-h")
+
+        def written_at():
+            return dict(store._conn.execute(
+                "SELECT stage, updated_at FROM stage_results WHERE workflow_id=?", ("wf-h",)).fetchall())
+
+        before = written_at()
+        # 原地修改已保存的结果对象，以及内容相同的新对象
+        workflow["results"]["search"]["results"].append(2)
+        workflow["results"]["planning"] = make_workflow("wf-h")["results"]["planning"]
+        store.save("wf-h")
+        after = written_at()
+        assert after["search"] > before["search"] and after["planning"] == before["planning"]
+        store.close()
+
+        assert WorkflowStore(path)["wf-h"]["results"]["search"] == {"results": [1, 2]}
+
+
+def test_asave_writes_off_the_event_loop():
+    async def run():
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "workflows.sqlite3")
+            store = WorkflowStore(path)
+            store["wf-a"] = make_workflow("wf-a")
+            workflow = store["wf-a"]
+            write = store._write
+            writer_threads, release = [], threading.Event()
+
+            def slow_write(workflow_id, snapshot):
+                writer_threads.append(threading.get_ident())
+                if threading.get_ident() != loop_thread:
+                    release.wait(5)
+                write(workflow_id, snapshot)
+            store._write = slow_write
+            loop_thread = threading.get_ident()
+
+            workflow["results"]["search"] = {"results": [1]}
+            saving = asyncio.create_task(store.asave("wf-a"))
+            await asyncio.sleep(0.05)
+            # 事件循环未被阻塞；线程写入前又保存了更新的状态，旧快照不能覆盖它
+            workflow["status"] = "completed"
+            store.save("wf-a")
+            release.set()
+            await saving
+            assert writer_threads[0] != loop_thread
+
+            loaded = WorkflowStore(path)["wf-a"]
+            assert loaded["status"] == "completed" and loaded["results"]["search"] == {"results": [1]}
+            store.close()
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_persists_across_restart()
+    test_lru_keeps_active_workflows()
+    test_summaries_and_delete()
+    test_sees_writes_from_other_process()
+    test_workflow_state_namespace()
+    test_rewrites_only_changed_results()
+    test_asave_writes_off_the_event_loop()
+    print("✅ 工作流存储测试通过")
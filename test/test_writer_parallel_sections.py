@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+测试撰写智能体的并行章节生成
+验证独立章节在并发上限内同时生成、单薄章节的增强在该章节完成后并行进行、第五章按顺序整合以及各章节文件及时写入
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.agents import writer_agent_simple as writer_module
+from patent_agent_demo.agents.writer_agent_simple import WriterAgentSimple, WritingTask
+
+CALL_SECONDS = 0.05
+
+
+class FakeClient:
+    """Streams a fixed reply per prompt after CALL_SECONDS, tracking concurrent calls"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.prompts = []
+
+    async def _generate_response_stream(self, prompt, bypass_cache=False):
+        self.prompts.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(CALL_SECONDS)
+            # 回复以提示词中的小节编号开头，便于检查整合顺序
+            label = next((n for n in ("5.0", "5.1", "5.2", "5.3", "5.4")
+                          if f"撰写{n}" in prompt or f'"{n} ' in prompt), "text")
+            yield f"{label} 增强内容" if "专利质量专家" in prompt else f"{label} 内容"
+        finally:
+            self.in_flight -= 1
+
+
+def make_task():
+    return WritingTask(task_id="t", topic="测试主题", description="d", requirements={}, previous_results={},
+                       target_audience="examiners", writing_style="legal", workflow_id="wf")
+
+
+def test_sections_run_concurrently():
+    async def run():
+        writer = WriterAgentSimple(test_mode=True)
+        writer.openai_client = FakeClient()
+        with tempfile.TemporaryDirectory() as progress_dir:
+            start = time.monotonic()
+            sections = await writer._write_detailed_sections(make_task(), None, progress_dir)
+            elapsed = time.monotonic() - start
+
+            client = writer.openai_client
+            # 10个章节，加上8个有阈值的章节各一次增强（权利要求书和大纲不增强）
+            assert len(client.prompts) == 18
+            assert client.max_in_flight == writer_module.WRITER_SECTION_CONCURRENCY
+            # 18次调用按并发4约5轮；串行需要18轮
+            assert elapsed < 8 * CALL_SECONDS
+            # 每个增强提示词只携带一个章节
+            enhancement_prompts = [p for p in client.prompts if "专利质量专家" in p]
+            assert len(enhancement_prompts) == 8
+            assert all(p.count(" 内容") == 1 for p in enhancement_prompts)
+
+            chapter5 = sections["detailed_description"]
+            positions = [chapter5.index(f"{n} 增强内容") for n in ("5.0", "5.1", "5.2", "5.3", "5.4")]
+            assert positions == sorted(positions)
+            for name in ("01_outline.md", "02_background.md", "03_summary.md", "04_chapter5.md",
+                         "05_claims.md", "06_drawings.md", "07_enhanced_chapter5_1.md", "07_enhanced_drawings.md"):
+                assert os.path.exists(os.path.join(progress_dir, name)), name
+    asyncio.run(run())
+
+
+def test_failure_cancels_remaining_sections():
+    async def run():
+        writer = WriterAgentSimple(test_mode=True)
+        client = FakeClient()
+
+        async def failing_stream(prompt, bypass_cache=False):
+            if "权利要求书" in prompt:
+                raise RuntimeError("provider down")
+            async for delta in FakeClient._generate_response_stream(client, prompt):
+                yield delta
+
+        client._generate_response_stream = failing_stream
+        writer.openai_client = client
+        with tempfile.TemporaryDirectory() as progress_dir:
+            try:
+                await writer._write_detailed_sections(make_task(), None, progress_dir)
+                assert False, "section failure should propagate"
+            except RuntimeError as e:
+                assert "provider down" in str(e)
+            await asyncio.sleep(CALL_SECONDS * 2)
+            assert client.in_flight == 0
+            assert not os.path.exists(os.path.join(progress_dir, "04_chapter5.md"))
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_sections_run_concurrently()
+    test_failure_cancels_remaining_sections()
+    print("✅ 并行章节生成测试通过")
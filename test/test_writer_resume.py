@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+测试撰写智能体的断点续写
+验证已有章节文件经清单中的内容哈希与提示词版本校验后被复用、失败后只重新生成缺失章节、
+文件被改动或提示词变化时重新生成，以及progress.md按章节顺序重建、续写后不重复、
+续写时被跳过的增强不残留
+"""
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.agents import writer_agent_simple as writer_module
+from patent_agent_demo.agents.writer_agent_simple import SECTION_MANIFEST, WriterAgentSimple, WritingTask
+
+
+class FakeClient:
+    def __init__(self, fail_on=None):
+        self.prompts = []
+        self.fail_on = fail_on
+
+    async def _generate_response_stream(self, prompt, bypass_cache=False):
+        self.prompts.append(prompt)
+        if self.fail_on and self.fail_on in prompt:
+            raise RuntimeError("provider down")
+        await asyncio.sleep(0)
+        yield f"回复{len(prompt)}"
+
+
+def make_writer(client):
+    writer = WriterAgentSimple(test_mode=True)
+    writer.openai_client = client
+    return writer
+
+
+def make_task():
+    return WritingTask(task_id="t", topic="测试主题", description="d", requirements={}, previous_results={},
+                       target_audience="examiners", writing_style="legal", workflow_id="wf")
+
+
+def progress_headings(progress_dir):
+    with open(os.path.join(progress_dir, "progress.md"), encoding="utf-8") as f:
+        return [line[3:] for line in f.read().splitlines() if line.startswith("## ")]
+
+
+def test_resume_after_failure_regenerates_only_missing_sections():
+    async def run():
+        with tempfile.TemporaryDirectory() as progress_dir:
+            failing = FakeClient(fail_on="权利要求书")
+            try:
+                await make_writer(failing)._write_detailed_sections(make_task(), None, progress_dir)
+                assert False, "claims failure should propagate"
+            except RuntimeError:
+                pass
+            with open(os.path.join(progress_dir, SECTION_MANIFEST), encoding="utf-8") as f:
+                recorded = set(json.load(f)["sections"])
+            assert "claims" not in recorded
+            assert "权利要求书" not in progress_headings(progress_dir)
+
+            client = FakeClient()
+            sections = await make_writer(client)._write_detailed_sections(make_task(), None, progress_dir)
+            assert len(client.prompts) == 18 - len(recorded)
+            assert any("权利要求书" in p for p in client.prompts)
+            assert sections["claims"] and "### 5.4" in sections["detailed_description"]
+            # 无论完成顺序如何、是否续写，progress.md都按章节顺序且每节只出现一次
+            specs = WriterAgentSimple._section_specs(make_task())
+            assert progress_headings(progress_dir) == [spec.title for spec in specs]
+
+            # 全部章节有效时不再调用LLM
+            client = FakeClient()
+            again = await make_writer(client)._write_detailed_sections(make_task(), None, progress_dir)
+            assert client.prompts == [] and again == sections
+            assert progress_headings(progress_dir) == [spec.title for spec in specs]
+    asyncio.run(run())
+
+
+def test_edited_file_or_prompt_is_regenerated():
+    async def run():
+        with tempfile.TemporaryDirectory() as progress_dir:
+            await make_writer(FakeClient())._write_detailed_sections(make_task(), None, progress_dir)
+
+            with open(os.path.join(progress_dir, "04_chapter5_2.md"), "a", encoding="utf-8") as f:
+                f.write("被截断或手工改动的内容")
+            client = FakeClient()
+            await make_writer(client)._write_detailed_sections(make_task(), None, progress_dir)
+            assert len(client.prompts) == 1 and "撰写5.2" in client.prompts[0]
+
+            original = writer_module.WRITER_PROMPT_VERSION
+            writer_module.WRITER_PROMPT_VERSION = "changed"
+            try:
+                client = FakeClient()
+                await make_writer(client)._write_detailed_sections(make_task(), None, progress_dir)
+                assert len(client.prompts) == 18
+            finally:
+                writer_module.WRITER_PROMPT_VERSION = original
+    asyncio.run(run())
+
+
+class RichBackgroundClient(FakeClient):
+    async def _generate_response_stream(self, prompt, bypass_cache=False):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        yield "现有技术方案详述。" * 120 if "撰写技术背景" in prompt else f"回复{len(prompt)}"
+
+
+def test_skipped_enhancement_is_dropped_on_resume():
+    async def run():
+        with tempfile.TemporaryDirectory() as progress_dir:
+            await make_writer(FakeClient())._write_detailed_sections(make_task(), None, progress_dir)
+            enhanced_file = os.path.join(progress_dir, "07_enhanced_background.md")
+            assert os.path.exists(enhanced_file)
+            assert "背景技术（增强）" in progress_headings(progress_dir)
+
+            # 背景技术被改动后重新生成且不再单薄：增强被跳过，上次的增强文本不能再进入progress.md
+            with open(os.path.join(progress_dir, "02_background.md"), "a", encoding="utf-8") as f:
+                f.write("被改动的内容")
+            client = RichBackgroundClient()
+            await make_writer(client)._write_detailed_sections(make_task(), None, progress_dir)
+            assert len(client.prompts) == 1 and "撰写技术背景" in client.prompts[0]
+            assert not os.path.exists(enhanced_file)
+            with open(os.path.join(progress_dir, SECTION_MANIFEST), encoding="utf-8") as f:
+                assert "enhanced_background" not in json.load(f)["sections"]
+            headings = progress_headings(progress_dir)
+            assert "背景技术" in headings and "背景技术（增强）" not in headings
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_resume_after_failure_regenerates_only_missing_sections()
+    test_edited_file_or_prompt_is_regenerated()
+    test_skipped_enhancement_is_dropped_on_resume()
+    print("✅ 断点续写测试通过")
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+测试撰写智能体的逐章节增强
+验证本地单薄检查（字数、Mermaid图、伪代码行数）、内容充实的章节跳过增强、
+增强提示词只携带单个章节且长度有上限，以及只采纳确有改进的增强结果
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from patent_agent_demo.agents import writer_agent_simple as writer_module
+from patent_agent_demo.agents.writer_agent_simple import (
+    SectionSpec, WriterAgentSimple, WritingTask, section_deficiencies,
+)
+
+MERMAID = "```mermaid\ngraph TD\n  A --> B\n```"
+PSEUDO_CODE = "```python\n" + "\n".join(f"step_{i} = run({i})" for i in range(60)) + "\n```"
+RICH_SECTION = "技术细节" * 400 + "\n\n" + MERMAID + "\n\n" + PSEUDO_CODE
+
+
+class FakeClient:
+    def __init__(self, reply):
+        self.prompts = []
+        self.reply = reply
+
+    async def _generate_response_stream(self, prompt, bypass_cache=False):
+        self.prompts.append(prompt)
+        await asyncio.sleep(0)
+        yield self.reply(prompt)
+
+
+def make_writer(client):
+    writer = WriterAgentSimple(test_mode=True)
+    writer.openai_client = client
+    return writer
+
+
+def make_task():
+    return WritingTask(task_id="t", topic="测试主题", description="d", requirements={}, previous_results={},
+                       target_audience="examiners", writing_style="legal", workflow_id="wf")
+
+
+def test_section_deficiencies():
+    spec = SectionSpec("chapter5_1", "5.1 系统架构设计", "", min_chars=1500, needs_mermaid=True, min_code_lines=50)
+    issues = section_deficiencies(spec, "简短内容\n```python\nx = 1\n```")
+    assert len(issues) == 3 and "缺少Mermaid图" in issues and "伪代码仅1行" in issues[2]
+    assert section_deficiencies(spec, RICH_SECTION) == []
+    # Mermaid代码块不计入伪代码行数
+    assert "伪代码仅0行" in section_deficiencies(spec, MERMAID)[-1]
+
+
+def test_rich_sections_skip_enhancement():
+    async def run():
+        client = FakeClient(lambda prompt: RICH_SECTION)
+        with tempfile.TemporaryDirectory() as progress_dir:
+            sections = await make_writer(client)._write_detailed_sections(make_task(), None, progress_dir)
+            assert len(client.prompts) == 10
+            assert not any("专利质量专家" in p for p in client.prompts)
+            assert not any(name.startswith("07_") for name in os.listdir(progress_dir))
+            assert sections["background"] == RICH_SECTION.strip()
+    asyncio.run(run())
+
+
+def test_long_section_gets_bounded_prompt_and_appended_supplement():
+    async def run():
+        long_without_diagram = "技术细节" * 400 + "\n\n" + PSEUDO_CODE
+
+        def reply(prompt):
+            if "专利质量专家" in prompt:
+                return MERMAID
+            return long_without_diagram if "撰写5.1" in prompt else RICH_SECTION
+
+        client = FakeClient(reply)
+        original = writer_module.WRITER_ENHANCE_MAX_CHARS
+        writer_module.WRITER_ENHANCE_MAX_CHARS = 200
+        try:
+            with tempfile.TemporaryDirectory() as progress_dir:
+                sections = await make_writer(client)._write_detailed_sections(make_task(), None, progress_dir)
+        finally:
+            writer_module.WRITER_ENHANCE_MAX_CHARS = original
+
+        enhancement_prompts = [p for p in client.prompts if "专利质量专家" in p]
+        assert len(enhancement_prompts) == 1
+        assert "5.1 系统架构设计" in enhancement_prompts[0] and "追加" in enhancement_prompts[0]
+        assert len(enhancement_prompts[0]) < 200 + 300
+        assert f"{long_without_diagram.strip()}\n\n{MERMAID}" in sections["detailed_description"]
+    asyncio.run(run())
+
+
+def test_enhancement_without_improvement_is_rejected():
+    async def run():
+        client = FakeClient(lambda prompt: "更短" if "专利质量专家" in prompt else f"原始内容{len(prompt)}")
+        with tempfile.TemporaryDirectory() as progress_dir:
+            sections = await make_writer(client)._write_detailed_sections(make_task(), None, progress_dir)
+            assert "更短" not in sections["detailed_description"]
+            assert sections["background"].startswith("原始内容")
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_section_deficiencies()
+    test_rich_sections_skip_enhancement()
+    test_long_section_gets_bounded_prompt_and_appended_supplement()
+    test_enhancement_without_improvement_is_rejected()
+    print("✅ 逐章节增强测试通过")
@@ -5,9 +5,9 @@ Hosts coordinator and all agent services on one port with different URL paths
 """
 
 from fastapi import FastAPI, BackgroundTasks, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 import uvicorn
 import time
 import uuid
@@ -16,9 +16,28 @@ import logging
 import httpx # Added for patent-specific API calls
 import os
 import json
+from collections import OrderedDict
 
-from models import WorkflowRequest, WorkflowResponse, WorkflowStatus, WorkflowState, WorkflowStatusEnum, StageStatusEnum
+from models import BatchWorkflowRequest, WorkflowRequest, WorkflowResponse, WorkflowStatus, WorkflowState, WorkflowStatusEnum, StageStatusEnum
+from models import TaskRequest, TaskResponse
 from workflow_manager import WorkflowManager
+from workflow_store import WorkflowStore
+from patent_agent_demo.llm_cache import bypass_llm_cache, get_llm_cache_stats
+from patent_agent_demo.singleflight import SingleFlight, llm_singleflight
+from patent_agent_demo.hedging import get_hedging_stats
+from patent_agent_demo.circuit_breaker import get_circuit_breaker_status
+from patent_agent_demo.stage_stream import set_stage_event_sink
+from patent_agent_demo.usage_ledger import get_workflow_usage, usage_ledger
+from stage_dispatcher import STAGE_TO_AGENT, build_task_request, stage_dispatcher
+from stage_scheduler import stage_scheduler
+from stage_checkpoint import (WORKFLOW_AUTO_RESUME, prepare_resume, rebuild_workflow,
+                              write_stage_checkpoint)
+from workflow_store import ACTIVE_STATUSES
+from job_queue import JobQueue
+from admission import ADMISSION_MAX_QUEUED, AdmissionRejected, admission_controller, priority_rank
+from batch_runner import BATCH_MAX_ITEMS, batch_progress, shared_work_for, stage_input_key
+from stage_memo import get_stage_memo_stats, memoized_stage
+from agent_pool import agent_pool_stats, checkout_agent, close_agent_pools, register_agent_pool, warm_agent_pools
 
 # 导入GLM客户端
 try:
@@ -53,7 +72,120 @@ app = FastAPI(
     version="2.0.0"
 )
 
-# Initialize workflow manager (in-memory)
+# Durable workflow state (SQLite + hot in-memory LRU); survives service restarts
+workflow_store = WorkflowStore()
+app.state.workflows = workflow_store
+# 批次记录（条目列表、优先级），与工作流共用同一个数据库
+batch_store = WorkflowStore(namespace="batch")
+
+def _attach_usage(workflow_id: str):
+    # 用量账本只在执行进程的内存中，随工作流一起持久化，queue模式下API进程也能读取
+    usage = get_workflow_usage(workflow_id)
+    if usage is not None and workflow_id in workflow_store:
+        workflow_store[workflow_id]["usage"] = usage
+
+def persist_workflow(workflow_id: str):
+    """Persist in-place changes of a workflow; storage errors never break the workflow"""
+    try:
+        _attach_usage(workflow_id)
+        workflow_store.save(workflow_id)
+    except Exception as e:
+        logger.error(f"⚠️ Failed to persist workflow {workflow_id}: {e}")
+
+async def apersist_workflow(workflow_id: str):
+    """``persist_workflow`` for running workflows: hashing and the SQLite write stay off the event loop"""
+    try:
+        _attach_usage(workflow_id)
+        await workflow_store.asave(workflow_id)
+    except Exception as e:
+        logger.error(f"⚠️ Failed to persist workflow {workflow_id}: {e}")
+
+def workflow_usage(workflow_id: str) -> Optional[Dict[str, Any]]:
+    """Live usage of workflows executed by this process, otherwise the last persisted totals"""
+    usage = get_workflow_usage(workflow_id)
+    if usage is None and workflow_id in workflow_store:
+        usage = workflow_store[workflow_id].get("usage")
+    return usage
+
+# inline: 在本进程事件循环中执行工作流；queue: 写入任务队列，由worker.py的多个进程领取执行
+WORKFLOW_EXECUTION_MODE = os.getenv("WORKFLOW_EXECUTION_MODE", "inline").lower()
+job_queue = JobQueue() if WORKFLOW_EXECUTION_MODE == "queue" else None
+
+def ensure_admission_capacity(count: int = 1):
+    """Raise AdmissionRejected (-> 429) before creating workflows that could not be queued"""
+    if job_queue is None:
+        admission_controller.ensure_capacity(count)
+    elif job_queue.stats()["queued"] + count > ADMISSION_MAX_QUEUED:
+        admission_controller.rejected += 1
+        raise AdmissionRejected(admission_controller.retry_after(), ADMISSION_MAX_QUEUED)
+
+def schedule_workflow(workflow_id: str, topic: str, description: str, test_mode: bool,
+                      priority: str = "interactive", force: bool = False) -> Dict[str, Any]:
+    """Admit a workflow by priority (in this process, or via the worker queue); returns position and ETA"""
+    workflow = app.state.workflows[workflow_id]
+    workflow["priority"] = priority
+    if job_queue is not None:
+        if not force:
+            ensure_admission_capacity()
+        # 先持久化再入队：入队后worker可能立即领取并写入running，之后API进程不能再保存旧状态覆盖它
+        if workflow["status"] in ("created", "restarted"):
+            workflow["status"] = "queued"
+        persist_workflow(workflow_id)
+        job_queue.enqueue("patent_workflow", {"workflow_id": workflow_id, "topic": topic,
+                                              "description": description, "test_mode": test_mode},
+                          job_id=workflow_id, priority=-priority_rank(priority, test_mode))
+        position = job_queue.position(workflow_id) or 0
+        slots = len(job_queue.stats()["active_workers"]) or 1
+        eta = admission_controller.estimate_start(position, test_mode, slots) if position else 0
+        return {"queue_position": position, "eta_seconds": eta, "admission": "queued"}
+    ticket = admission_controller.submit(
+        workflow_id, lambda: execute_patent_workflow(workflow_id, topic, description, test_mode),
+        priority, test_mode, force)
+    if ticket["admission"] == "queued" and workflow["status"] in ("created", "restarted"):
+        workflow["status"] = "queued"
+    persist_workflow(workflow_id)
+    return ticket
+
+def admission_message(ticket: Dict[str, Any]) -> str:
+    if ticket["admission"] == "queued":
+        return f"queued at position {ticket['queue_position']}, estimated start in {ticket['eta_seconds']}s"
+    return "started"
+
+def load_or_rebuild_workflow(workflow_id: str) -> Optional[Dict[str, Any]]:
+    """Get a workflow from the store, or rebuild it from its stage directory"""
+    if workflow_id in app.state.workflows:
+        return app.state.workflows[workflow_id]
+    workflow = rebuild_workflow(workflow_id)
+    if workflow is not None:
+        app.state.workflows[workflow_id] = workflow
+    return workflow
+
+def restart_workflow_run(workflow_id: str, workflow: Dict[str, Any], from_scratch: bool,
+                         force: bool) -> Tuple[List[str], Dict[str, Any]]:
+    """Reset a finished workflow for another run and re-admit it; 409 while it is still active"""
+    if workflow.get("status") in ACTIVE_STATUSES:
+        raise HTTPException(status_code=409,
+                            detail=f"Patent workflow is {workflow.get('status')}, wait for it to finish before restarting")
+    
+    # Resume from the first incomplete stage unless a full rerun is requested
+    if from_scratch:
+        workflow["status"] = "restarted"
+        workflow["current_stage"] = "planning"
+        for stage in workflow["stages"]:
+            workflow["stages"][stage] = {"status": "pending", "started_at": None, "completed_at": None}
+        workflow["results"] = {}
+        resumed_stages = []
+    else:
+        resumed_stages = prepare_resume(workflow)
+    workflow["force"] = force
+    persist_workflow(workflow_id)
+    
+    # Re-admit workflow execution
+    ticket = schedule_workflow(workflow_id, workflow["topic"], workflow["description"], workflow["test_mode"],
+                               workflow.get("priority", "interactive"))
+    return resumed_stages, ticket
+
+# Initialize workflow manager
 workflow_manager = WorkflowManager()
 
 # WebSocket connection manager for real-time notifications
@@ -107,11 +239,76 @@ class ConnectionManager:
 
 manager = ConnectionManager()
 
+# 智能体流式输出（stage_delta事件）通过ConnectionManager推送给订阅者
+set_stage_event_sink(manager.broadcast_workflow_update)
+
+# 智能体实例池：启动时预热，每个任务借出一个实例，下次借出前重置，不再为每个阶段新建客户端
+def _new_llm_client():
+    from patent_agent_demo.openai_client import OpenAIClient
+    return OpenAIClient()
+
+async def _new_writer_agent():
+    from patent_agent_demo.agents.writer_agent_simple import WriterAgentSimple
+    writer_agent = WriterAgentSimple()
+    await writer_agent.start()
+    return writer_agent
+
+def _reset_writer_agent(writer_agent, test_mode: bool = False):
+    writer_agent.test_mode = test_mode
+
+for _agent in ("planner", "searcher", "discussion", "reviewer", "rewriter"):
+    register_agent_pool(_agent, _new_llm_client)
+register_agent_pool("writer", _new_writer_agent, _reset_writer_agent)
+
+# ============================================================================
+# APPLICATION LIFECYCLE
+# ============================================================================
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request, exc: AdmissionRejected):
+    return JSONResponse(status_code=429, content={"detail": str(exc), "retry_after": exc.retry_after},
+                        headers={"Retry-After": str(exc.retry_after)})
+
+@app.on_event("startup")
+async def warm_agents():
+    """Create the warm agent instances before the first task needs them"""
+    await warm_agent_pools()
+
+@app.on_event("startup")
+async def resume_interrupted_workflows():
+    """Continue workflows interrupted by the last shutdown from their first incomplete stage"""
+    if not WORKFLOW_AUTO_RESUME or job_queue is not None:
+        return  # 队列模式下由worker回收过期租约的任务
+    for summary in workflow_store.summaries():
+        if summary.get("status") not in ACTIVE_STATUSES:
+            continue
+        workflow_id = summary["workflow_id"]
+        try:
+            workflow = app.state.workflows[workflow_id]
+            kept = prepare_resume(workflow)
+            persist_workflow(workflow_id)
+            logger.info(f"♻️ Resuming interrupted workflow {workflow_id}, reusing stages: {kept}")
+            schedule_workflow(workflow_id, workflow["topic"], workflow["description"], workflow["test_mode"],
+                              workflow.get("priority", "interactive"), force=True)
+        except Exception as e:
+            logger.error(f"❌ Failed to resume workflow {workflow_id}: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release shared resources on service shutdown"""
+    from patent_agent_demo.http_pool import close_shared_http_client
+    admission_controller.shutdown()
+    await close_agent_pools()
+    await close_shared_http_client()
+    workflow_store.close()
+    batch_store.close()
+    logger.info("🛑 Unified service shutdown complete")
+
 # ============================================================================
 # PATENT-SPECIFIC API ENDPOINTS
 # ============================================================================
 
-async def create_workflow_directory(workflow_id: str, topic: str) -> str:
+async def create_workflow_directory(workflow_id: str, topic: str, description: str = "", test_mode: bool = False) -> str:
     """Create a directory for storing individual stage results"""
     try:
         # Create workflow-specific directory
@@ -128,6 +325,8 @@ async def create_workflow_directory(workflow_id: str, topic: str) -> str:
         metadata = {
             "workflow_id": workflow_id,
             "topic": topic,
+            "description": description,
+            "test_mode": test_mode,
             "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
             "stages": ["planning", "search", "discussion", "drafting", "review", "rewrite"],
             "status": "created"
@@ -136,16 +335,17 @@ async def create_workflow_directory(workflow_id: str, topic: str) -> str:
         with open(f"{dir_path}/metadata.json", 'w', encoding='utf-8') as f:
             json.dump(metadata, f, ensure_ascii=False, indent=2)
         
-        # Create workflow metadata file for tracking all files
-        workflow_metadata = {
-            "workflow_id": workflow_id,
-            "topic": topic,
-            "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
-            "files": {}
-        }
-        
-        with open(f"{dir_path}/workflow_metadata.json", 'w', encoding='utf-8') as f:
-            json.dump(workflow_metadata, f, ensure_ascii=False, indent=2)
+        # Create workflow metadata file for tracking all files (kept when resuming)
+        if not os.path.exists(f"{dir_path}/workflow_metadata.json"):
+            workflow_metadata = {
+                "workflow_id": workflow_id,
+                "topic": topic,
+                "created_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+                "files": {}
+            }
+            
+            with open(f"{dir_path}/workflow_metadata.json", 'w', encoding='utf-8') as f:
+                json.dump(workflow_metadata, f, ensure_ascii=False, indent=2)
         
         logger.info(f"📁 Created workflow directory: {dir_path}")
         return dir_path
@@ -178,8 +378,11 @@ async def save_stage_result(workflow_id: str, topic: str, stage: str, result: An
         with open(file_path, 'w', encoding='utf-8') as f:
             f.write(stage_content)
         
+        # Checkpoint the raw result so a restarted workflow can skip this stage
+        checkpoint = write_stage_checkpoint(dir_path, stage, result)
+        
         # Update stage index and workflow metadata
-        await update_stage_index(dir_path, stage, filename, timestamp)
+        await update_stage_index(dir_path, stage, filename, timestamp, checkpoint)
         await update_workflow_metadata(dir_path, stage, filename, timestamp)
         
         logger.info(f"💾 Saved {stage} stage result: {file_path}")
@@ -222,7 +425,8 @@ def generate_stage_content(stage: str, result: Any, test_mode: bool = False) ->
     
     return "\n".join(content)
 
-async def update_stage_index(dir_path: str, stage: str, filename: str, timestamp: int):
+async def update_stage_index(dir_path: str, stage: str, filename: str, timestamp: int,
+                             checkpoint: Optional[Dict[str, Any]] = None):
     """Update stage index file"""
     try:
         index_file = f"{dir_path}/stage_index.json"
@@ -238,7 +442,8 @@ async def update_stage_index(dir_path: str, stage: str, filename: str, timestamp
         index["stages"][stage] = {
             "filename": filename,
             "timestamp": timestamp,
-            "generated_at": time.strftime('%Y-%m-%d %H:%M:%S')
+            "generated_at": time.strftime('%Y-%m-%d %H:%M:%S'),
+            **(checkpoint or {})
         }
         
         # Save updated index
@@ -573,6 +778,26 @@ async def generate_time_cost_analysis(workflow_id: str, topic: str, workflow: Di
                     content.append(f"- **{stage_names[stage]}**: {percentage:.1f}% ({stage_times[stage]:.1f}秒)")
             content.append("")
         
+        # Token用量（来自提供方返回的usage）
+        usage = workflow_usage(workflow_id)
+        if usage:
+            totals = usage["totals"]
+            content.append("### Token用量")
+            content.append(f"- **API调用**: {totals['calls']}次（缓存命中 {totals['cache_hits']}次）")
+            content.append(f"- **输入Token**: {totals['prompt_tokens']:,}（其中缓存 {totals['cached_tokens']:,}）")
+            content.append(f"- **输出Token**: {totals['completion_tokens']:,}")
+            content.append(f"- **总Token**: {totals['total_tokens']:,}")
+            content.append("")
+            content.append("| 阶段 | 调用次数 | 输入Token | 缓存Token | 输出Token | LLM耗时(秒) |")
+            content.append("|------|---------|----------|----------|----------|------------|")
+            for stage_key, stage_usage in usage["by_stage"].items():
+                content.append(
+                    f"| {stage_names.get(stage_key, stage_key)} | {stage_usage['calls']} | "
+                    f"{stage_usage['prompt_tokens']:,} | {stage_usage['cached_tokens']:,} | "
+                    f"{stage_usage['completion_tokens']:,} | {stage_usage['latency_seconds']:.1f} |"
+                )
+            content.append("")
+        
         content.append("### 关键发现")
         if "search" in stage_times and stage_times["search"] > total_stage_time * 0.5:
             content.append("1. **Search阶段耗时最长**: 占总时间的大部分，这是因为包含了DuckDuckGo深度检索")
@@ -689,19 +914,26 @@ async def execute_patent_workflow(workflow_id: str, topic: str, description: str
         
         workflow = app.state.workflows[workflow_id]
         workflow["status"] = "running"
+        # 在其他进程（或重启前）执行过的工作流：从持久化的用量继续累计
+        usage_ledger.restore(workflow_id, workflow.get("usage"))
         
         # Create workflow directory for stage results
-        workflow_dir = await create_workflow_directory(workflow_id, topic)
+        workflow_dir = await create_workflow_directory(workflow_id, topic, description, test_mode)
         workflow["workflow_directory"] = workflow_dir
+        await apersist_workflow(workflow_id)
         
-        # Execute each stage
+        # Execute stages as a dependency graph: independent stages (planning/search) run concurrently
         stages = ["planning", "search", "discussion", "drafting", "review", "rewrite"]
         
-        for stage in stages:
+        async def run_stage(stage: str) -> bool:
+            if workflow["stages"][stage]["status"] == "completed" and stage in workflow["results"]:
+                logger.info(f"⏭️ Skipping {stage} stage, result restored from checkpoint")
+                return True
             try:
                 workflow["current_stage"] = stage
                 workflow["stages"][stage]["status"] = "running"
                 workflow["stages"][stage]["started_at"] = time.time()
+                await apersist_workflow(workflow_id)
                 
                 logger.info(f"🚀 Starting {stage} stage for workflow {workflow_id}")
                 
@@ -716,13 +948,22 @@ async def execute_patent_workflow(workflow_id: str, topic: str, description: str
                 })
                 
                 # Execute stage based on test mode
-                if test_mode:
-                    # Test mode - use mock execution
-                    await asyncio.sleep(2)  # Simulate processing time
-                    stage_result = f"Mock {stage} completed for topic: {topic}"
-                else:
+                async def compute_stage():
+                    if test_mode:
+                        # Test mode - use mock execution
+                        await asyncio.sleep(2)  # Simulate processing time
+                        return f"Mock {stage} completed for topic: {topic}"
                     # Real mode - call actual agent
-                    stage_result = await execute_stage_with_agent(stage, topic, description, test_mode, workflow_id)
+                    return await execute_stage_with_agent(stage, topic, description, test_mode, workflow_id,
+                                                          force=workflow.get("force", False))
+                
+                batch_id = workflow.get("batch_id")
+                if batch_id:
+                    # 批次内输入相同的阶段只执行一次
+                    stage_result = await shared_work_for(batch_id).run(
+                        stage_input_key(stage, workflow), workflow_id, compute_stage)
+                else:
+                    stage_result = await compute_stage()
                 
                 # Check if stage execution failed
                 if isinstance(stage_result, dict) and stage_result.get("error"):
@@ -741,17 +982,11 @@ async def execute_patent_workflow(workflow_id: str, topic: str, description: str
                     workflow["failure_reason"] = f"{stage} stage failed: {stage_result.get('message', 'Unknown error')}"
                     
                     # 保存失败状态
+                    await apersist_workflow(workflow_id)
                     await save_workflow_stage_result(workflow_id, stage, stage_result, topic)
                     
                     logger.error(f"❌ Workflow execution terminated due to {stage} stage failure")
-                    return {
-                        "workflow_id": workflow_id,
-                        "status": "failed",
-                        "failed_stage": stage,
-                        "error": f"{stage} stage failed: {stage_result.get('message', 'Unknown error')}",
-                        "completed_stages": list(workflow["stages"].keys())[:stages.index(stage)],
-                        "test_mode": test_mode
-                    }
+                    return False
                 
                 workflow["stages"][stage]["status"] = "completed"
                 workflow["stages"][stage]["completed_at"] = time.time()
@@ -765,6 +1000,7 @@ async def execute_patent_workflow(workflow_id: str, topic: str, description: str
                 except Exception as save_error:
                     logger.error(f"⚠️ Failed to save {stage} stage result: {save_error}")
                     workflow["stages"][stage]["file_path"] = None
+                await apersist_workflow(workflow_id)
                 
                 logger.info(f"✅ {stage} stage completed for workflow {workflow_id}")
                 
@@ -778,13 +1014,28 @@ async def execute_patent_workflow(workflow_id: str, topic: str, description: str
                     "message": f"Stage {stage} completed",
                     "progress": f"{list(workflow['results'].keys()).index(stage) + 1}/{len(workflow['stages'])}"
                 })
+                return True
                 
             except Exception as e:
                 logger.error(f"❌ {stage} stage failed for workflow {workflow_id}: {e}")
                 workflow["stages"][stage]["status"] = "failed"
                 workflow["stages"][stage]["error"] = str(e)
                 workflow["status"] = "failed"
-                return
+                await apersist_workflow(workflow_id)
+                return False
+        
+        stage_status = await stage_scheduler.run(stages, run_stage)
+        failed_stages = [stage for stage, status in stage_status.items() if status == "failed"]
+        if failed_stages:
+            end_workflow_run(workflow_id)
+            return {
+                "workflow_id": workflow_id,
+                "status": "failed",
+                "failed_stage": failed_stages[0],
+                "error": workflow.get("failure_reason", f"{failed_stages[0]} stage failed"),
+                "completed_stages": [stage for stage in stages if stage_status[stage] == "completed"],
+                "test_mode": test_mode
+            }
         
         # All stages completed successfully
         workflow["status"] = "completed"
@@ -831,6 +1082,7 @@ async def execute_patent_workflow(workflow_id: str, topic: str, description: str
         except Exception as e:
             logger.error(f"❌ Failed to generate time cost analysis: {e}")
         
+        end_workflow_run(workflow_id)
         logger.info(f"🎉 Patent workflow {workflow_id} completed successfully")
         
         # Send workflow completion notification
@@ -849,21 +1101,18 @@ async def execute_patent_workflow(workflow_id: str, topic: str, description: str
         if hasattr(app.state, 'workflows') and workflow_id in app.state.workflows:
             app.state.workflows[workflow_id]["status"] = "failed"
             app.state.workflows[workflow_id]["error"] = str(e)
+            end_workflow_run(workflow_id)
+
+def end_workflow_run(workflow_id: str):
+    """Persist the outcome of a finished run; ``force`` only applies to the run it was requested for"""
+    app.state.workflows[workflow_id].pop("force", None)
+    persist_workflow(workflow_id)
 
-async def execute_stage_with_agent(stage: str, topic: str, description: str, test_mode: bool = False, workflow_id: str = None):
-    """Execute a stage using the appropriate agent"""
+async def execute_stage_with_agent(stage: str, topic: str, description: str, test_mode: bool = False, workflow_id: str = None,
+                                   force: bool = False):
+    """Execute a stage using the appropriate agent, reusing a memoized result for identical inputs unless ``force``"""
     try:
-        # Map stages to agent endpoints
-        stage_to_agent = {
-            "planning": "planner",
-            "search": "searcher",
-            "discussion": "discussion",
-            "drafting": "writer",
-            "review": "reviewer",
-            "rewrite": "rewriter"
-        }
-        
-        agent = stage_to_agent.get(stage)
+        agent = STAGE_TO_AGENT.get(stage)
         if not agent:
             return f"Unknown stage: {stage}"
         
@@ -871,53 +1120,46 @@ async def execute_stage_with_agent(stage: str, topic: str, description: str, tes
         previous_results = {}
         if workflow_id and hasattr(app.state, 'workflows') and workflow_id in app.state.workflows:
             workflow = app.state.workflows[workflow_id]
-            previous_results = workflow.get("results", {})
+            # 浅拷贝一份快照，结果对象本身按引用传递，不再做JSON序列化
+            previous_results = dict(workflow.get("results", {}))
             logger.info(f"📋 Stage {stage}: Found {len(previous_results)} previous stage results")
         
-        # Call agent endpoint
-        async with httpx.AsyncClient() as client:
-            # Provide all required fields for TaskRequest model
-            # Ensure description is not None
-            safe_description = description if description else f"Patent for topic: {topic}"
-            task_payload = {
-                "task_id": f"{workflow_id}_{stage}_{int(time.time())}",
-                "workflow_id": workflow_id,
-                "stage_name": stage,
-                "topic": topic,
-                "description": safe_description,
-                "test_mode": test_mode,
-                "previous_results": previous_results,  # 传递之前阶段的结果
-                "context": {
-                    "workflow_id": workflow_id,
-                    "isolation_level": "workflow"
-                }
-            }
-            
+        # Ensure description is not None
+        safe_description = description if description else f"Patent for topic: {topic}"
+        task_request = build_task_request(
+            workflow_id, stage, topic, safe_description, test_mode,
+            previous_results,  # 传递之前阶段的结果
+            {"workflow_id": workflow_id, "isolation_level": "workflow"},
+        )
+        
+        async def run_agent():
             logger.info(f"🚀 Calling {agent} agent for stage {stage} with {len(previous_results)} previous results")
-            
-            response = await client.post(
-                f"http://localhost:8000/agents/{agent}/execute",
-                json=task_payload,
-                timeout=30.0
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                # Return the agent execution result, not the API response
-                agent_result = result.get("result", {})
-                # Ensure test_mode is correctly propagated
-                if isinstance(agent_result, dict) and "test_mode" in agent_result:
-                    agent_result["test_mode"] = test_mode
-                return agent_result
-            else:
-                logger.error(f"Agent {agent} returned status {response.status_code}: {response.text}")
+            try:
+                if force:
+                    # 强制重跑时同时绕过LLM响应缓存，确保真正重新生成
+                    with bypass_llm_cache():
+                        response = await stage_dispatcher.dispatch(agent, task_request)
+                else:
+                    response = await stage_dispatcher.dispatch(agent, task_request)
+            except Exception as e:
+                logger.error(f"Agent {agent} failed: {e}")
                 # Return a proper error structure instead of string
                 return {
                     "error": True,
-                    "status_code": response.status_code,
-                    "message": f"{stage} failed: {response.status_code}",
-                    "details": response.text
+                    "message": f"{stage} failed: {str(e)}",
+                    "details": str(e)
                 }
+            
+            # Return the agent execution result, not the API response
+            agent_result = response.result or {}
+            # Ensure test_mode is correctly propagated
+            if isinstance(agent_result, dict) and "test_mode" in agent_result:
+                agent_result["test_mode"] = test_mode
+            return agent_result
+        
+        # Same stage inputs (upstream results, prompt version, model) -> reuse the stored result
+        return await memoized_stage(stage, topic, safe_description, test_mode, previous_results,
+                                    workflow_id, run_agent, force=force)
                 
     except Exception as e:
         logger.error(f"Failed to execute {stage} stage: {e}")
@@ -931,6 +1173,9 @@ async def execute_stage_with_agent(stage: str, topic: str, description: str, tes
 async def generate_patent(request: WorkflowRequest, background_tasks: BackgroundTasks):
     """Generate a patent using the patent workflow"""
     try:
+        # Reject with 429 before creating anything when the admission queue is full
+        ensure_admission_capacity()
+        
         # Create workflow with patent-specific configuration
         workflow_id = str(uuid.uuid4())
         
@@ -952,26 +1197,131 @@ async def generate_patent(request: WorkflowRequest, background_tasks: Background
                 "rewrite": {"status": "pending", "started_at": None, "completed_at": None}
             },
             "results": {},
-            "current_stage": "planning"
+            "current_stage": "planning",
+            "force": request.force
         }
         
-        # Store workflow in memory (in a real system, this would be in a database)
-        if not hasattr(app.state, 'workflows'):
-            app.state.workflows = {}
+        # Store workflow (persisted to the SQLite workflow store)
         app.state.workflows[workflow_id] = workflow_state
         
-        # Start patent workflow execution in background
-        background_tasks.add_task(execute_patent_workflow, workflow_id, request.topic, request.description, request.test_mode)
+        # Admit patent workflow execution by priority
+        ticket = schedule_workflow(workflow_id, request.topic, request.description, request.test_mode, request.priority)
         
         return WorkflowResponse(
             workflow_id=workflow_id,
-            status="started",
-            message=f"Patent generation started for topic: {request.topic} (test_mode: {request.test_mode})"
+            status="started" if ticket["admission"] == "running" else "queued",
+            message=f"Patent generation {admission_message(ticket)} for topic: {request.topic} (test_mode: {request.test_mode})",
+            queue_position=ticket["queue_position"],
+            eta_seconds=ticket["eta_seconds"]
         )
+    except AdmissionRejected:
+        raise
     except Exception as e:
         logger.error(f"Failed to start patent generation: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to start patent generation: {str(e)}")
 
+@app.post("/patent/generate/batch")
+async def generate_patent_batch(request: BatchWorkflowRequest):
+    """Generate several patents as one batch; identical stage inputs are computed once"""
+    try:
+        if len(request.items) > BATCH_MAX_ITEMS:
+            raise HTTPException(status_code=400, detail=f"A batch may contain at most {BATCH_MAX_ITEMS} items")
+        
+        # The whole batch is admitted or rejected (429) as one unit
+        ensure_admission_capacity(len(request.items))
+        
+        batch_id = str(uuid.uuid4())
+        workflow_ids = []
+        for item in request.items:
+            workflow_id = str(uuid.uuid4())
+            app.state.workflows[workflow_id] = {
+                "workflow_id": workflow_id,
+                "topic": item.topic,
+                "description": item.description or f"Patent for topic: {item.topic}",
+                "workflow_type": "patent",
+                "test_mode": item.test_mode,
+                "status": "created",
+                "created_at": time.time(),
+                "stages": {stage: {"status": "pending", "started_at": None, "completed_at": None}
+                           for stage in ["planning", "search", "discussion", "drafting", "review", "rewrite"]},
+                "results": {},
+                "current_stage": "planning",
+                "batch_id": batch_id,
+                "force": item.force
+            }
+            workflow_ids.append(workflow_id)
+        
+        batch_store[batch_id] = {
+            "workflow_id": batch_id,
+            "topic": f"Batch of {len(workflow_ids)} patents",
+            "status": "batch",
+            "test_mode": all(item.test_mode for item in request.items),
+            "created_at": time.time(),
+            "priority": request.priority,
+            "items": workflow_ids
+        }
+        
+        tickets = []
+        for workflow_id, item in zip(workflow_ids, request.items):
+            ticket = schedule_workflow(workflow_id, item.topic, item.description, item.test_mode,
+                                       request.priority, force=True)
+            tickets.append({"workflow_id": workflow_id, "topic": item.topic, **ticket})
+        
+        logger.info(f"📦 Batch {batch_id} scheduled with {len(workflow_ids)} workflows")
+        return {
+            "batch_id": batch_id,
+            "status": "scheduled",
+            "total": len(workflow_ids),
+            "items": tickets,
+            "progress_url": f"/patent/batch/{batch_id}",
+            "events_url": f"/patent/batch/{batch_id}/events",
+            "download_url": f"/download/batch/{batch_id}"
+        }
+    except (HTTPException, AdmissionRejected):
+        raise
+    except Exception as e:
+        logger.error(f"Failed to start patent batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to start patent batch: {str(e)}")
+
+def get_batch_progress(batch_id: str) -> Dict[str, Any]:
+    """Aggregate progress of a batch from workflow summaries (stage results are not loaded)"""
+    if batch_id not in batch_store:
+        raise HTTPException(status_code=404, detail="Patent batch not found")
+    batch = batch_store[batch_id]
+    item_ids = set(batch["items"])
+    summaries = {item["workflow_id"]: item for item in workflow_store.summaries() if item["workflow_id"] in item_ids}
+    return batch_progress(batch, [summaries[w] for w in batch["items"] if w in summaries])
+
+@app.get("/patent/batch/{batch_id}")
+async def get_patent_batch_status(batch_id: str):
+    """Aggregate progress of a patent batch"""
+    return get_batch_progress(batch_id)
+
+@app.get("/patent/batch/{batch_id}/events")
+async def stream_patent_batch_events(batch_id: str):
+    """Server-sent events: one event per finished item, progress updates, then batch_completed"""
+    get_batch_progress(batch_id)  # 404 before the stream starts
+    
+    async def events():
+        reported = set()
+        last_progress = None
+        while True:
+            progress = get_batch_progress(batch_id)
+            for item in progress["items"]:
+                if item["status"] in ("completed", "failed") and item["workflow_id"] not in reported:
+                    reported.add(item["workflow_id"])
+                    yield f"event: item_finished\ndata: {json.dumps(item, ensure_ascii=False)}\n\n"
+            if progress["progress"] != last_progress:
+                last_progress = progress["progress"]
+                summary = {k: v for k, v in progress.items() if k != "items"}
+                yield f"event: progress\ndata: {json.dumps(summary, ensure_ascii=False)}\n\n"
+            if progress["status"] != "running":
+                yield f"event: batch_completed\ndata: {json.dumps({'batch_id': batch_id, 'status': progress['status']})}\n\n"
+                return
+            await asyncio.sleep(1)
+    
+    return StreamingResponse(events(), media_type="text/event-stream")
+
 @app.get("/patent/{workflow_id}/status")
 async def get_patent_workflow_status(workflow_id: str):
     """Get status of a specific patent workflow"""
@@ -988,7 +1338,9 @@ async def get_patent_workflow_status(workflow_id: str):
             "current_stage": workflow["current_stage"],
             "stages": workflow["stages"],
             "test_mode": workflow["test_mode"],
-            "created_at": workflow["created_at"]
+            "created_at": workflow["created_at"],
+            "queue_position": admission_controller.position(workflow_id) if job_queue is None
+                              else (job_queue.position(workflow_id) if workflow["status"] == "queued" else None)
         }
     except HTTPException:
         raise
@@ -1028,32 +1380,40 @@ async def get_patent_workflow_results(workflow_id: str):
         logger.error(f"Failed to get patent workflow results: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to get patent workflow results: {str(e)}")
 
+@app.get("/patent/{workflow_id}/usage")
+async def get_patent_workflow_usage(workflow_id: str):
+    """Get LLM token usage of a patent workflow, broken down by stage and agent"""
+    try:
+        usage = workflow_usage(workflow_id)
+        if usage is None:
+            if not hasattr(app.state, 'workflows') or workflow_id not in app.state.workflows:
+                raise HTTPException(status_code=404, detail="Patent workflow not found")
+            return {"workflow_id": workflow_id, "totals": {}, "by_stage": {}, "by_agent": {}, "entries": []}
+        return usage
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to get patent workflow usage: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to get patent workflow usage: {str(e)}")
+
 @app.post("/patent/{workflow_id}/restart")
-async def restart_patent_workflow(workflow_id: str):
-    """Restart a patent workflow"""
+async def restart_patent_workflow(workflow_id: str, from_scratch: bool = False, force: bool = False):
+    """Restart a patent workflow, reusing the results of completed stages (``force`` bypasses the stage memo)"""
     try:
-        if not hasattr(app.state, 'workflows') or workflow_id not in app.state.workflows:
+        workflow = load_or_rebuild_workflow(workflow_id)
+        if workflow is None:
             raise HTTPException(status_code=404, detail="Patent workflow not found")
         
-        workflow = app.state.workflows[workflow_id]
-        
-        # Reset workflow state
-        workflow["status"] = "restarted"
-        workflow["current_stage"] = "planning"
-        for stage in workflow["stages"]:
-            workflow["stages"][stage] = {"status": "pending", "started_at": None, "completed_at": None}
-        workflow["results"] = {}
-        
-        # Start workflow execution in background
-        background_tasks = BackgroundTasks()
-        background_tasks.add_task(execute_patent_workflow, workflow_id, workflow["topic"], workflow["description"], workflow["test_mode"])
+        resumed_stages, ticket = restart_workflow_run(workflow_id, workflow, from_scratch, force)
         
         return {
             "workflow_id": workflow_id,
             "status": "restarted",
+            "resumed_stages": resumed_stages,
+            **ticket,
             "message": "Patent workflow restarted successfully"
         }
-    except HTTPException:
+    except (HTTPException, AdmissionRejected):
         raise
     except Exception as e:
         logger.error(f"Failed to restart patent workflow: {e}")
@@ -1066,6 +1426,7 @@ async def delete_patent_workflow(workflow_id: str):
         if not hasattr(app.state, 'workflows') or workflow_id not in app.state.workflows:
             raise HTTPException(status_code=404, detail="Patent workflow not found")
         
+        admission_controller.cancel(workflow_id)
         del app.state.workflows[workflow_id]
         return {
             "workflow_id": workflow_id,
@@ -1261,6 +1622,41 @@ async def download_workflow_directory(workflow_id: str):
         logger.error(f"Failed to download workflow directory: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to download workflow directory: {str(e)}")
 
+@app.get("/download/batch/{batch_id}")
+async def download_batch(batch_id: str):
+    """Download every item's workflow directory of a batch as one zip file"""
+    try:
+        progress = get_batch_progress(batch_id)
+        
+        import zipfile
+        import tempfile
+        
+        with tempfile.NamedTemporaryFile(delete=False, suffix='.zip') as tmp_zip:
+            with zipfile.ZipFile(tmp_zip.name, 'w', zipfile.ZIP_DEFLATED) as zipf:
+                zipf.writestr("batch_summary.json", json.dumps(progress, ensure_ascii=False, indent=2))
+                for index, item in enumerate(progress["items"], 1):
+                    workflow_dir = app.state.workflows[item["workflow_id"]].get("workflow_directory")
+                    if not workflow_dir or not os.path.exists(workflow_dir):
+                        continue
+                    prefix = f"{index:03d}_{os.path.basename(workflow_dir)}"
+                    for root, dirs, files in os.walk(workflow_dir):
+                        for file in files:
+                            file_path = os.path.join(root, file)
+                            zipf.write(file_path, os.path.join(prefix, os.path.relpath(file_path, workflow_dir)))
+            
+            return FileResponse(
+                path=tmp_zip.name,
+                filename=f"batch_{batch_id}.zip",
+                media_type="application/zip",
+                headers={"Content-Disposition": f"attachment; filename=batch_{batch_id}.zip"}
+            )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Failed to download patent batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to download patent batch: {str(e)}")
+
 @app.get("/download/patent/{workflow_id}")
 async def download_patent_file(workflow_id: str):
     """Download final patent file for a completed workflow"""
@@ -1310,7 +1706,8 @@ async def list_patent_workflows():
         if not hasattr(app.state, 'workflows'):
             return {"patent_workflows": [], "total": 0, "summary": {}}
         
-        workflows = list(app.state.workflows.values())
+        # 只读取工作流元数据，不加载各阶段的大结果
+        workflows = workflow_store.summaries()
         # Filter for patent workflows (workflow_type == "patent")
         patent_workflows = [w for w in workflows if w.get("workflow_type") == "patent"]
         
@@ -1544,6 +1941,17 @@ async def health_check():
         "test_mode": False,  # Health check always shows real mode
         "active_workflows": len(workflow_manager.workflows),
         "services": ["coordinator", "planner", "searcher", "discussion", "writer", "reviewer", "rewriter"],
+        "llm_cache": get_llm_cache_stats(),
+        "stage_memo": get_stage_memo_stats(),
+        "agent_pools": agent_pool_stats(),
+        "llm_singleflight": llm_singleflight.stats(),
+        "llm_hedging": get_hedging_stats(),
+        "circuit_breakers": get_circuit_breaker_status(),
+        "stage_dispatch": stage_dispatcher.status(),
+        "workflow_store": workflow_store.stats(),
+        "execution_mode": WORKFLOW_EXECUTION_MODE,
+        "job_queue": job_queue.stats() if job_queue is not None else None,
+        "admission": admission_controller.status(),
         "timestamp": time.time()
     }
 
@@ -1584,6 +1992,9 @@ async def start_workflow(request: WorkflowRequest, background_tasks: BackgroundT
                 detail=f"Only patent workflows are supported. Received workflow_type: {request.workflow_type}"
             )
         
+        # Reject with 429 before creating anything when the admission queue is full
+        ensure_admission_capacity()
+        
         # Create patent workflow
         workflow_id = str(uuid.uuid4())
         
@@ -1605,23 +2016,24 @@ async def start_workflow(request: WorkflowRequest, background_tasks: BackgroundT
                 "rewrite": {"status": "pending", "started_at": None, "completed_at": None}
             },
             "results": {},
-            "current_stage": "planning"
+            "current_stage": "planning",
+            "force": request.force
         }
         
-        # Store workflow in memory
-        if not hasattr(app.state, 'workflows'):
-            app.state.workflows = {}
+        # Store workflow (persisted to the SQLite workflow store)
         app.state.workflows[workflow_id] = workflow_state
         
-        # Start patent workflow execution in background
-        background_tasks.add_task(execute_patent_workflow, workflow_id, request.topic, request.description, request.test_mode)
+        # Admit patent workflow execution by priority
+        ticket = schedule_workflow(workflow_id, request.topic, request.description, request.test_mode, request.priority)
         
         return WorkflowResponse(
             workflow_id=workflow_id,
-            status="started",
-            message=f"Patent workflow started successfully for topic: {request.topic} (test_mode: {request.test_mode})"
+            status="started" if ticket["admission"] == "running" else "queued",
+            message=f"Patent workflow {admission_message(ticket)} for topic: {request.topic} (test_mode: {request.test_mode})",
+            queue_position=ticket["queue_position"],
+            eta_seconds=ticket["eta_seconds"]
         )
-    except HTTPException:
+    except (HTTPException, AdmissionRejected):
         raise
     except Exception as e:
         logger.error(f"Failed to start patent workflow: {e}")
@@ -1692,29 +2104,21 @@ async def get_workflow_results(workflow_id: str):
         raise HTTPException(status_code=500, detail=f"Failed to get results: {str(e)}")
 
 @app.post("/coordinator/workflow/{workflow_id}/restart")
-async def restart_workflow(workflow_id: str, background_tasks: BackgroundTasks):
-    """Restart a patent workflow"""
+async def restart_workflow(workflow_id: str, from_scratch: bool = False, force: bool = False):
+    """Restart a patent workflow, reusing the results of completed stages (``force`` bypasses the stage memo)"""
     try:
         # Only support patent workflows
-        if not hasattr(app.state, 'workflows') or workflow_id not in app.state.workflows:
+        workflow = load_or_rebuild_workflow(workflow_id)
+        if workflow is None:
             raise HTTPException(status_code=404, detail="Patent workflow not found")
-        
-        workflow = app.state.workflows[workflow_id]
         if workflow.get("workflow_type") != "patent":
             raise HTTPException(status_code=400, detail="Only patent workflows are supported")
         
-        # Reset workflow state
-        workflow["status"] = "restarted"
-        workflow["current_stage"] = "planning"
-        for stage in workflow["stages"]:
-            workflow["stages"][stage] = {"status": "pending", "started_at": None, "completed_at": None}
-        workflow["results"] = {}
-        
-        # Start workflow execution in background
-        background_tasks.add_task(execute_patent_workflow, workflow_id, workflow["topic"], workflow["description"], workflow["test_mode"])
+        resumed_stages, ticket = restart_workflow_run(workflow_id, workflow, from_scratch, force)
         
-        return {"workflow_id": workflow_id, "status": "restarted", "message": "Patent workflow restarted"}
-    except HTTPException:
+        return {"workflow_id": workflow_id, "status": "restarted", "resumed_stages": resumed_stages,
+                **ticket, "message": "Patent workflow restarted"}
+    except (HTTPException, AdmissionRejected):
         raise
     except Exception as e:
         logger.error(f"Failed to restart patent workflow: {e}")
@@ -1727,7 +2131,7 @@ async def list_workflows():
         # Only support patent workflows
         patent_workflows = []
         if hasattr(app.state, 'workflows'):
-            for workflow in app.state.workflows.values():
+            for workflow in workflow_store.summaries():
                 if workflow.get("workflow_type") == "patent":
                     patent_workflows.append({
                         "workflow_id": workflow["workflow_id"],
@@ -1762,6 +2166,7 @@ async def delete_workflow(workflow_id: str):
         if workflow.get("workflow_type") != "patent":
             raise HTTPException(status_code=400, detail="Only patent workflows are supported")
         
+        admission_controller.cancel(workflow_id)
         del app.state.workflows[workflow_id]
         return {"workflow_id": workflow_id, "status": "deleted", "message": "Patent workflow deleted"}
     except HTTPException:
@@ -1774,25 +2179,6 @@ async def delete_workflow(workflow_id: str):
 # AGENT ENDPOINTS
 # ============================================================================
 
-class TaskRequest(BaseModel):
-    """Task request model"""
-    task_id: str
-    workflow_id: str
-    stage_name: str
-    topic: str
-    description: str
-    test_mode: bool = False
-    previous_results: Dict[str, Any] = {}
-    context: Dict[str, Any] = {}
-
-class TaskResponse(BaseModel):
-    """Task response model"""
-    task_id: str
-    status: str
-    result: Dict[str, Any]
-    message: str
-    test_mode: bool
-
 # Planner Agent
 @app.get("/agents/planner/health")
 async def planner_health():
@@ -1818,7 +2204,7 @@ async def planner_execute(request: TaskRequest):
         logger.info(f"🔍 DEBUG API: request.test_mode == False = {request.test_mode == False}")
         logger.info(f"🔍 DEBUG API: request.test_mode == True = {request.test_mode == True}")
         
-        result = await execute_planner_task(request)
+        result = await stage_dispatcher.run_local("planner", request)
         logger.info(f"🔍 DEBUG: execute_planner_task returned result with test_mode: {result.get('test_mode', 'NOT_FOUND')}")
         logger.info(f"🔍 DEBUG: request.test_mode: {request.test_mode}")
         logger.info(f"🔍 DEBUG: result type: {type(result)}")
@@ -1854,7 +2240,7 @@ async def searcher_execute(request: TaskRequest):
         logger.info(f"🔍 Searcher Agent received task: {request.task_id}")
         logger.info(f"🔧 Test mode: {request.test_mode}")
         
-        result = await execute_searcher_task(request)
+        result = await stage_dispatcher.run_local("searcher", request)
         return TaskResponse(
             task_id=request.task_id,
             status="completed",
@@ -1885,7 +2271,7 @@ async def discussion_execute(request: TaskRequest):
         logger.info(f"💬 Discussion Agent received task: {request.task_id}")
         logger.info(f"🔧 Test mode: {request.test_mode}")
         
-        result = await execute_discussion_task(request)
+        result = await stage_dispatcher.run_local("discussion", request)
         return TaskResponse(
             task_id=request.task_id,
             status="completed",
@@ -1916,7 +2302,7 @@ async def writer_execute(request: TaskRequest):
         logger.info(f"✍️ Writer Agent received task: {request.task_id}")
         logger.info(f"🔧 Test mode: {request.test_mode}")
         
-        result = await execute_writer_task(request)
+        result = await stage_dispatcher.run_local("writer", request)
         return TaskResponse(
             task_id=request.task_id,
             status="completed",
@@ -1947,7 +2333,7 @@ async def reviewer_execute(request: TaskRequest):
         logger.info(f"🔍 Reviewer Agent received task: {request.task_id}")
         logger.info(f"🔧 Test mode: {request.test_mode}")
         
-        result = await execute_reviewer_task(request)
+        result = await stage_dispatcher.run_local("reviewer", request)
         return TaskResponse(
             task_id=request.task_id,
             status="completed",
@@ -1978,7 +2364,7 @@ async def rewriter_execute(request: TaskRequest):
         logger.info(f"✏️ Rewriter Agent received task: {request.task_id}")
         logger.info(f"🔧 Test mode: {request.test_mode}")
         
-        result = await execute_rewriter_task(request)
+        result = await stage_dispatcher.run_local("rewriter", request)
         return TaskResponse(
             task_id=request.task_id,
             status="completed",
@@ -2013,7 +2399,7 @@ async def compressor_execute(request: TaskRequest):
         logger.info(f"🗜️ Compression Agent received task: {request.task_id}")
         logger.info(f"🔧 Test mode: {request.test_mode}")
         
-        result = await execute_compression_task(request)
+        result = await stage_dispatcher.run_local("compressor", request)
         return TaskResponse(
             task_id=request.task_id,
             status="completed",
@@ -2257,10 +2643,6 @@ async def execute_discussion_task(request: TaskRequest) -> Dict[str, Any]:
     if GLM_AVAILABLE:
         try:
             logger.info("🚀 使用OpenAI Client进行创新讨论分析")
-            # 使用统一的OpenAI Client，它会自动处理GLM回退
-            from patent_agent_demo.openai_client import OpenAIClient
-            openai_client = OpenAIClient()
-            
             # 构建更详细的提示词
             planning_summary = f"规划策略: {planning_strategy}" if planning_strategy else "无规划策略数据"
             search_summary = f"搜索结果: {len(search_findings)}个专利" if search_findings else "无搜索结果数据"
@@ -2279,7 +2661,9 @@ async def execute_discussion_task(request: TaskRequest) -> Dict[str, Any]:
             4. 技术发展趋势
             """
             
-            glm_response = await openai_client._generate_response(analysis_prompt)
+            # 使用统一的OpenAI Client（从实例池借出），它会自动处理GLM回退
+            async with checkout_agent("discussion") as openai_client:
+                glm_response = await openai_client._generate_response(analysis_prompt)
             logger.info("✅ OpenAI Client API调用成功")
             
             # 修复：将GLM的文本响应转换为结构化的讨论结果
@@ -2391,33 +2775,6 @@ async def execute_writer_task(request: TaskRequest) -> Dict[str, Any]:
     logger.info(f"📋 Previous results keys: {list(previous_results.keys())}")
     
     try:
-        # Import and initialize Simplified Writer Agent
-        logger.info("📦 Attempting to import WriterAgentSimple...")
-        try:
-            from patent_agent_demo.agents.writer_agent_simple import WriterAgentSimple
-            logger.info("✅ WriterAgentSimple imported successfully")
-        except ImportError as import_error:
-            logger.error(f"❌ Failed to import WriterAgentSimple: {import_error}")
-            raise ImportError(f"WriterAgentSimple import failed: {import_error}")
-        
-        # Create Simplified Writer Agent instance
-        logger.info("🔧 Creating WriterAgentSimple instance...")
-        try:
-            writer_agent = WriterAgentSimple(test_mode=request.test_mode)
-            logger.info("✅ WriterAgentSimple instance created")
-        except Exception as create_error:
-            logger.error(f"❌ Failed to create WriterAgentSimple instance: {create_error}")
-            raise Exception(f"WriterAgentSimple creation failed: {create_error}")
-        
-        # Start the agent
-        logger.info("🚀 Starting WriterAgentSimple...")
-        try:
-            await writer_agent.start()
-            logger.info("✅ WriterAgentSimple started successfully")
-        except Exception as start_error:
-            logger.error(f"❌ Failed to start WriterAgentSimple: {start_error}")
-            raise Exception(f"WriterAgentSimple start failed: {start_error}")
-        
         # Prepare task data for Writer Agent
         task_data = {
             "type": "patent_drafting",
@@ -2433,7 +2790,9 @@ async def execute_writer_task(request: TaskRequest) -> Dict[str, Any]:
         # Execute the task using Writer Agent
         logger.info("⏳ Executing Writer Agent task...")
         try:
-            result = await writer_agent.execute_task(task_data)
+            # 从预热的实例池借出已启动的WriterAgentSimple，任务结束后归还复用
+            async with checkout_agent("writer", test_mode=request.test_mode) as writer_agent:
+                result = await writer_agent.execute_task(task_data)
             logger.info(f"✅ Writer Agent task execution completed")
         except Exception as execute_error:
             logger.error(f"❌ Writer Agent task execution failed: {execute_error}")
@@ -2576,11 +2935,10 @@ async def execute_reviewer_task(request: TaskRequest) -> Dict[str, Any]:
     if GLM_AVAILABLE:
         try:
             logger.info("🚀 使用OpenAI Client进行专利质量审查")
-            # 使用统一的OpenAI Client，它会自动处理GLM回退
-            from patent_agent_demo.openai_client import OpenAIClient
-            openai_client = OpenAIClient()
+            # 使用统一的OpenAI Client（从实例池借出），它会自动处理GLM回退
             # 使用_generate_response方法进行质量审查
-            glm_response = await openai_client._generate_response(f"专利质量审查：基于草稿{writer_draft}和核心策略{core_strategy}")
+            async with checkout_agent("reviewer") as openai_client:
+                glm_response = await openai_client._generate_response(f"专利质量审查：基于草稿{writer_draft}和核心策略{core_strategy}")
             logger.info("✅ OpenAI Client API调用成功")
             
             # 修复：将GLM的文本响应转换为结构化的审查结果
@@ -2732,11 +3090,10 @@ async def execute_rewriter_task(request: TaskRequest) -> Dict[str, Any]:
     if GLM_AVAILABLE:
         try:
             logger.info("🚀 使用OpenAI Client进行专利内容重写优化")
-            # 使用统一的OpenAI Client，它会自动处理GLM回退
-            from patent_agent_demo.openai_client import OpenAIClient
-            openai_client = OpenAIClient()
+            # 使用统一的OpenAI Client（从实例池借出），它会自动处理GLM回退
             # 使用_generate_response方法进行内容重写
-            glm_response = await openai_client._generate_response(f"专利内容重写：基于草稿{writer_draft}和审查反馈{review_feedback}")
+            async with checkout_agent("rewriter") as openai_client:
+                glm_response = await openai_client._generate_response(f"专利内容重写：基于草稿{writer_draft}和审查反馈{review_feedback}")
             logger.info("✅ OpenAI Client API调用成功")
             
             # 修复：将GLM的文本响应转换为结构化的重写结果
@@ -2870,6 +3227,15 @@ async def execute_compression_task(request: TaskRequest) -> Dict[str, Any]:
     
     return compression_result
 
+# 本地智能体注册到调度器：阶段执行直接调用，无需HTTP回环
+stage_dispatcher.register_local("planner", execute_planner_task, "Patent planning")
+stage_dispatcher.register_local("searcher", execute_searcher_task, "Prior art search")
+stage_dispatcher.register_local("discussion", execute_discussion_task, "Innovation discussion")
+stage_dispatcher.register_local("writer", execute_writer_task, "Patent drafting")
+stage_dispatcher.register_local("reviewer", execute_reviewer_task, "Quality review")
+stage_dispatcher.register_local("rewriter", execute_rewriter_task, "Patent rewriting")
+stage_dispatcher.register_local("compressor", execute_compression_task, "Context compression")
+
 def analyze_compression_needs(previous_results: Dict[str, Any], context: Dict[str, Any]) -> Dict[str, Any]:
     """Analyze what needs to be compressed and how"""
     logger.info("📊 Analyzing compression needs...")
@@ -3087,10 +3453,9 @@ async def analyze_patent_topic(topic: str, description: str) -> Dict[str, Any]:
     if GLM_AVAILABLE:
         try:
             logger.info("🚀 使用OpenAI Client进行专利主题分析")
-            # 使用统一的OpenAI Client，它会自动处理GLM回退
-            from patent_agent_demo.openai_client import OpenAIClient
-            openai_client = OpenAIClient()
-            result = await openai_client._generate_response(f"专利主题分析：{topic} - {description}")
+            # 使用统一的OpenAI Client（从实例池借出），它会自动处理GLM回退
+            async with checkout_agent("planner") as openai_client:
+                result = await openai_client._generate_response(f"专利主题分析：{topic} - {description}")
             logger.info("✅ OpenAI Client API调用成功")
             return {"analysis": result}
         except Exception as e:
@@ -3286,10 +3651,6 @@ async def _generate_new_search_keywords_with_glm(topic: str, current_keywords: L
                                                 round_num: int) -> List[str]:
     """使用GLM API分析检索结果，生成新的检索关键词"""
     try:
-        # 使用统一的OpenAI Client，它会自动处理GLM回退
-        from patent_agent_demo.openai_client import OpenAIClient
-        openai_client = OpenAIClient()
-        
         # 构建智能分析提示
         analysis_prompt = f"""
         作为专利检索专家，请分析第{round_num}轮检索结果，生成第{round_num+1}轮的新检索关键词。
@@ -3317,7 +3678,9 @@ async def _generate_new_search_keywords_with_glm(topic: str, current_keywords: L
         请直接返回关键词列表，不要其他解释：
         """
         
-        glm_response = await openai_client._generate_response(analysis_prompt)
+        # 使用统一的OpenAI Client（从实例池借出），它会自动处理GLM回退
+        async with checkout_agent("searcher") as openai_client:
+            glm_response = await openai_client._generate_response(analysis_prompt)
         logger.info(f"🧠 GLM第{round_num}轮分析响应: {glm_response[:100]}...")
         
         # 解析GLM响应，提取新关键词
@@ -3337,10 +3700,6 @@ async def _enhance_results_with_glm_final_analysis(topic: str, original_keywords
                                                  all_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """使用GLM API对所有检索结果进行最终分析和增强"""
     try:
-        # 使用统一的OpenAI Client，它会自动处理GLM回退
-        from patent_agent_demo.openai_client import OpenAIClient
-        openai_client = OpenAIClient()
-        
         # 构建最终分析提示
         final_analysis_prompt = f"""
         作为专利分析师，请对以下专利检索结果进行深度分析和增强：
@@ -3363,7 +3722,9 @@ async def _enhance_results_with_glm_final_analysis(topic: str, original_keywords
         请提供结构化的分析结果，包含具体的技术洞察和建议。
         """
         
-        final_glm_analysis = await openai_client._generate_response(final_analysis_prompt)
+        # 使用统一的OpenAI Client（从实例池借出），它会自动处理GLM回退
+        async with checkout_agent("searcher") as openai_client:
+            final_glm_analysis = await openai_client._generate_response(final_analysis_prompt)
         logger.info(f"🧠 GLM最终分析完成，分析长度: {len(final_glm_analysis)}")
         
         # 将GLM分析结果整合到每个检索结果中
@@ -3464,10 +3825,35 @@ def _filter_and_optimize_keywords(new_keywords: List[str], current_keywords: Lis
         logger.warning(f"⚠️ 关键词优化失败: {e}")
         return new_keywords[:5]
 
+# 相同检索查询在并发工作流之间合并，并在TTL内复用（批量生成相关主题时重复查询很多）
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "3600"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "1000"))
+search_singleflight = SingleFlight("Search")
+_search_cache: "OrderedDict[str, Any]" = OrderedDict()
+
+async def _fetch_search_json(url: str) -> Dict[str, Any]:
+    """GET a search API URL through the shared client, coalescing and caching identical queries"""
+    cached = _search_cache.get(url)
+    if cached and time.time() - cached[0] < SEARCH_CACHE_TTL_SECONDS:
+        _search_cache.move_to_end(url)
+        logger.info("♻️ 复用相同检索查询的结果")
+        return cached[1]
+    
+    async def fetch():
+        from patent_agent_demo.http_pool import get_shared_http_client
+        response = await get_shared_http_client().get(url, timeout=15, follow_redirects=True)
+        response.raise_for_status()
+        data = response.json()
+        _search_cache[url] = (time.time(), data)
+        while len(_search_cache) > SEARCH_CACHE_MAX_ENTRIES:
+            _search_cache.popitem(last=False)
+        return data
+    
+    return await search_singleflight.do(url, fetch)
+
 async def _search_with_duckduckgo_api(topic: str, keywords: List[str], max_results: int) -> List[Dict[str, Any]]:
     """使用DuckDuckGo API进行专利检索"""
     try:
-        import requests
         from urllib.parse import quote_plus
         
         # 构建搜索查询
@@ -3479,11 +3865,8 @@ async def _search_with_duckduckgo_api(topic: str, keywords: List[str], max_resul
         
         logger.info(f"🌐 调用DuckDuckGo API: {url}")
         
-        # 发送请求
-        response = requests.get(url, timeout=15)
-        response.raise_for_status()
-        
-        data = response.json()
+        # 发送请求（非阻塞，相同查询合并）
+        data = await _fetch_search_json(url)
         results = []
         
         # 处理摘要结果
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Workflow Worker - Process pool that executes queued patent workflows
+Run the API with WORKFLOW_EXECUTION_MODE=queue and start workers with:
+    python worker.py --processes 4 --concurrency 2
+Each process leases jobs from the shared SQLite job queue, heartbeats while a
+workflow runs, and resumes reclaimed workflows from their last completed stage.
+"""
+
+import os
+import sys
+import time
+import socket
+import asyncio
+import logging
+import multiprocessing
+from typing import Optional
+
+from job_queue import JobQueue
+
+logger = logging.getLogger(__name__)
+
+WORKER_PROCESSES = int(os.getenv("WORKER_PROCESSES", str(os.cpu_count() or 1)))
+# 每个进程同时执行的工作流数（阶段级并发另受STAGE_MAX_CONCURRENCY限制）
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "2"))
+WORKER_POLL_INTERVAL = float(os.getenv("WORKER_POLL_INTERVAL", "1.0"))
+
+
+async def run_job(queue: JobQueue, job: dict, worker_id: str) -> None:
+    """Execute one leased workflow while keeping its lease alive"""
+    import unified_service
+    from stage_checkpoint import prepare_resume
+
+    payload = job["payload"]
+    workflow_id = payload["workflow_id"]
+    if workflow_id not in unified_service.app.state.workflows:
+        queue.fail(job["job_id"], worker_id, "workflow not found", retry=False)
+        return
+    if job["reclaimed"]:
+        # 上一个worker中途崩溃：保留已完成阶段，从第一个未完成阶段继续
+        workflow = unified_service.app.state.workflows[workflow_id]
+        kept = prepare_resume(workflow)
+        unified_service.persist_workflow(workflow_id)
+        logger.info(f"♻️ Worker {worker_id} resuming {workflow_id}, reusing stages: {kept}")
+
+    task = asyncio.ensure_future(unified_service.execute_patent_workflow(
+        workflow_id, payload["topic"], payload["description"], payload["test_mode"]))
+    lease_lost = False
+    while not task.done():
+        await asyncio.wait([task], timeout=queue.lease_seconds / 3)
+        if not task.done() and not queue.heartbeat(job["job_id"], worker_id):
+            logger.error(f"❌ Worker {worker_id} lost the lease on {workflow_id}, stopping it")
+            lease_lost = True
+            task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        if not lease_lost:
+            raise
+        return
+    except Exception as e:
+        queue.fail(job["job_id"], worker_id, str(e))
+        return
+
+    # 工作流自身的失败（阶段失败）已记录在工作流状态中，不重复排队
+    queue.complete(job["job_id"], worker_id)
+    status = unified_service.app.state.workflows[workflow_id].get("status")
+    logger.info(f"🏁 Worker {worker_id} finished {workflow_id}: {status}")
+
+
+async def worker_loop(worker_id: str, concurrency: int = WORKER_CONCURRENCY,
+                      queue: Optional[JobQueue] = None, stop: Optional[asyncio.Event] = None) -> None:
+    """Lease and run jobs until ``stop`` is set"""
+    queue = queue or JobQueue()
+    stop = stop or asyncio.Event()
+    running = set()
+    logger.info(f"👷 Worker {worker_id} started (concurrency={concurrency})")
+    try:
+        while not stop.is_set():
+            job = queue.lease(worker_id) if len(running) < concurrency else None
+            if job is None:
+                try:
+                    await asyncio.wait_for(stop.wait(), timeout=WORKER_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            logger.info(f"📤 Worker {worker_id} leased job {job['job_id']} (attempt {job['attempt']})")
+            task = asyncio.create_task(run_job(queue, job, worker_id))
+            running.add(task)
+            task.add_done_callback(running.discard)
+        if running:
+            await asyncio.gather(*running, return_exceptions=True)
+    finally:
+        from agent_pool import close_agent_pools
+        from patent_agent_demo.http_pool import close_shared_http_client
+        await close_agent_pools()
+        await close_shared_http_client()
+        logger.info(f"🛑 Worker {worker_id} stopped")
+
+
+def _process_main(index: int, concurrency: int) -> None:
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [worker-{index}] %(levelname)s %(message)s")
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    try:
+        asyncio.run(worker_loop(worker_id, concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+def main(processes: int = WORKER_PROCESSES, concurrency: int = WORKER_CONCURRENCY) -> None:
+    """Start ``processes`` worker processes and restart any that die"""
+    ctx = multiprocessing.get_context("spawn")
+    workers = {}
+    print(f"🚀 Starting {processes} workflow worker processes (concurrency {concurrency} each)")
+    try:
+        while True:
+            for index in range(processes):
+                proc = workers.get(index)
+                if proc is None or not proc.is_alive():
+                    if proc is not None:
+                        print(f"⚠️ Worker process {index} exited with code {proc.exitcode}, restarting")
+                    proc = ctx.Process(target=_process_main, args=(index, concurrency), daemon=False)
+                    proc.start()
+                    workers[index] = proc
+            time.sleep(2)
+    except KeyboardInterrupt:
+        print("🛑 Stopping workflow workers...")
+        for proc in workers.values():
+            proc.terminate()
+        for proc in workers.values():
+            proc.join(timeout=10)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Patent workflow worker pool")
+    parser.add_argument("--processes", type=int, default=WORKER_PROCESSES, help="Number of worker processes")
+    parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Workflows per process")
+    args = parser.parse_args()
+    sys.exit(main(args.processes, args.concurrency))
@@ -7,42 +7,44 @@ Assigns tasks to agent services and manages workflow progression
 import asyncio
 import time
 import uuid
-import httpx
 from typing import Dict, Any, List, Optional
 import logging
 
 from models import (
     WorkflowState, WorkflowStatus, StageInfo, 
-    WorkflowStatusEnum, StageStatusEnum, TestModeConfig
+    WorkflowStatusEnum, StageStatusEnum, TestModeConfig, TaskRequest
 )
+from stage_dispatcher import STAGE_TO_AGENT, stage_dispatcher
+from workflow_store import WorkflowStore
+from stage_checkpoint import is_valid_result
+from stage_memo import memoized_stage
+from patent_agent_demo.llm_cache import bypass_llm_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Agent service URLs (all on same port with different paths)
-AGENT_SERVICES = {
-    "planning": "http://localhost:8000/agents/planner",
-    "search": "http://localhost:8000/agents/searcher", 
-    "discussion": "http://localhost:8000/agents/discussion",
-    "drafting": "http://localhost:8000/agents/writer",
-    "review": "http://localhost:8000/agents/reviewer",
-    "rewrite": "http://localhost:8000/agents/rewriter",
-    "compressor": "http://localhost:8000/agents/compressor"  # Optional compression agent
-}
+# Agent services are resolved through the stage dispatcher (in-process when local,
+# pooled HTTP for agents configured in REMOTE_AGENT_URLS)
 
 class WorkflowManager:
     """Task assignment workflow manager"""
     
     def __init__(self):
-        # In-memory storage
-        self.workflows: Dict[str, WorkflowState] = {}
+        # Durable storage (SQLite) with a hot in-memory LRU
+        self.workflows = WorkflowStore(
+            namespace="manager",
+            results_key="stage_results",
+            encode=lambda workflow: workflow.model_dump(mode="json"),
+            decode=WorkflowState.model_validate,
+        )
         self.test_mode = TestModeConfig(enabled=True)
         
         logger.info("🚀 WorkflowManager initialized with task assignment to agent services")
     
-    def create_workflow(self, topic: str, description: str, workflow_type: str = "enhanced", test_mode: bool = False) -> str:
-        """Create a new workflow"""
+    def create_workflow(self, topic: str, description: str, workflow_type: str = "enhanced", test_mode: bool = False,
+                        force: bool = False) -> str:
+        """Create a new workflow (``force`` recomputes stages instead of reusing memoized results)"""
         workflow_id = str(uuid.uuid4())
         
         workflow = WorkflowState(
@@ -50,7 +52,8 @@ class WorkflowManager:
             topic=topic,
             description=description,
             workflow_type=workflow_type,
-            test_mode=test_mode
+            test_mode=test_mode,
+            force=force
         )
         
         # Initialize stage statuses
@@ -75,6 +78,10 @@ class WorkflowManager:
             
             # Execute stages sequentially by assigning tasks to agents
             for stage_index, stage_name in enumerate(workflow.stages):
+                if workflow.stage_statuses.get(stage_name) == StageStatusEnum.COMPLETED and \
+                        stage_name in workflow.stage_results:
+                    logger.info(f"⏭️ Skipping completed stage {stage_name}")
+                    continue
                 try:
                     logger.info(f"🔄 Assigning task to agent {stage_index + 1}/{len(workflow.stages)}: {stage_name}")
                     
@@ -83,6 +90,7 @@ class WorkflowManager:
                     workflow.stage_statuses[stage_name] = StageStatusEnum.RUNNING
                     workflow.stage_times[stage_name] = {"start": time.time()}
                     workflow.updated_at = time.time()
+                    await self.workflows.asave(workflow_id)
                     
                     # Check if compression is needed before this stage
                     if self._should_compress_context(stage_name, workflow):
@@ -105,6 +113,7 @@ class WorkflowManager:
                     workflow.stage_statuses[stage_name] = StageStatusEnum.COMPLETED
                     workflow.stage_times[stage_name]["end"] = time.time()
                     workflow.updated_at = time.time()
+                    await self.workflows.asave(workflow_id)
                     
                     logger.info(f"✅ Stage {stage_name} completed by agent service")
                     
@@ -113,24 +122,31 @@ class WorkflowManager:
                     workflow.stage_statuses[stage_name] = StageStatusEnum.FAILED
                     workflow.errors[stage_name] = str(e)
                     workflow.status = WorkflowStatusEnum.FAILED
-                    workflow.updated_at = time.time()
+                    self._end_run(workflow_id)
                     return
             
             # All stages completed
             workflow.status = WorkflowStatusEnum.COMPLETED
-            workflow.updated_at = time.time()
+            self._end_run(workflow_id)
             logger.info(f"🎉 Workflow {workflow_id} completed successfully!")
             
         except Exception as e:
             logger.error(f"❌ Workflow {workflow_id} execution failed: {str(e)}")
             if workflow_id in self.workflows:
                 self.workflows[workflow_id].status = WorkflowStatusEnum.FAILED
-                self.workflows[workflow_id].updated_at = time.time()
+                self._end_run(workflow_id)
+    
+    def _end_run(self, workflow_id: str):
+        """Persist the outcome of a finished run; ``force`` only applies to the run it was requested for"""
+        workflow = self.workflows[workflow_id]
+        workflow.force = False
+        workflow.updated_at = time.time()
+        self.workflows.save(workflow_id)
     
     async def _assign_compression_task(self, workflow_id: str, stage_name: str, workflow: WorkflowState) -> Dict[str, Any]:
         """Assign compression task to compression agent with workflow isolation"""
         try:
-            agent_url = AGENT_SERVICES.get("compressor")  # Use compression agent URL
+            agent = STAGE_TO_AGENT["compressor"]  # Optional compression agent
             
             # Validate workflow ID and ensure context isolation
             if workflow.workflow_id != workflow_id:
@@ -145,35 +161,23 @@ class WorkflowManager:
             compression_context["context_timestamp"] = time.time()
             
             # Prepare task data for compression with workflow isolation
-            task_data = {
-                "task_id": f"{workflow_id}_{stage_name}_{int(time.time())}",  # Add timestamp for uniqueness
-                "workflow_id": workflow_id,  # Ensure workflow ID is passed
-                "stage_name": stage_name,
-                "topic": workflow.topic,
-                "description": workflow.description,
-                "previous_results": self._isolate_workflow_results(workflow_id, workflow.stage_results),
-                "context": compression_context
-            }
+            task_request = TaskRequest.model_construct(
+                task_id=f"{workflow_id}_{stage_name}_{int(time.time())}",  # Add timestamp for uniqueness
+                workflow_id=workflow_id,  # Ensure workflow ID is passed
+                stage_name=stage_name,
+                topic=workflow.topic,
+                description=workflow.description,
+                previous_results=self._isolate_workflow_results(workflow_id, workflow.stage_results),
+                context=compression_context
+            )
             
-            logger.info(f"🗜️ Assigning compression task to compression agent at {agent_url}")
+            logger.info(f"🗜️ Assigning compression task to {agent} agent")
             logger.info(f"📋 Compression context: {compression_context}")
             
-            # Send task to compression agent service
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{agent_url}/execute",
-                    json=task_data,
-                    timeout=300.0  # 5 minutes timeout
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    logger.info(f"✅ Compression agent completed task successfully")
-                    return result
-                else:
-                    error_msg = f"Compression agent failed with status {response.status_code}: {response.text}"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
+            # Dispatch task to compression agent (5 minutes timeout when remote)
+            response = await stage_dispatcher.dispatch(agent, task_request, timeout=300.0)
+            logger.info(f"✅ Compression agent completed task successfully")
+            return response.model_dump()
                     
         except Exception as e:
             logger.error(f"❌ Failed to assign compression task: {str(e)}")
@@ -243,8 +247,8 @@ class WorkflowManager:
     async def _assign_task_to_agent(self, workflow_id: str, stage_name: str, workflow: WorkflowState) -> Dict[str, Any]:
         """Assign task to agent service with workflow context isolation"""
         try:
-            agent_url = AGENT_SERVICES.get(stage_name)
-            if not agent_url:
+            agent = STAGE_TO_AGENT.get(stage_name)
+            if not agent:
                 raise Exception(f"Agent service not found for stage: {stage_name}")
             
             # Validate workflow ID and ensure context isolation
@@ -255,40 +259,40 @@ class WorkflowManager:
             isolated_context = self._create_isolated_context(workflow_id, workflow, stage_name)
             
             # Prepare task data with workflow isolation
-            task_data = {
-                "task_id": f"{workflow_id}_{stage_name}_{int(time.time())}",  # Add timestamp for uniqueness
-                "workflow_id": workflow_id,  # Ensure workflow ID is passed
-                "stage_name": stage_name,
-                "topic": workflow.topic,
-                "description": workflow.description,
-                "test_mode": workflow.test_mode,  # Add test mode to task data
-                "previous_results": self._isolate_workflow_results(workflow_id, workflow.stage_results),
-                "context": isolated_context
-            }
+            task_request = TaskRequest.model_construct(
+                task_id=f"{workflow_id}_{stage_name}_{int(time.time())}",  # Add timestamp for uniqueness
+                workflow_id=workflow_id,  # Ensure workflow ID is passed
+                stage_name=stage_name,
+                topic=workflow.topic,
+                description=workflow.description,
+                test_mode=workflow.test_mode,  # Add test mode to task data
+                previous_results=self._isolate_workflow_results(workflow_id, workflow.stage_results),
+                context=isolated_context
+            )
             
             logger.info(f"📤 Assigning task to {stage_name} agent for workflow {workflow_id}")
             logger.info(f"🔒 Using isolated context for workflow {workflow_id}")
             
-            # Send task to agent service
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{agent_url}/execute",
-                    json=task_data,
-                    timeout=300.0  # 5 minutes timeout
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    # Validate that the response belongs to the correct workflow
-                    if result.get("workflow_id") != workflow_id:
-                        logger.warning(f"⚠️ Response workflow ID mismatch: expected {workflow_id}, got {result.get('workflow_id')}")
-                    
-                    logger.info(f"✅ Agent {stage_name} completed task successfully for workflow {workflow_id}")
-                    return result
+            async def dispatch():
+                # Dispatch task to agent (in-process when local, 5 minutes timeout when remote)
+                if workflow.force:
+                    with bypass_llm_cache():
+                        response = await stage_dispatcher.dispatch(agent, task_request, timeout=300.0)
                 else:
-                    error_msg = f"Agent {stage_name} failed with status {response.status_code}: {response.text}"
-                    logger.error(error_msg)
-                    raise Exception(error_msg)
+                    response = await stage_dispatcher.dispatch(agent, task_request, timeout=300.0)
+                return response.model_dump()
+            
+            # Identical inputs (upstream results, prompt version, model) reuse the memoized response
+            result = await memoized_stage(stage_name, workflow.topic, workflow.description, workflow.test_mode,
+                                          workflow.stage_results, workflow_id, dispatch,
+                                          force=workflow.force, scope="manager")
+            # Validate that the result belongs to the correct workflow
+            agent_result = result.get("result") or {}
+            if agent_result.get("workflow_id", workflow_id) != workflow_id:
+                logger.warning(f"⚠️ Response workflow ID mismatch: expected {workflow_id}, got {agent_result.get('workflow_id')}")
+            
+            logger.info(f"✅ Agent {stage_name} completed task successfully for workflow {workflow_id}")
+            return result
                     
         except Exception as e:
             logger.error(f"❌ Failed to assign task to agent {stage_name} for workflow {workflow_id}: {str(e)}")
@@ -388,40 +392,53 @@ class WorkflowManager:
     def list_workflows(self) -> List[Dict[str, Any]]:
         """List all workflows"""
         workflows = []
-        for workflow_id, workflow in self.workflows.items():
+        # 只读取元数据，不加载各阶段结果
+        for workflow in self.workflows.summaries():
             workflows.append({
-                "workflow_id": workflow_id,
-                "topic": workflow.topic,
-                "description": workflow.description,
-                "status": workflow.status,
-                "test_mode": workflow.test_mode,
-                "workflow_type": workflow.workflow_type,
-                "current_stage": workflow.current_stage,
-                "total_stages": len(workflow.stages),
-                "created_at": workflow.created_at,
-                "updated_at": workflow.updated_at
+                "workflow_id": workflow["workflow_id"],
+                "topic": workflow["topic"],
+                "description": workflow.get("description"),
+                "status": workflow["status"],
+                "test_mode": workflow["test_mode"],
+                "workflow_type": workflow.get("workflow_type"),
+                "current_stage": int(workflow["current_stage"] or 0),
+                "total_stages": len(workflow.get("stages") or []),
+                "created_at": workflow["created_at"],
+                "updated_at": workflow.get("updated_at")
             })
         return workflows
     
-    def reset_workflow(self, workflow_id: str):
-        """Reset a workflow to start over"""
+    def reset_workflow(self, workflow_id: str, from_scratch: bool = False, force: bool = False):
+        """Reset a workflow so it resumes from its first incomplete stage (or starts over)"""
         if workflow_id not in self.workflows:
             raise KeyError(f"Workflow {workflow_id} not found")
         
         workflow = self.workflows[workflow_id]
+        # Stages run sequentially, so only the leading run of completed stages can be reused
+        kept = 0
+        if not from_scratch:
+            for stage in workflow.stages:
+                if workflow.stage_statuses.get(stage) != StageStatusEnum.COMPLETED or \
+                        not is_valid_result(workflow.stage_results.get(stage)):
+                    break
+                kept += 1
+        kept_stages = set(workflow.stages[:kept])
+        
         workflow.status = WorkflowStatusEnum.PENDING
-        workflow.current_stage = 0
-        workflow.stage_results.clear()
-        workflow.stage_statuses.clear()
-        workflow.stage_times.clear()
+        workflow.current_stage = kept
+        workflow.stage_results = {k: v for k, v in workflow.stage_results.items() if k in kept_stages}
+        workflow.stage_times = {k: v for k, v in workflow.stage_times.items() if k in kept_stages}
         workflow.errors.clear()
+        workflow.force = force
         workflow.updated_at = time.time()
         
         # Reset stage statuses
         for stage in workflow.stages:
-            workflow.stage_statuses[stage] = StageStatusEnum.PENDING
+            if stage not in kept_stages:
+                workflow.stage_statuses[stage] = StageStatusEnum.PENDING
+        self.workflows.save(workflow_id)
         
-        logger.info(f"🔄 Reset workflow {workflow_id}")
+        logger.info(f"🔄 Reset workflow {workflow_id}, resuming from stage {kept + 1}/{len(workflow.stages)}")
     
     def delete_workflow(self, workflow_id: str):
         """Delete a workflow"""
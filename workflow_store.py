@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Workflow Store - Durable SQLite-backed workflow state
+Workflow status and stage metadata live in indexed tables, large stage results
+as blobs, so a restart no longer loses running or finished workflows. Reads go
+through a hot in-memory LRU; active workflows stay pinned in memory and are
+persisted with ``save()`` at stage boundaries (``asave()`` from the event loop).
+"""
+
+import os
+import json
+import asyncio
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, MutableMapping, Optional
+
+logger = logging.getLogger(__name__)
+
+WORKFLOW_DB_PATH = os.getenv("WORKFLOW_DB_PATH", os.path.join("output", "workflows.sqlite3"))
+WORKFLOW_CACHE_SIZE = int(os.getenv("WORKFLOW_CACHE_SIZE", "100"))
+
+# 这些状态的工作流仍在执行，常驻内存不参与LRU淘汰
+ACTIVE_STATUSES = {"pending", "created", "queued", "running", "restarted"}
+
+# 单独成列（可索引）的顶层字段，其余顶层字段存入data列
+_COLUMNS = ("topic", "status", "current_stage", "test_mode", "created_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS workflows (
+    namespace TEXT NOT NULL,
+    workflow_id TEXT NOT NULL,
+    topic TEXT,
+    status TEXT,
+    current_stage,  -- stage name (service) or stage index (WorkflowManager)
+    test_mode INTEGER,
+    created_at REAL,
+    updated_at REAL,
+    data TEXT,
+    PRIMARY KEY (namespace, workflow_id)
+);
+CREATE INDEX IF NOT EXISTS idx_workflows_status ON workflows(namespace, status);
+CREATE INDEX IF NOT EXISTS idx_workflows_created ON workflows(namespace, created_at);
+CREATE TABLE IF NOT EXISTS stages (
+    namespace TEXT NOT NULL,
+    workflow_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    position INTEGER,
+    status TEXT,
+    started_at REAL,
+    completed_at REAL,
+    data TEXT,
+    PRIMARY KEY (namespace, workflow_id, stage)
+);
+CREATE TABLE IF NOT EXISTS stage_results (
+    namespace TEXT NOT NULL,
+    workflow_id TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    result BLOB,
+    size INTEGER,
+    updated_at REAL,
+    PRIMARY KEY (namespace, workflow_id, stage)
+);
+"""
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+def _digest(blob: bytes) -> str:
+    return hashlib.sha256(blob).hexdigest()
+
+
+class WorkflowStore(MutableMapping):
+    """Dict-like repository of workflows keyed by workflow_id.
+
+    ``encode``/``decode`` convert between the in-memory object and a plain
+    dict (identity for the service's dict workflows); ``results_key`` names the
+    dict field holding per-stage results that are stored as blobs.
+    """
+
+    def __init__(self, path: str = WORKFLOW_DB_PATH, namespace: str = "patent",
+                 cache_size: int = WORKFLOW_CACHE_SIZE, results_key: str = "results",
+                 encode: Optional[Callable[[Any], Dict[str, Any]]] = None,
+                 decode: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.path = path
+        self.namespace = namespace
+        self.cache_size = max(1, cache_size)
+        self.results_key = results_key
+        self._encode = encode or (lambda obj: obj)
+        self._decode = decode or (lambda data: data)
+        self._cache: "OrderedDict[str, Any]" = OrderedDict()
+        # 已持久化的结果内容哈希，内容未变的大结果不重写（原地修改也能被发现）
+        self._saved_results: Dict[str, Dict[str, str]] = {}
+        # 缓存对象对应的数据库updated_at；其他进程（worker）写入更新后重新加载
+        self._versions: Dict[str, float] = {}
+        # 快照序号：asave()在线程中写入，序号更小的快照不再写入
+        self._snapshot_seq = 0
+        self._written_seq: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    # ------------------------------------------------------------------ mapping
+
+    def __getitem__(self, workflow_id: str) -> Any:
+        with self._lock:
+            obj = self._cache.get(workflow_id)
+            if obj is not None and not self._changed_elsewhere(workflow_id):
+                self.hits += 1
+                self._cache.move_to_end(workflow_id)
+                return obj
+            self.misses += 1
+            data = self._load(workflow_id)
+            if data is None:
+                raise KeyError(workflow_id)
+            obj = self._decode(data)
+            self._remember(workflow_id, obj, data)
+            return obj
+
+    def __setitem__(self, workflow_id: str, obj: Any) -> None:
+        with self._lock:
+            self._cache[workflow_id] = obj
+            self._cache.move_to_end(workflow_id)
+            self._saved_results.pop(workflow_id, None)
+            self.save(workflow_id)
+            self._evict()
+
+    def __delitem__(self, workflow_id: str) -> None:
+        with self._lock:
+            exists = workflow_id in self._cache or self._exists(workflow_id)
+            if not exists:
+                raise KeyError(workflow_id)
+            self._cache.pop(workflow_id, None)
+            self._saved_results.pop(workflow_id, None)
+            self._versions.pop(workflow_id, None)
+            self._written_seq.pop(workflow_id, None)
+            for table in ("workflows", "stages", "stage_results"):
+                self._conn.execute(f"DELETE FROM {table} WHERE namespace=? AND workflow_id=?",
+                                   (self.namespace, workflow_id))
+
+    def __contains__(self, workflow_id: object) -> bool:
+        with self._lock:
+            return workflow_id in self._cache or self._exists(workflow_id)
+
+    def __iter__(self) -> Iterator[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT workflow_id FROM workflows WHERE namespace=? ORDER BY created_at, rowid", (self.namespace,)
+            ).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM workflows WHERE namespace=?", (self.namespace,)
+            ).fetchone()[0]
+
+    # ------------------------------------------------------------------ persistence
+
+    def save(self, workflow_id: str) -> None:
+        """Persist the in-memory workflow (call after mutating it in place)"""
+        with self._lock:
+            snapshot = self._snapshot(workflow_id)
+            if snapshot is not None:
+                self._write(workflow_id, snapshot)
+
+    async def asave(self, workflow_id: str) -> None:
+        """``save()`` for the event loop: serialize here, hash and write in a worker thread"""
+        with self._lock:
+            snapshot = self._snapshot(workflow_id)
+        if snapshot is not None:
+            await asyncio.to_thread(self._write, workflow_id, snapshot)
+
+    def _snapshot(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        obj = self._cache.get(workflow_id)
+        if obj is None:
+            return None
+        data = dict(self._encode(obj))
+        data.pop(self.results_key, None)
+        stages = data.get("stages")
+        columns = [data.get(name) for name in _COLUMNS]
+        columns[3] = 1 if columns[3] else 0
+        extra = {k: v for k, v in data.items() if k not in _COLUMNS and not (k == "stages" and isinstance(stages, dict))}
+        self._snapshot_seq += 1
+        return {
+            "seq": self._snapshot_seq,
+            "now": time.time(),
+            "columns": columns,
+            "extra": _dumps(extra),
+            "stages": [(stage, position, (info or {}).get("status"), (info or {}).get("started_at"),
+                        (info or {}).get("completed_at"), _dumps(info or {}))
+                       for position, (stage, info) in enumerate(stages.items())] if isinstance(stages, dict) else None,
+            "results": {stage: _dumps(result).encode("utf-8") for stage, result in self._results_of(obj).items()},
+        }
+
+    def _write(self, workflow_id: str, snapshot: Dict[str, Any]) -> None:
+        with self._lock:
+            # asave()的写入可能晚于之后的save()执行，或工作流已被删除/淘汰：旧快照不能覆盖新状态
+            if workflow_id not in self._cache or snapshot["seq"] <= self._written_seq.get(workflow_id, 0):
+                return
+            now = snapshot["now"]
+            results = snapshot["results"]
+            saved = self._saved_results.setdefault(workflow_id, {})
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO workflows (namespace, workflow_id, topic, status, current_stage, "
+                    "test_mode, created_at, updated_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (namespace, workflow_id) DO UPDATE SET topic=excluded.topic, "
+                    "status=excluded.status, current_stage=excluded.current_stage, test_mode=excluded.test_mode, "
+                    "created_at=excluded.created_at, updated_at=excluded.updated_at, data=excluded.data",
+                    (self.namespace, workflow_id, *snapshot["columns"], now, snapshot["extra"]),
+                )
+                for stage, position, status, started_at, completed_at, info in snapshot["stages"] or ():
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO stages (namespace, workflow_id, stage, position, status, "
+                        "started_at, completed_at, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (self.namespace, workflow_id, stage, position, status, started_at, completed_at, info),
+                    )
+                for stage in [s for s in saved if s not in results]:
+                    saved.pop(stage)
+                    self._conn.execute(
+                        "DELETE FROM stage_results WHERE namespace=? AND workflow_id=? AND stage=?",
+                        (self.namespace, workflow_id, stage),
+                    )
+                for stage, blob in results.items():
+                    digest = _digest(blob)
+                    if saved.get(stage) == digest:
+                        continue
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO stage_results (namespace, workflow_id, stage, result, size, updated_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?)",
+                        (self.namespace, workflow_id, stage, blob, len(blob), now),
+                    )
+                    saved[stage] = digest
+                self._conn.execute("COMMIT")
+                self._versions[workflow_id] = now
+                self._written_seq[workflow_id] = snapshot["seq"]
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _changed_elsewhere(self, workflow_id: str) -> bool:
+        row = self._conn.execute(
+            "SELECT updated_at FROM workflows WHERE namespace=? AND workflow_id=?", (self.namespace, workflow_id)
+        ).fetchone()
+        return row is not None and row[0] is not None and row[0] > self._versions.get(workflow_id, row[0])
+
+    def _exists(self, workflow_id: object) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM workflows WHERE namespace=? AND workflow_id=?", (self.namespace, workflow_id)
+        ).fetchone() is not None
+
+    def _load(self, workflow_id: str) -> Optional[Dict[str, Any]]:
+        row = self._conn.execute(
+            "SELECT topic, status, current_stage, test_mode, created_at, data, updated_at FROM workflows "
+            "WHERE namespace=? AND workflow_id=?", (self.namespace, workflow_id)
+        ).fetchone()
+        if row is None:
+            return None
+        self._versions[workflow_id] = row[6]
+        data = self._row_to_summary(workflow_id, row[:6])
+        results = {}
+        for stage, blob in self._conn.execute(
+            "SELECT stage, result FROM stage_results WHERE namespace=? AND workflow_id=?",
+            (self.namespace, workflow_id),
+        ):
+            results[stage] = json.loads(blob.decode("utf-8") if isinstance(blob, bytes) else blob)
+        data[self.results_key] = results
+        return data
+
+    def _row_to_summary(self, workflow_id: str, row) -> Dict[str, Any]:
+        topic, status, current_stage, test_mode, created_at, extra = row
+        data = json.loads(extra) if extra else {}
+        data.update({
+            "workflow_id": data.get("workflow_id", workflow_id),
+            "topic": topic,
+            "status": status,
+            "current_stage": current_stage,
+            "test_mode": bool(test_mode),
+            "created_at": created_at,
+        })
+        stage_rows = self._conn.execute(
+            "SELECT stage, data FROM stages WHERE namespace=? AND workflow_id=? ORDER BY position",
+            (self.namespace, workflow_id),
+        ).fetchall()
+        if stage_rows:
+            data["stages"] = {stage: json.loads(info) for stage, info in stage_rows}
+        return data
+
+    def _results_of(self, obj: Any) -> Dict[str, Any]:
+        results = obj.get(self.results_key) if isinstance(obj, dict) else getattr(obj, self.results_key, None)
+        return results or {}
+
+    @staticmethod
+    def _status_of(obj: Any) -> Any:
+        status = obj.get("status") if isinstance(obj, dict) else getattr(obj, "status", None)
+        return getattr(status, "value", status)
+
+    def _remember(self, workflow_id: str, obj: Any, data: Dict[str, Any]) -> None:
+        self._cache[workflow_id] = obj
+        # 从数据库重新加载：此前取得的快照都已过时
+        self._written_seq[workflow_id] = self._snapshot_seq
+        self._saved_results[workflow_id] = {stage: _digest(_dumps(value).encode("utf-8"))
+                                            for stage, value in self._results_of(obj).items()}
+        self._evict()
+
+    def _evict(self) -> None:
+        if len(self._cache) <= self.cache_size:
+            return
+        for workflow_id in list(self._cache):
+            if len(self._cache) <= self.cache_size:
+                break
+            if self._status_of(self._cache[workflow_id]) in ACTIVE_STATUSES:
+                continue
+            self.save(workflow_id)
+            del self._cache[workflow_id]
+            self._saved_results.pop(workflow_id, None)
+            self._versions.pop(workflow_id, None)
+            self._written_seq.pop(workflow_id, None)
+
+    # ------------------------------------------------------------------ queries
+
+    def summaries(self, status: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Workflow metadata and stage statuses without loading stage results"""
+        with self._lock:
+            sql = ("SELECT workflow_id, topic, status, current_stage, test_mode, created_at, data, updated_at "
+                   "FROM workflows WHERE namespace=?")
+            params: List[Any] = [self.namespace]
+            if status:
+                sql += " AND status=?"
+                params.append(status)
+            sql += " ORDER BY created_at, rowid"
+            if limit:
+                sql += " LIMIT ?"
+                params.append(limit)
+            rows = self._conn.execute(sql, params).fetchall()
+            summaries = []
+            for row in rows:
+                obj = self._cache.get(row[0])
+                if obj is None or (row[7] or 0) > self._versions.get(row[0], row[7] or 0):
+                    summaries.append(self._row_to_summary(row[0], row[1:7]))
+                else:
+                    # 内存中的工作流可能尚未save，以内存状态为准
+                    data = dict(self._encode(obj))
+                    data.pop(self.results_key, None)
+                    summaries.append(data)
+            return summaries
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "path": self.path,
+                "workflows": len(self),
+                "cached": len(self._cache),
+                "cache_size": self.cache_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for workflow_id in list(self._cache):
+                self.save(workflow_id)
+            self._conn.close()